@@ -0,0 +1,73 @@
+import sys
+import time
+
+import numpy as np
+
+import codegen
+from bsimcmg import BSIMCMG, CHUNK, read_mdl
+from workers import WorkerPool
+
+
+def timeit(f, repeat):
+    f()
+    t = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - t) / repeat
+
+
+def card():
+    param = read_mdl('modelcard.l')
+    for k in ('vd', 'vg', 'vs', 'vb', 'temp'):
+        param.pop(k, None)
+    return param
+
+
+def main(points=100000):
+    dev = BSIMCMG(**card())
+    engines = [('calc', dev)]
+    engines.append(('numpy', codegen.specialize(dev, backend='numpy')))
+    engines.append(('float32', codegen.specialize(dev, temp=27.0, dtype=np.float32)))
+    if codegen.numba is not None:
+        engines.append(('numba', codegen.specialize(dev, backend='numba')))
+        engines.append(('auto', codegen.specialize(dev)))
+    else:
+        print('numba not installed, skipping the numba backend')
+    vg = np.linspace(0.0, 1.0, points)
+    print(f'{"engine":8s} {"scalar (us)":>12s} {"sweep (ms)":>12s} {"Mpts/s":>8s}')
+    for name, m in engines:
+        scalar = timeit(lambda: m.calc(1.0, 0.8), 200)
+        sweep = timeit(lambda: m.calc(vd=1.0, vg=vg), 5)
+        print(f'{name:8s} {scalar * 1e6:12.1f} {sweep * 1e3:12.1f} {points / sweep / 1e6:8.2f}')
+    # Preallocated outputs and workspace: no array allocations per call
+    fast = codegen.specialize(dev, temp=27.0, backend='numpy')
+    ws, out = fast.workspace(points), [np.empty(points) for _ in range(4)]
+    into = timeit(lambda: fast.calc_into(out, ws, vd=1.0, vg=vg), 5)
+    print(f'{"into":8s} {"":12s} {into * 1e3:12.1f} {points / into / 1e6:8.2f}')
+    print('\nfloat32 worst-case relative error at 27 C')
+    print(f'{"region":12s} {"points":>7s}' + ''.join(f'{k:>10s}' for k in ('Id', 'Ig', 'Is', 'Ib')))
+    for region, e in codegen.single_error(dev).items():
+        print(f'{region:12s} {e["points"]:7d}' + ''.join(f'{e[k]:10.1e}' for k in ('Id', 'Ig', 'Is', 'Ib')))
+
+
+def scaling(workers=4, sizes=(10000, 100000, 1000000)):
+    # Threaded chunks (calc(workers=N)) against the process pool on mid-sized sweeps
+    param = card()
+    dev = BSIMCMG(**param)
+    print(f'{CHUNK} points per chunk, {workers} workers')
+    print(f'{"points":>8s} {"serial (ms)":>12s} {"threads (ms)":>13s} {"processes (ms)":>15s}')
+    with WorkerPool(workers) as pool:
+        for n in sizes:
+            vg = np.linspace(0.0, 1.0, n)
+            repeat = max(1, 1000000 // n)
+            serial = timeit(lambda: dev.calc(vd=1.0, vg=vg), repeat)
+            threads = timeit(lambda: dev.calc(vd=1.0, vg=vg, workers=workers), repeat)
+            processes = timeit(lambda: pool.calc(param, vd=1.0, vg=vg), repeat)
+            print(f'{n:8d} {serial * 1e3:12.1f} {threads * 1e3:13.1f} {processes * 1e3:15.1f}')
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['scaling']:
+        scaling(*(int(a) for a in sys.argv[2:]))
+    else:
+        main(*(int(a) for a in sys.argv[1:]))
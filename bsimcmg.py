@@ -1,5 +1,74 @@
+import ast
+import concurrent.futures
+import glob
+import heapq
+import inspect
+import os
 import re
-from math import *
+import textwrap
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+
+# Internal quantities of calc() that can be requested through opinfo
+OPINFO = ('Vtm', 'nVtm', 'dvth_all', 'vgsfbeff', 'qis', 'qid', 'qia', 'Vdsat', 'Vdseff',
+    'ueff', 'Dmob', 'Dvsat', 'Moc', 'Mclm', 'Rdss', 'ids', 'Iii', 'idsgen', 'igbinv', 'igbacc',
+    'igcs', 'igcd', 'igs', 'igd', 'igidl', 'igisl', 'Ies', 'Ied')
+
+# Model selectors: they choose code paths, so unlike other parameters they cannot be arrays
+FLAGS = ('TYPE', 'GEOMOD', 'RDSMOD', 'RGEOMOD', 'BULKMOD', 'ASYMMOD', 'IGCMOD', 'IGBMOD', 'GIDLMOD',
+    'IIMOD', 'TEMPMOD', 'IGCLAMP', 'SDTERM')
+
+# Size in bytes of the L2 (data or unified) cache of cpu0 from sysfs, or default
+def l2_cache_size(default=1 << 20):
+    for path in sorted(glob.glob('/sys/devices/system/cpu/cpu0/cache/index*')):
+        try:
+            with open(os.path.join(path, 'level')) as f:
+                level = int(f.read())
+            with open(os.path.join(path, 'type')) as f:
+                kind = f.read().strip()
+            with open(os.path.join(path, 'size')) as f:
+                size = f.read().strip()
+        except (OSError, ValueError):
+            continue
+        if level == 2 and kind != 'Instruction':
+            unit = {'K': 1 << 10, 'M': 1 << 20}.get(size[-1], 1)
+            return int(size.rstrip('KM')) * unit
+    return default
+
+# Points per chunk of a threaded calc(): the bias stage keeps about 32 float64
+# intermediates per point live, so a chunk fills the L2 cache
+CHUNK = max(1024, l2_cache_size() // 256)
+
+# One thread pool shared by calc(workers=N) calls, grown to the largest N requested;
+# a call runs at most N tasks on it. The threads persist until the interpreter exits
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+# Validate an opinfo request; returns the dict the evaluator fills, or None
+def check_opinfo(opinfo):
+    if opinfo is None:
+        return None
+    unknown = set(opinfo) - set(OPINFO)
+    if unknown:
+        raise ValueError(f'unknown opinfo quantities: {sorted(unknown)}')
+    return {}
+
+# Broadcast evaluator results to the bias and parameter shape and fill opinfo
+def collect_outputs(currents, bias, info, opinfo, shape=()):
+    shape = np.broadcast_shapes(shape, *(np.shape(i) for i in (*bias, *currents)))
+    if opinfo is not None:
+        for name, buf in opinfo.items():
+            value = np.broadcast_to(info[name], shape)
+            if buf is None:
+                opinfo[name] = float(value) if shape == () else value.astype(float)
+            else:
+                buf[...] = value
+    if shape == ():
+        return [float(i) for i in currents]
+    return [np.broadcast_to(i, shape).astype(float) for i in currents]
 
 class BSIMCMG:
     """
@@ -7,18 +76,16 @@ class BSIMCMG:
     http://bsim.berkeley.edu/BSIMCMG/BSIMCMG110.0.0_20160101.tar.gz
     """
 
+    version = 0 # incremented whenever state() applies a parameter change
+
     def __repr__(self):
         return f'BSIMCMG()'
 
     def __init__(self, **kwargs):
         self.given = kwargs # parameters from modelcard
 
-        # Instance parameters in Python (P001-P006, 6)
-        self.vd = self.given.get('vd', 1.0) # P001
-        self.vg = self.given.get('vg', 1.0) # P002
-        self.vs = self.given.get('vs', 0.0) # P003
-        self.vb = self.given.get('vb', 0.0) # P004
-        self.temp = self.given.get('temp', 27.0) # P005
+        # Instance parameters in Python (P006, 1)
+        # Terminal voltages and temperature (P001-P005) are arguments of calc()
         self.vdd = self.given.get('vdd', 1.0) # P006
 
         # Instance parameters (I001-I024, 24)
@@ -997,24 +1064,20 @@ class BSIMCMG:
 
     # Clamped exponential function
     def lexp(self, x):
-        if x > 80.0:
-            return 5.540622384e34 * (1.0 + x - 80.0)
-        elif x < -80.0:
-            return 1.804851387e-35
-        else:
-            return exp(x)
+        return np.where(x > 80.0, 5.540622384e34 * (1.0 + x - 80.0),
+            np.where(x < -80.0, 1.804851387e-35, np.exp(np.minimum(np.maximum(x, -80.0), 80.0))))
 
     # Clamped log function
     def lln(self, x):
-        return log(max(x, 1.0e-38))
+        return np.log(np.maximum(x, 1.0e-38))
 
     # Hyperbolic smoothing function
     def hypsmooth(self, x, c):
-        return 0.5 * (x + sqrt(x * x + 4.0 * c * c))
+        return 0.5 * (x + np.sqrt(x * x + 4.0 * c * c))
 
     # Hyperbolic smoothing max Function
     def hypmax(self, x, xmin, c):
-        return xmin + 0.5 * (x - xmin - c + sqrt((x - xmin - c) *
+        return xmin + 0.5 * (x - xmin - c + np.sqrt((x - xmin - c) *
             (x - xmin - c) - 4.0 * xmin * c))
 
     # Temperature dependence type
@@ -1024,7 +1087,8 @@ class BSIMCMG:
         else:
             return PARAML * self.hypsmooth(1.0 + PARAMT * DELTEMP - 1.0e-6, 1.0e-3)
 
-    def calc(self):
+    # Bias-independent setup: geometry, binning, scaling and range limiting
+    def setup(self):
         # Constants
         if self.TYPE == 1:
             devsign = 1
@@ -1046,8 +1110,8 @@ class BSIMCMG:
 
         # Effective channel length for I-V/C-V
         Lg = self.L + self.XL
-        deltaL = self.LINT + self.LL * pow(Lg, -self.LLN)
-        deltaL1 = self.LINT + self.LL * pow(Lg + self.DLBIN, -self.LLN)
+        deltaL = self.LINT + self.LL * np.power(Lg, -self.LLN)
+        deltaL1 = self.LINT + self.LL * np.power(Lg + self.DLBIN, -self.LLN)
         Leff = Lg - 2.0 * deltaL
         Leff1 = Lg + self.DLBIN - 2.0 * deltaL1
 
@@ -1062,8 +1126,8 @@ class BSIMCMG:
         # NBODY binning equation for UFCM parameters
         NBODY_i = self.NBODY + Inv_L * self.LNBODY + Inv_NFIN * self.NNBODY + Inv_LNFIN * self.PNBODY
 
-        if self.NBODYN1 != 0.0:
-            NBODY_i = NBODY_i + 1.0 + self.NBODYN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.NBODYN2)
+        if np.count_nonzero(self.NBODYN1):
+            NBODY_i = np.where(self.NBODYN1 != 0.0, NBODY_i + 1.0 + self.NBODYN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.NBODYN2), NBODY_i)
 
         # Model parameters for unified FinFET compact model
         if self.GEOMOD == 0:
@@ -1075,7 +1139,7 @@ class BSIMCMG:
                 rc = 2.0 * Cins / (Weff_UFCM * Weff_UFCM * epssub / Ach)
                 Qdep_ov_Cins = -1.60219e-19 * NBODY_i * Ach / Cins
             else:
-                Weff_UFCM = 2.0 * sqrt(self.HFIN * self.HFIN + (self.TFIN_TOP - self.TFIN_BASE) * (self.TFIN_TOP - self.TFIN_BASE) / 4.0)
+                Weff_UFCM = 2.0 * np.sqrt(self.HFIN * self.HFIN + (self.TFIN_TOP - self.TFIN_BASE) * (self.TFIN_TOP - self.TFIN_BASE) / 4.0)
                 Cins = Weff_UFCM * self.EPSROX * 8.8542e-12 / self.EOT
                 Ach = self.HFIN * (self.TFIN_TOP + self.TFIN_BASE) / 2.0
                 rc = 2.0 * Cins / (Weff_UFCM * Weff_UFCM * epssub / Ach)
@@ -1089,7 +1153,7 @@ class BSIMCMG:
                 rc = 2.0 * Cins / (Weff_UFCM * Weff_UFCM * epssub / Ach)
                 Qdep_ov_Cins = -1.60219e-19 * NBODY_i * Ach / Cins
             else:
-                Weff_UFCM = 2.0 * sqrt(self.HFIN * self.HFIN + (self.TFIN_TOP - self.TFIN_BASE) * (self.TFIN_TOP - self.TFIN_BASE) / 4.0) + self.TFIN_TOP
+                Weff_UFCM = 2.0 * np.sqrt(self.HFIN * self.HFIN + (self.TFIN_TOP - self.TFIN_BASE) * (self.TFIN_TOP - self.TFIN_BASE) / 4.0) + self.TFIN_TOP
                 Cins = Weff_UFCM * self.EPSROX * 8.8542e-12 / self.EOT
                 Ach = self.HFIN * (self.TFIN_TOP + self.TFIN_BASE) / 2.0
                 rc = 2.0 * Cins /(Weff_UFCM * Weff_UFCM * epssub / Ach)
@@ -1103,7 +1167,7 @@ class BSIMCMG:
                 rc = 2.0 * Cins / (Weff_UFCM * Weff_UFCM * epssub / Ach)
                 Qdep_ov_Cins = -1.60219e-19 * NBODY_i * Ach / Cins
             else:
-                Weff_UFCM = 2.0 * sqrt(self.HFIN * self.HFIN + (self.TFIN_TOP - self.TFIN_BASE) * \
+                Weff_UFCM = 2.0 * np.sqrt(self.HFIN * self.HFIN + (self.TFIN_TOP - self.TFIN_BASE) * \
                     (self.TFIN_TOP - self.TFIN_BASE) / 4.0) + self.TFIN_TOP + self.TFIN_BASE
                 Cins = Weff_UFCM * self.EPSROX * 8.8542e-12 / self.EOT
                 Ach = self.HFIN * (self.TFIN_TOP + self.TFIN_BASE) / 2.0
@@ -1112,7 +1176,7 @@ class BSIMCMG:
         elif self.GEOMOD == 3:
             # Cylindrical gate
             Weff_UFCM = 3.14159265358979323846 * self.D
-            Cins = 2.0 * 3.14159265358979323846 * self.EPSROX * 8.8542e-12 / log(1.0 + 2.0 * self.EOT / self.D)
+            Cins = 2.0 * 3.14159265358979323846 * self.EPSROX * 8.8542e-12 / np.log(1.0 + 2.0 * self.EOT / self.D)
             Ach = 3.14159265358979323846 * self.D * self.D / 4.0
             rc = 2.0 * Cins / (Weff_UFCM * Weff_UFCM * epssub / Ach)
             Qdep_ov_Cins = -1.60219e-19 * NBODY_i * Ach / Cins
@@ -1131,7 +1195,7 @@ class BSIMCMG:
         Weff0 = Weff_UFCM - self.DELTAW
 
         # SCE scaling length
-        scl = sqrt(epssub * Ach / Cins * (1.0 + Ach * Cins / (2.0 * epssub * Weff_UFCM * Weff_UFCM)))
+        scl = np.sqrt(epssub * Ach / Cins * (1.0 + Ach * Cins / (2.0 * epssub * Weff_UFCM * Weff_UFCM)))
 
         # Binning equations
         PHIG_i = self.PHIG + Inv_L * self.LPHIG + Inv_NFIN * self.NPHIG + Inv_LNFIN * self.PPHIG
@@ -1297,54 +1361,48 @@ class BSIMCMG:
 
         # Geometrical scaling
         # NFIN scaling
-        if self.PHIGN1 != 0.0:
-            PHIG_i = PHIG_i * (1.0 + self.PHIGN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.PHIGN2))
+        if np.count_nonzero(self.PHIGN1):
+            PHIG_i = np.where(self.PHIGN1 != 0.0, PHIG_i * (1.0 + self.PHIGN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.PHIGN2)), PHIG_i)
 
-        if self.ETA0N1 != 0.0:
-            ETA0_i = ETA0_i * (1.0 + self.ETA0N1 / self.NFIN * self.lln(1.0 + self.NFIN / self.ETA0N2))
+        if np.count_nonzero(self.ETA0N1):
+            ETA0_i = np.where(self.ETA0N1 != 0.0, ETA0_i * (1.0 + self.ETA0N1 / self.NFIN * self.lln(1.0 + self.NFIN / self.ETA0N2)), ETA0_i)
 
-        if self.CDSCN1 != 0.0:
-            CDSC_i = CDSC_i * (1.0 + self.CDSCN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.CDSCN2))
+        if np.count_nonzero(self.CDSCN1):
+            CDSC_i = np.where(self.CDSCN1 != 0.0, CDSC_i * (1.0 + self.CDSCN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.CDSCN2)), CDSC_i)
 
-        if self.CDSCDN1 != 0.0:
-            CDSCD_i = CDSCD_i * (1.0 + self.CDSCDN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.CDSCDN2))
+        if np.count_nonzero(self.CDSCDN1):
+            CDSCD_i = np.where(self.CDSCDN1 != 0.0, CDSCD_i * (1.0 + self.CDSCDN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.CDSCDN2)), CDSCD_i)
 
-        if self.CDSCDRN1 != 0.0:
-            CDSCDR_i = CDSCDR_i * (1.0 + self.CDSCDRN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.CDSCDRN2))
+        if np.count_nonzero(self.CDSCDRN1):
+            CDSCDR_i = np.where(self.CDSCDRN1 != 0.0, CDSCDR_i * (1.0 + self.CDSCDRN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.CDSCDRN2)), CDSCDR_i)
 
-        if self.VSATN1 != 0.0:
-            VSAT_i = VSAT_i * (1.0 + self.VSATN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.VSATN2))
+        if np.count_nonzero(self.VSATN1):
+            VSAT_i = np.where(self.VSATN1 != 0.0, VSAT_i * (1.0 + self.VSATN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.VSATN2)), VSAT_i)
 
-        if self.VSAT1N1 != 0.0:
-            VSAT1_i = VSAT1_i * (1.0 + self.VSAT1N1 / self.NFIN * self.lln(1.0 + self.NFIN / self.VSAT1N2))
+        if np.count_nonzero(self.VSAT1N1):
+            VSAT1_i = np.where(self.VSAT1N1 != 0.0, VSAT1_i * (1.0 + self.VSAT1N1 / self.NFIN * self.lln(1.0 + self.NFIN / self.VSAT1N2)), VSAT1_i)
 
-        if self.VSAT1RN1 != 0.0:
-            VSAT1R_i = VSAT1R_i * (1.0 + self.VSAT1RN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.VSAT1RN2))
+        if np.count_nonzero(self.VSAT1RN1):
+            VSAT1R_i = np.where(self.VSAT1RN1 != 0.0, VSAT1R_i * (1.0 + self.VSAT1RN1 / self.NFIN * self.lln(1.0 + self.NFIN / self.VSAT1RN2)), VSAT1R_i)
 
-        if self.U0N1 != 0.0:
-            U0_i = U0_i * (1.0 + self.U0N1 / self.NFIN * self.lln(1.0 + self.NFIN / self.U0N2))
+        if np.count_nonzero(self.U0N1):
+            U0_i = np.where(self.U0N1 != 0.0, U0_i * (1.0 + self.U0N1 / self.NFIN * self.lln(1.0 + self.NFIN / self.U0N2)), U0_i)
 
         if 'NFINNOM' in self.given:
             PHIG_i = PHIG_i * (1.0 + (self.NFIN - self.NFINNOM) * self.PHIGLT * Leff)
             ETA0_i = ETA0_i * (1.0 + (self.NFIN - self.NFINNOM) * self.ETA0LT * Leff)
             U0_i = U0_i * (1.0 + (self.NFIN - self.NFINNOM) * self.U0LT * Leff)
 
-        if self.U0N1R != 0.0:
-            U0R_i = U0R_i * (1.0 + self.U0N1R / self.NFIN * self.lln(1.0 + self.NFIN / self.U0N2R))
+        if np.count_nonzero(self.U0N1R):
+            U0R_i = np.where(self.U0N1R != 0.0, U0R_i * (1.0 + self.U0N1R / self.NFIN * self.lln(1.0 + self.NFIN / self.U0N2R)), U0R_i)
 
         # Length scaling
         PHIG_i = PHIG_i + self.PHIGL * Leff
-        if self.LPA > 0.0:
-            U0_i = U0_i * (1.0 - UP_i * pow(Leff, -self.LPA))
-        else:
-            U0_i = U0_i * (1.0 - UP_i)
+        U0_i = U0_i * (1.0 - UP_i * np.power(Leff, -np.maximum(self.LPA, 0.0)))
         UA_i = UA_i + self.AUA * self.lexp(-Leff / self.BUA)
         UD_i = UD_i + self.AUD * self.lexp(-Leff / self.BUD)
         EU_i = EU_i + self.AEU * self.lexp(-Leff / self.BEU)
-        if self.LPAR > 0.0:
-            U0R_i = U0R_i * (1.0 - UPR_i * pow(Leff, -self.LPAR))
-        else:
-            U0R_i = U0R_i * (1.0 - UPR_i)
+        U0R_i = U0R_i * (1.0 - UPR_i * np.power(Leff, -np.maximum(self.LPAR, 0.0)))
         UAR_i = UAR_i + self.AUAR * self.lexp(-Leff / self.BUAR)
         UDR_i = UDR_i + self.AUDR * self.lexp(-Leff / self.BUDR)
         EUR_i = EUR_i + self.AEUR * self.lexp(-Leff / self.BEUR)
@@ -1354,9 +1412,9 @@ class BSIMCMG:
         else:
             RDSW_i = RDSW_i + self.ARDSW * self.lexp(-Leff / self.BRDSW)
         PCLM_i = PCLM_i + self.APCLM * self.lexp(-Leff / self.BPCLM)
-        PCLMR_i = PCLMR_i + self.APCLMR * pow(Leff, -self.BPCLMR)
-        MEXP_i = MEXP_i + self.AMEXP * pow(Leff, -self.BMEXP)
-        MEXPR_i = MEXPR_i + self.AMEXPR * pow(Leff, -self.BMEXPR)
+        PCLMR_i = PCLMR_i + self.APCLMR * np.power(Leff, -self.BPCLMR)
+        MEXP_i = MEXP_i + self.AMEXP * np.power(Leff, -self.BMEXP)
+        MEXPR_i = MEXPR_i + self.AMEXPR * np.power(Leff, -self.BMEXPR)
         PTWG_i = PTWG_i + self.APTWG * self.lexp(-Leff / self.BPTWG)
         PTWGR_i = PTWGR_i + self.APTWG * self.lexp(-Leff / self.BPTWG)
         VSAT_i = VSAT_i + self.AVSAT * self.lexp(-Leff / self.BVSAT)
@@ -1367,75 +1425,41 @@ class BSIMCMG:
         DVTP1_i = self.DVTP1 + self.ADVTP1 * self.lexp(-Leff / self.BDVTP1)
 
         # Parameter range limiting
-        if ETA0_i < 0.0:
-            ETA0_i = 0.0
-        if ETA0R_i < 0.0:
-            ETA0R_i = 0.0
-        if LPE0_i < -Leff:
-            LPE0_i = 0.0
-        if K0SI_i <= 0.0:
-            K0SI_i = 0.0
-        if K2SI_i <= 0.0:
-            K2SI_i = 0.0
-        if PHIBE_i < 0.2 and self.BULKMOD != 0:
-            PHIBE_i = 0.2
-        if PHIBE_i > 1.2 and self.BULKMOD != 0:
-            PHIBE_i = 1.2
-        if PSAT_i < 2.0:
-            PSAT_i = 2.0
-        if U0_i < 0.0:
-            U0_i = 0.03
-        if UA_i < 0.0:
-            UA_i = 0.0
-        if EU_i < 0.0:
-            EU_i = 0.0
-        if UD_i < 0.0:
-            UD_i = 0.0
-        if UCS_i < 0.0:
-            UCS_i = 0.0
-        if ETAMOB_i < 0.0:
-            ETAMOB_i = 0.0
+        ETA0_i = np.maximum(ETA0_i, 0.0)
+        ETA0R_i = np.maximum(ETA0R_i, 0.0)
+        LPE0_i = np.where(LPE0_i < -Leff, 0.0, LPE0_i)
+        K0SI_i = np.maximum(K0SI_i, 0.0)
+        K2SI_i = np.maximum(K2SI_i, 0.0)
+        if self.BULKMOD != 0:
+            PHIBE_i = np.minimum(np.maximum(PHIBE_i, 0.2), 1.2)
+        PSAT_i = np.maximum(PSAT_i, 2.0)
+        U0_i = np.where(U0_i < 0.0, 0.03, U0_i)
+        UA_i = np.maximum(UA_i, 0.0)
+        EU_i = np.maximum(EU_i, 0.0)
+        UD_i = np.maximum(UD_i, 0.0)
+        UCS_i = np.maximum(UCS_i, 0.0)
+        ETAMOB_i = np.maximum(ETAMOB_i, 0.0)
         RDSWMIN_i = self.RDSWMIN
-        if RDSWMIN_i < 0.0:
-            RDSWMIN_i = 0.0
-        if RDSW_i < 0.0:
-            RDSW_i = 0.0
+        RDSWMIN_i = np.maximum(RDSWMIN_i, 0.0)
+        RDSW_i = np.maximum(RDSW_i, 0.0)
         RSWMIN_i = self.RSWMIN
-        if RSWMIN_i < 0.0:
-            RSWMIN_i = 0.0
-        if RSW_i < 0.0:
-            RSW_i = 0.0
+        RSWMIN_i = np.maximum(RSWMIN_i, 0.0)
+        RSW_i = np.maximum(RSW_i, 0.0)
         RDWMIN_i = self.RDWMIN
-        if RDWMIN_i < 0.0:
-            RDWMIN_i = 0.0
-        if RDW_i < 0.0:
-            RDW_i = 0.0
-        if PRWGD_i < 0.0:
-            PRWGD_i = 0.0
-        if PRWGS_i < 0.0:
-            PRWGS_i = 0.0
-        if U0R_i < 0:
-            U0R_i = 0.0
-        if UAR_i < 0.0:
-            UAR_i = 0.0
-        if EUR_i < 0.0:
-            EUR_i = 0.0
-        if UDR_i < 0.0:
-            UDR_i = 0.0
-        if MEXP_i < 2.0:
-            MEXP_i = 2.0
-        if MEXPR_i < 2.0:
-            MEXPR_i = 2.0
-        if PTWG_i < 0:
-            PTWG_i = 0.0
-        if CGIDL_i < 0.0:
-            CGIDL_i = 0.0
-        if CGISL_i < 0.0:
-            CGISL_i = 0.0
-        if self.LINTIGEN >= (Leff / 2.0):
-            LINTIGEN_i = 0.0
-        else:
-            LINTIGEN_i = self.LINTIGEN
+        RDWMIN_i = np.maximum(RDWMIN_i, 0.0)
+        RDW_i = np.maximum(RDW_i, 0.0)
+        PRWGD_i = np.maximum(PRWGD_i, 0.0)
+        PRWGS_i = np.maximum(PRWGS_i, 0.0)
+        U0R_i = np.maximum(U0R_i, 0.0)
+        UAR_i = np.maximum(UAR_i, 0.0)
+        EUR_i = np.maximum(EUR_i, 0.0)
+        UDR_i = np.maximum(UDR_i, 0.0)
+        MEXP_i = np.maximum(MEXP_i, 2.0)
+        MEXPR_i = np.maximum(MEXPR_i, 2.0)
+        PTWG_i = np.maximum(PTWG_i, 0.0)
+        CGIDL_i = np.maximum(CGIDL_i, 0.0)
+        CGISL_i = np.maximum(CGISL_i, 0.0)
+        LINTIGEN_i = np.where(self.LINTIGEN >= (Leff / 2.0), 0.0, self.LINTIGEN)
 
         # Geometry-Depent source/drain resistance
         if self.RGEOMOD == 0:
@@ -1443,10 +1467,8 @@ class BSIMCMG:
             RDrainGeo = self.RSHD * self.NRD
         else:
             # Area and perimeter calculation
-            if self.HEPI > 0.0:
-                Arsd = self.FPITCH * self.HFIN + (self.TFIN + (self.FPITCH - self.TFIN) * self.CRATIO) * self.HEPI
-            else:
-                Arsd = self.FPITCH * max(1.0e-9, self.HFIN + self.HEPI)
+            Arsd = np.where(self.HEPI > 0.0, self.FPITCH * self.HFIN + (self.TFIN + (self.FPITCH - self.TFIN) * self.CRATIO) * self.HEPI,
+                self.FPITCH * np.maximum(1.0e-9, self.HFIN + self.HEPI))
             Prsd = self.FPITCH + self.DELTAPRSD
 
             # Resistivity calculation
@@ -1455,26 +1477,26 @@ class BSIMCMG:
             else:
                 mu_max = 1417.0 if self.TYPE == 1 else 470.5
                 if self.TYPE == 1:
-                    mu_rsd = (52.2 + (mu_max - 52.2) / (1.0 + pow(self.NSD / 9.68e22, 0.680)) - 43.4 / (1.0 + pow(3.43e26 / self.NSD, 2.0))) * 1.0e-4
+                    mu_rsd = (52.2 + (mu_max - 52.2) / (1.0 + np.power(self.NSD / 9.68e22, 0.680)) - 43.4 / (1.0 + np.power(3.43e26 / self.NSD, 2.0))) * 1.0e-4
                 else:
-                    mu_rsd = (44.9 + (mu_max - 44.9) / (1.0 + pow(self.NSD / 2.23e22, 0.719)) - 29.0 / (1.0 + pow(6.10e26 / self.NSD, 2.0))) * 1.0e-4
+                    mu_rsd = (44.9 + (mu_max - 44.9) / (1.0 + np.power(self.NSD / 2.23e22, 0.719)) - 29.0 / (1.0 + np.power(6.10e26 / self.NSD, 2.0))) * 1.0e-4
                 rhorsd = 1.0 / (1.60219e-19 * self.NSD * mu_rsd)
 
             # Component: spreading resistance (extension -> hdd)
             thetarsp = 55.0 * 3.14159265358979323846 / 180.0
-            afin = min(Arsd, max(1.0e-18, self.TFIN * (self.HFIN + min(0.0, self.HEPI))))
-            T1 = 1.0 / tan(thetarsp)
-            Rsp = rhorsd * T1 / (sqrt(3.14159265358979323846) * self.NFIN) * (1.0 / sqrt(afin) - 2.0 / sqrt(Arsd) + sqrt(afin / (Arsd * Arsd)))
+            afin = np.minimum(Arsd, np.maximum(1.0e-18, self.TFIN * (self.HFIN + np.minimum(0.0, self.HEPI))))
+            T1 = 1.0 / np.tan(thetarsp)
+            Rsp = rhorsd * T1 / (np.sqrt(3.14159265358979323846) * self.NFIN) * (1.0 / np.sqrt(afin) - 2.0 / np.sqrt(Arsd) + np.sqrt(afin / (Arsd * Arsd)))
 
             # Component: contact resistance
             arsd_total = Arsd * self.NFIN + self.ARSDEND
             prsd_total = Prsd * self.NFIN + self.PRSDEND
-            lt = sqrt(self.RHOC * arsd_total / (rhorsd * prsd_total))
+            lt = np.sqrt(self.RHOC * arsd_total / (rhorsd * prsd_total))
             alpha = self.LRSD / lt
             T0 = self.lexp(alpha + alpha)
 
             if self.SDTERM == 1.0:
-                eta = rhorsd * lt / RHOC
+                eta = rhorsd * lt / self.RHOC
                 T1 = T0 * (1.0 + eta)
                 T2 = T1 + 1.0 - eta
                 T3 = T1 - 1.0 + eta
@@ -1483,194 +1505,351 @@ class BSIMCMG:
                 T3  = T0 - 1.0
             RrsdTML = rhorsd * lt * T2 / (arsd_total * T3)
 
-            if self.HEPI < -1.0e-10:
-                Rrsdside = self.RHOC / (-self.HEPI * self.TFIN * self.NFIN)
-                Rrsd = (RrsdTML + Rsp) * Rrsdside / (RrsdTML + Rsp + Rrsdside)
-            else:
-                Rrsd = RrsdTML + Rsp
+            Rrsdside = self.RHOC / (-self.HEPI * self.TFIN * self.NFIN)
+            Rrsd = np.where(self.HEPI < -1.0e-10, (RrsdTML + Rsp) * Rrsdside / (RrsdTML + Rsp + Rrsdside), RrsdTML + Rsp)
 
-            Rdsgeo = Rrsd / self.NF * max(0.0, self.RGEOA + self.RGEOB * self.TFIN + self.RGEOC * self.FPITCH + self.RGEOD * self.LRSD + self.RGEOE * self.HEPI)
+            Rdsgeo = Rrsd / self.NF * np.maximum(0.0, self.RGEOA + self.RGEOB * self.TFIN + self.RGEOC * self.FPITCH + self.RGEOD * self.LRSD + self.RGEOE * self.HEPI)
             RSourceGeo = Rdsgeo
             RDrainGeo = Rdsgeo
 
         # Clamping of source/drain resistances
-        if RSourceGeo <= 1.0e-3:
-            RSourceGeo = 1.0e-3
-
-        if RDrainGeo <= 1.0e-3:
-            RDrainGeo = 1.0e-3
+        RSourceGeo = np.maximum(RSourceGeo, 1.0e-3)
+        RDrainGeo = np.maximum(RDrainGeo, 1.0e-3)
 
         if self.RDSMOD == 1:
-            if RSWMIN_i <= 0.0:
-                RSWMIN_i = 0.0
-            if RDWMIN_i <= 0.0:
-                RDWMIN_i = 0.0
-            if RSW_i <= 0.0:
-                RSW_i = 0.0
-            if RDW_i <= 0.0:
-                RDW_i = 0.0
+            RSWMIN_i = np.maximum(RSWMIN_i, 0.0)
+            RDWMIN_i = np.maximum(RDWMIN_i, 0.0)
+            RSW_i = np.maximum(RSW_i, 0.0)
+            RDW_i = np.maximum(RDW_i, 0.0)
         else:
-            if RDSWMIN_i <= 0.0:
-                RDSWMIN_i = 0.0
-            if RDSW_i <= 0.0:
-                RDSW_i = 0.0
+            RDSWMIN_i = np.maximum(RDSWMIN_i, 0.0)
+            RDSW_i = np.maximum(RDSW_i, 0.0)
 
         # Mobility degradation
         EeffFactor = 1.0e-8 / (epsratio * self.EOT)
-        WeffWRFactor = 1.0 / (pow(Weff0 * 1.0e6, WR_i) * NFINtotal)
-        litl = sqrt(epsratio * self.EOT * 0.5 * self.TFIN)
+        WeffWRFactor = 1.0 / (np.power(Weff0 * 1.0e6, WR_i) * NFINtotal)
+        litl = np.sqrt(epsratio * self.EOT * 0.5 * self.TFIN)
 
         if 'THETASCE' not in self.given:
             tmp = DVT1_i * Leff / scl + 1.0e-6
-            if tmp < 40.0:
-                Theta_SCE = 0.5 / (cosh(tmp) - 1.0)
-            else:
-                Theta_SCE = exp(-tmp)
+            Theta_SCE = np.where(tmp < 40.0, 0.5 / (np.cosh(tmp) - 1.0), np.exp(-tmp))
         else:
             Theta_SCE = self.THETASCE
 
         if 'THETASW' not in self.given:
             tmp = DVT1SS_i * Leff / scl + 1.0e-6
-            if tmp < 40.0:
-                Theta_SW = 0.5 / (cosh(tmp) - 1.0)
-            else:
-                Theta_SW = exp(-tmp)
+            Theta_SW = np.where(tmp < 40.0, 0.5 / (np.cosh(tmp) - 1.0), np.exp(-tmp))
         else:
             Theta_SW = self.THETASW
 
         if 'THETADIBL' not in self.given:
             tmp = DSUB_i * Leff / scl + 1.0e-6
-            if tmp < 40.0:
-                Theta_DIBL = 0.5 / (cosh(tmp) - 1.0)
-            else:
-                Theta_DIBL = exp(-tmp)
+            Theta_DIBL = np.where(tmp < 40.0, 0.5 / (np.cosh(tmp) - 1.0), np.exp(-tmp))
         else:
             Theta_DIBL = self.THETADIBL
 
-        Theta_RSCE = sqrt(1.0 + LPE0_i / Leff) - 1.0
+        Theta_RSCE = np.sqrt(1.0 + LPE0_i / Leff) - 1.0
 
         tmp = DSUB_i * Leff / scl + 1.0e-6
-        if tmp < 40.0:
-            Theta_DITS = 1.0 / max((1.0 + self.DVTP2 * (cosh(tmp) - 2.0)), 1.0e-6)
-        else:
-            Theta_DITS = exp(-tmp) / max((exp(-tmp) + self.DVTP2), 1.0e-6)
+        Theta_DITS = np.where(tmp < 40.0, 1.0 / np.maximum((1.0 + self.DVTP2 * (np.cosh(tmp) - 2.0)), 1.0e-6),
+            np.exp(-tmp) / np.maximum((np.exp(-tmp) + self.DVTP2), 1.0e-6))
 
         nbody = NBODY_i
         qbs = 1.60219e-19 * nbody * Ach / Cins
 
+        # Evaluation plan: optional sections that contribute for this model card
+        plan = set()
+        if self.IGCMOD != 0:
+            plan.add('igc')
+        if self.IGBMOD != 0:
+            plan.add('igb')
+        if self.GIDLMOD != 0:
+            plan.add('gidl')
+        if self.IIMOD == 1:
+            plan.add('ii1')
+        elif self.IIMOD == 2:
+            plan.add('ii2')
+        if np.any(AIGEN_i != 0.0) or np.any(BIGEN_i != 0.0):
+            plan.add('gen')
+        if np.any(K0_i != 0.0) or np.any(K01_i != 0.0):
+            plan.add('nud')
+        if np.any(UD_i != 0.0) or (self.ASYMMOD != 0 and np.any(UDR_i != 0.0)):
+            plan.add('ud')
+        if np.any(QMFACTOR_i != 0.0):
+            plan.add('qm')
+        if np.count_nonzero(self.QMFACTORCV):
+            plan.add('qmcv')
+        plan = frozenset(plan)
+
         # Gate Current
-        if self.TYPE == 1:
-            Aechvb = 4.97232e-7  # NMOS
-            Bechvb = 7.45669e11  # NMOS
-        else:
-            Aechvb = 3.42537e-7  # PMOS
-            Bechvb = 1.16645e12  # PMOS
-
-        T0 = self.TOXG * self.TOXG
-        T1 = self.TOXG * POXEDGE_i
-        T2 = T1 * T1
-        Toxratio = self.lexp(NTOX_i * self.lln(self.TOXREF / self.TOXG)) / T0
-        Toxratioedge = self.lexp(NTOX_i * self.lln(self.TOXREF / T1)) / T2
-        igsd_mult0 = Weff0 * Aechvb * Toxratioedge
-
-        if self.TNOM < -273.15:
-            Tnom = 300.15
+        if 'igc' in plan or 'igb' in plan:
+            if self.TYPE == 1:
+                Aechvb = 4.97232e-7  # NMOS
+                Bechvb = 7.45669e11  # NMOS
+            else:
+                Aechvb = 3.42537e-7  # PMOS
+                Bechvb = 1.16645e12  # PMOS
+
+            T0 = self.TOXG * self.TOXG
+            T1 = self.TOXG * POXEDGE_i
+            T2 = T1 * T1
+            Toxratio = self.lexp(NTOX_i * self.lln(self.TOXREF / self.TOXG)) / T0
+            Toxratioedge = self.lexp(NTOX_i * self.lln(self.TOXREF / T1)) / T2
+            igsd_mult0 = Weff0 * Aechvb * Toxratioedge
+
+        # Parameter-dependent selections give 0-d arrays; scalars are cheaper downstream
+        return SimpleNamespace(**{k: v[()] if type(v) is np.ndarray and v.ndim == 0 else v
+            for k, v in locals().items() if k != 'self'})
+
+    def calc(self, vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0, opinfo=None, workers=None):
+        """
+        Terminal currents [Id, Ig, Is, Ib] at the given terminal voltages (V) and
+        temperature (degC). Biases may be scalars or NumPy arrays; arrays are
+        broadcast against each other, and against any array-valued model or
+        instance parameters, and evaluated in one pass.
+
+        opinfo: optional dict keyed by names from OPINFO. Preallocated arrays are
+        filled in place, None entries are replaced by the computed values.
+
+        workers: with N > 1, sweeps larger than CHUNK points are cut into chunks
+        of CHUNK points evaluated on N threads (NumPy releases the GIL in ufuncs).
+        The threads come from one module-level pool, sized to the largest N used so
+        far, that persists until exit. Devices with array-valued parameters are
+        evaluated in one pass.
+        """
+        info = check_opinfo(opinfo)
+        bias = (vd, vg, vs, vb, temp)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            s = self.state()
+            if workers is not None and workers > 1 and not self._shape:
+                shape = np.broadcast_shapes(*(np.shape(v) for v in bias))
+                if np.prod(shape) > CHUNK:
+                    return self._threaded(s, bias, shape, opinfo, workers)
+            currents = self._evaluate(s, vd, vg, vs, vb, temp, info)
+        return collect_outputs(currents, bias, info, opinfo, self._shape)
+
+    def _threaded(self, s, bias, shape, opinfo, workers):
+        # Chunks of the flattened sweep on a thread pool, written into preallocated
+        # outputs; scalar biases stay scalar so the temperature stage is not per point
+        flat = [v if np.ndim(v) == 0 else np.broadcast_to(v, shape).reshape(-1) for v in bias]
+        n = int(np.prod(shape))
+        out = np.empty((4, n))
+        names = list(opinfo or ())
+        info = {name: np.empty(n) for name in names}
+
+        def run(starts):
+            # One task per thread: every workers-th chunk
+            for a in starts:
+                b = min(a + CHUNK, n)
+                part = {} if opinfo is not None else None
+                with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                    currents = self._evaluate(s, *(v if np.ndim(v) == 0 else v[a:b] for v in flat), part)
+                for k, i in enumerate(currents):
+                    out[k, a:b] = i
+                for name in names:
+                    info[name][a:b] = part[name]
+
+        global _pool, _pool_size
+        with _pool_lock:
+            if _pool_size < workers:
+                if _pool is not None:
+                    _pool.shutdown(wait=False)
+                _pool, _pool_size = concurrent.futures.ThreadPoolExecutor(workers), workers
+            tasks = [_pool.submit(run, range(a, n, CHUNK * workers)) for a in range(0, min(n, CHUNK * workers), CHUNK)]
+        for task in tasks:
+            task.result()
+        for name in names:
+            if opinfo[name] is None:
+                opinfo[name] = info[name].reshape(shape)
+            else:
+                opinfo[name][...] = info[name].reshape(shape)
+        return list(out.reshape((4,) + shape))
+
+    def update(self, **params):
+        """
+        Change model or instance parameters as if the card had been given them;
+        defaults derived from them follow. The next calc() recomputes only the
+        setup statements that depend on what changed.
+        """
+        changed = self.__dict__.setdefault('_changed', set())
+        if not set(params) <= set(self.given):
+            changed.add('given')
+        self.given.update(params)
+        graph = _setup_graph()
+        scope = dict(globals(), self=self)
+        todo = [i for key in params for i in graph.by_key.get(key, ())]
+        heapq.heapify(todo)
+        done = set()
+        while todo:
+            i = heapq.heappop(todo)
+            key, name, code = graph.defaults[i]
+            if i in done or (key not in params and key in self.given):
+                continue
+            done.add(i)
+            old = getattr(self, name)
+            exec(code, scope)
+            if not _same(old, getattr(self, name)):
+                for j in graph.by_read.get(name, ()):
+                    heapq.heappush(todo, j)
+
+    def state(self):
+        """
+        Setup results (as returned by setup()), kept between calls. Parameters
+        changed by update() or by attribute assignment are found by comparing with
+        a snapshot; only the setup statements downstream of them are rerun.
+        """
+        snapshot = self.__dict__.get('_snapshot')
+        if snapshot is None:
+            return self.restore(None)
         else:
-            Tnom = self.TNOM + 273.15
+            changed = self._changed
+            changed.update(k for k, v in self.__dict__.items() if snapshot.get(k) is not v and k[0] != '_')
+            if not changed:
+                return self._state
+            self._reshape(changed)
+            graph = _setup_graph()
+            codes = graph.rerun(changed)
+            if len(codes) > len(graph.code) // 2:
+                self._state = self.setup()
+            else:
+                ns = vars(self._state)
+                scope = dict(globals(), self=self)
+                with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                    for code in codes:
+                        exec(code, scope, ns)
+            changed.clear()
+            self.version += 1
+        self._snapshot = dict(self.__dict__)
+        return self._state
+
+    def restore(self, state):
+        """
+        Adopt setup results computed elsewhere (by setup() on an identical card,
+        e.g. from a shared snapshot) as the cached state; None runs setup().
+        Returns the state.
+        """
+        self._shapes = {}
+        self._reshape([k for k, v in self.__dict__.items() if not isinstance(v, (int, float))])
+        self._state = state = self.setup() if state is None else state
+        self._changed = set()
+        self._snapshot = dict(self.__dict__)
+        return state
+
+    def _reshape(self, names):
+        # Track the shapes of array-valued parameters; they broadcast like biases
+        for k in names:
+            v = getattr(self, k, None)
+            if k[0] == '_' or isinstance(v, (int, float, str, dict)) or not np.ndim(v):
+                self._shapes.pop(k, None)
+            elif k in FLAGS:
+                raise ValueError(f'{k} selects a model branch and must be a scalar')
+            else:
+                self._shapes[k] = np.shape(v)
+        self._shape = np.broadcast_shapes(*self._shapes.values())
+
+    def _evaluate(self, s, vd, vg, vs, vb, temp, info=None):
+        Tnom = np.where(self.TNOM < -273.15, 300.15, self.TNOM + 273.15)
 
-        # $temperature = self.temp + self.CONSTCtoK
-        DevTemp = self.temp + 273.15 + self.DTEMP
+        # $temperature = temp + self.CONSTCtoK
+        DevTemp = temp + 273.15 + self.DTEMP
         TRatio = DevTemp / Tnom
         delTemp = DevTemp - Tnom
         Vtm = 8.617087e-5 * DevTemp
         Vtm0 = 8.617087e-5 * Tnom
         Eg = self.BG0SUB - self.TBGASUB * DevTemp * DevTemp / (DevTemp + self.TBGBSUB)
         Eg0 = self.BG0SUB - self.TBGASUB * Tnom * Tnom / (Tnom + self.TBGBSUB)
-        T1 = (DevTemp / 300.15) * sqrt(DevTemp / 300.15)
+        T1 = (DevTemp / 300.15) * np.sqrt(DevTemp / 300.15)
         ni = self.NI0SUB * T1 * self.lexp(self.BG0SUB / (2.0 * 8.617087e-5 * 300.15) - Eg / (2.0 * Vtm))
         Nc = self.NC0SUB * T1
-        ThetaSS = self.hypsmooth(1.0 + TSS_i * delTemp - 1.0e-6, 1.0e-3)
+        ThetaSS = self.hypsmooth(1.0 + s.TSS_i * delTemp - 1.0e-6, 1.0e-3)
 
         # Quantum mechanical Vth correction
-        kT = Vtm * 1.60219e-19
-        T0 = 1.05457e-34 * 3.14159265358979323846 / (2.0 * Ach / Weff_UFCM)
-        E0 = T0 * T0 / (2.0 * mx)
-        E0prime = T0 * T0 / (2.0 * mxprime)
-        E1 = 4.0 * E0
-        E1prime = 4.0 * E0prime
-        T1 = gprime * mdprime / (gfactor * md)
-        gam0 = 1.0 + T1 * self.lexp((E0 - E0prime) / kT)
-        gam1 = gam0 + self.lexp((E0 - E1) / kT) + T1 * self.lexp((E0 - E1prime) / kT)
-        T2 = -Vtm * self.lln(gfactor * md / (3.14159265358979323846 * 1.05457e-34 * 1.05457e-34 * Nc) * kT / (2.0 * Ach / Weff_UFCM) * gam1)
-        dvch_qm = QMFACTOR_i * (E0 / 1.60219e-19 + T2)
+        dvch_qm = 0.0
+        if 'qm' in s.plan:
+            kT = Vtm * 1.60219e-19
+            T0 = 1.05457e-34 * 3.14159265358979323846 / (2.0 * s.Ach / s.Weff_UFCM)
+            E0 = T0 * T0 / (2.0 * s.mx)
+            E0prime = T0 * T0 / (2.0 * s.mxprime)
+            E1 = 4.0 * E0
+            E1prime = 4.0 * E0prime
+            T1 = s.gprime * s.mdprime / (s.gfactor * s.md)
+            gam0 = 1.0 + T1 * self.lexp((E0 - E0prime) / kT)
+            gam1 = gam0 + self.lexp((E0 - E1) / kT) + T1 * self.lexp((E0 - E1prime) / kT)
+            T2 = -Vtm * self.lln(s.gfactor * s.md / (3.14159265358979323846 * 1.05457e-34 * 1.05457e-34 * Nc) * kT / (2.0 * s.Ach / s.Weff_UFCM) * gam1)
+            dvch_qm = s.QMFACTOR_i * (E0 / 1.60219e-19 + T2)
 
         # Temperature dependence
-        ETA0_t = self.tempdep(ETA0_i, self.TETA0, delTemp, self.TEMPMOD)
-        ETA0R_t = self.tempdep(ETA0R_i, self.TETA0R, delTemp, self.TEMPMOD)
-        T1 = U0_i * pow(TRatio, UTE_i)
-        U0_t = T1 + self.hypmax(UTL_i * delTemp, -0.9 * T1, 1.0e-4)
+        ETA0_t = self.tempdep(s.ETA0_i, self.TETA0, delTemp, self.TEMPMOD)
+        ETA0R_t = self.tempdep(s.ETA0R_i, self.TETA0R, delTemp, self.TEMPMOD)
+        T1 = s.U0_i * np.power(TRatio, s.UTE_i)
+        U0_t = T1 + self.hypmax(s.UTL_i * delTemp, -0.9 * T1, 1.0e-4)
         u0 = U0_t
-        T1 = U0R_i * pow(TRatio, UTER_i)
-        u0r = T1 + self.hypmax(UTLR_i * delTemp, -0.9 * T1, 1.0e-4)
-        ETAMOB_t = self.tempdep(ETAMOB_i, EMOBT_i, delTemp, self.TEMPMOD)
-        UA_t = UA_i + self.hypmax(UA1_i * delTemp, -UA_i, 1.0e-6)
-        UAR_t = UAR_i + self.hypmax(UA1R_i * delTemp, -UAR_i, 1.0e-6)
+        T1 = s.U0R_i * np.power(TRatio, s.UTER_i)
+        u0r = T1 + self.hypmax(s.UTLR_i * delTemp, -0.9 * T1, 1.0e-4)
+        ETAMOB_t = self.tempdep(s.ETAMOB_i, s.EMOBT_i, delTemp, self.TEMPMOD)
+        UA_t = s.UA_i + self.hypmax(s.UA1_i * delTemp, -s.UA_i, 1.0e-6)
+        UAR_t = s.UAR_i + self.hypmax(s.UA1R_i * delTemp, -s.UAR_i, 1.0e-6)
         if self.TEMPMOD == 0:
-            UC_t = self.tempdep(UC_i, UC1_i, delTemp, 0)
-            UCR_t = self.tempdep(UCR_i, UC1R_i, delTemp, 0)
+            UC_t = self.tempdep(s.UC_i, s.UC1_i, delTemp, 0)
+            UCR_t = self.tempdep(s.UCR_i, s.UC1R_i, delTemp, 0)
         else:
-            UC_t = UC_i + UC1_i * delTemp
-            UCR_t = UCR_i + UC1R_i * delTemp
-        UD_t = UD_i * pow(TRatio, UD1_i)
-        UDR_t = UDR_i * pow(TRatio, UD1R_i)
-        UCS_t = UCS_i * pow(TRatio, UCSTE_i)
-        rdstemp = self.hypsmooth(1.0 + PRT_i * delTemp - 1.0e-6, 1.0e-3)
+            UC_t = s.UC_i + s.UC1_i * delTemp
+            UCR_t = s.UCR_i + s.UC1R_i * delTemp
+        UD_t = s.UD_i * np.power(TRatio, s.UD1_i)
+        UDR_t = s.UDR_i * np.power(TRatio, s.UD1R_i)
+        UCS_t = s.UCS_i * np.power(TRatio, s.UCSTE_i)
+        rdstemp = self.hypsmooth(1.0 + s.PRT_i * delTemp - 1.0e-6, 1.0e-3)
         RSDR_t = self.tempdep(self.RSDR, self.TRSDR, delTemp, self.TEMPMOD)
         RSDRR_t = self.tempdep(self.RSDRR, self.TRSDR, delTemp, self.TEMPMOD)
         RDDR_t = self.tempdep(self.RDDR, self.TRDDR, delTemp, self.TEMPMOD)
         RDDRR_t = self.tempdep(self.RDDRR, self.TRDDR, delTemp, self.TEMPMOD)
-        VSAT_t = self.tempdep(VSAT_i, -AT_i, delTemp, self.TEMPMOD)
-        if VSAT_t < 1000:
-            VSAT_t = 1000
-        VSATR_t = self.tempdep(VSATR_i, -ATR_i, delTemp, self.TEMPMOD)
-        if VSATR_t < 1000:
-            VSATR_t = 1000
-        VSAT1_t = self.tempdep(VSAT1_i, -AT_i, delTemp, self.TEMPMOD)
-        if VSAT1_t < 1000:
-            VSAT1_t = 1000
-        VSAT1R_t = self.tempdep(VSAT1R_i, -AT_i, delTemp, self.TEMPMOD)
-        if VSAT1R_t < 1000:
-            VSAT1R_t = 1000
-        MEXP_t = self.hypsmooth(MEXP_i * (1.0 + self.TMEXP * delTemp) - 2.0, 1.0e-3) + 2.0
-        MEXPR_t = self.hypsmooth(MEXPR_i * (1.0 + self.TMEXPR * delTemp) - 2.0, 1.0e-3) + 2.0
-        PTWG_t = self.tempdep(PTWG_i, -PTWGT_i, delTemp, self.TEMPMOD)
-        PTWGR_t = self.tempdep(PTWGR_i, -PTWGT_i, delTemp, self.TEMPMOD)
-        dvth_temp = (KT1_i + self.KT1L / Leff) * (TRatio - 1.0)
-        BETA0_t = BETA0_i * pow(TRatio, IIT_i)
-        SII0_t = SII0_i * (self.hypsmooth(1.0 + TII_i * (TRatio - 1.0) - 0.01, 1.0e-3) + 0.01)
-        K0_t = K0_i + K01_i * delTemp
-        K0SI_t = K0SI_i + self.hypmax(K0SI1_i * delTemp, -K0SI_i, 1.0e-6)
-        K2SI_t = K2SI_i + self.hypmax(K2SI1_i * delTemp, -K2SI_i, 1.0e-6)
-        K1_t = K1_i + self.hypmax(K11_i * delTemp, -K1_i, 1.0e-6)
-        K2SAT_t = K2SAT_i + K2SAT1_i * delTemp
-        A1_t = A1_i + A11_i * delTemp
-        A2_t = A2_i + A21_i * delTemp
-        K2_t = K2_i + self.hypmax(K21_i * delTemp, -K2_i, 1.0e-6)
-        K0SISAT_t = K0SISAT_i + K0SISAT1_i * delTemp
-        K2SISAT_t = K2SISAT_i + K2SISAT1_i * delTemp
-        AIGBINV_t = AIGBINV_i + self.hypmax(AIGBINV1_i * delTemp, -AIGBINV_i, 1.0e-6)
-        AIGBACC_t = AIGBACC_i + self.hypmax(AIGBACC1_i * delTemp, -AIGBACC_i, 1.0e-6)
-        AIGC_t = AIGC_i + self.hypmax(AIGC1_i * delTemp, -AIGC_i, 1.0e-6)
-        AIGS_t = AIGS_i + self.hypmax(AIGS1_i * delTemp, -AIGS_i, 1.0e-6)
-        AIGD_t = AIGD_i + self.hypmax(AIGD1_i * delTemp, -AIGD_i, 1.0e-6)
-        BGIDL_t = BGIDL_i * self.hypsmooth(1.0 + TGIDL_i * delTemp - 1.0e-6, 1.0e-3)
-        BGISL_t = BGISL_i * self.hypsmooth(1.0 + TGIDL_i * delTemp - 1.0e-6, 1.0e-3)
-        ALPHA0_t = ALPHA0_i + self.hypmax(self.ALPHA01 * delTemp, -ALPHA0_i, 1.0e-6)
-        ALPHA1_t = ALPHA1_i + self.hypmax(self.ALPHA11 * delTemp, -ALPHA1_i, 1.0e-6)
-        ALPHAII0_t = ALPHAII0_i + self.hypmax(self.ALPHAII01 * delTemp, -ALPHAII0_i, 1.0e-25)
-        ALPHAII1_t = ALPHAII1_i + self.hypmax(self.ALPHAII11 * delTemp, -ALPHAII1_i, 1.0e-20)
-        igtemp = self.lexp(IGT_i * self.lln(TRatio))
-        igsd_mult = igsd_mult0 * igtemp
+        VSAT_t = self.tempdep(s.VSAT_i, -s.AT_i, delTemp, self.TEMPMOD)
+        VSAT_t = np.maximum(VSAT_t, 1000.0)
+        VSATR_t = self.tempdep(s.VSATR_i, -s.ATR_i, delTemp, self.TEMPMOD)
+        VSATR_t = np.maximum(VSATR_t, 1000.0)
+        VSAT1_t = self.tempdep(s.VSAT1_i, -s.AT_i, delTemp, self.TEMPMOD)
+        VSAT1_t = np.maximum(VSAT1_t, 1000.0)
+        VSAT1R_t = self.tempdep(s.VSAT1R_i, -s.AT_i, delTemp, self.TEMPMOD)
+        VSAT1R_t = np.maximum(VSAT1R_t, 1000.0)
+        MEXP_t = self.hypsmooth(s.MEXP_i * (1.0 + self.TMEXP * delTemp) - 2.0, 1.0e-3) + 2.0
+        MEXPR_t = self.hypsmooth(s.MEXPR_i * (1.0 + self.TMEXPR * delTemp) - 2.0, 1.0e-3) + 2.0
+        PTWG_t = self.tempdep(s.PTWG_i, -s.PTWGT_i, delTemp, self.TEMPMOD)
+        PTWGR_t = self.tempdep(s.PTWGR_i, -s.PTWGT_i, delTemp, self.TEMPMOD)
+        dvth_temp = (s.KT1_i + self.KT1L / s.Leff) * (TRatio - 1.0)
+        A1_t = s.A1_i + s.A11_i * delTemp
+        A2_t = s.A2_i + s.A21_i * delTemp
+        if self.BULKMOD != 0:
+            K1_t = s.K1_i + self.hypmax(s.K11_i * delTemp, -s.K1_i, 1.0e-6)
+        if self.BULKMOD == 2:
+            K2_t = s.K2_i + self.hypmax(s.K21_i * delTemp, -s.K2_i, 1.0e-6)
+            K2SAT_t = s.K2SAT_i + s.K2SAT1_i * delTemp
+            K2SI_t = s.K2SI_i + self.hypmax(s.K2SI1_i * delTemp, -s.K2SI_i, 1.0e-6)
+            K2SISAT_t = s.K2SISAT_i + s.K2SISAT1_i * delTemp
+        if 'nud' in s.plan:
+            K0_t = s.K0_i + s.K01_i * delTemp
+            K0SI_t = s.K0SI_i + self.hypmax(s.K0SI1_i * delTemp, -s.K0SI_i, 1.0e-6)
+            K0SISAT_t = s.K0SISAT_i + s.K0SISAT1_i * delTemp
+        if 'ii1' in s.plan:
+            ALPHA0_t = s.ALPHA0_i + self.hypmax(self.ALPHA01 * delTemp, -s.ALPHA0_i, 1.0e-6)
+            ALPHA1_t = s.ALPHA1_i + self.hypmax(self.ALPHA11 * delTemp, -s.ALPHA1_i, 1.0e-6)
+            BETA0_t = s.BETA0_i * np.power(TRatio, s.IIT_i)
+        if 'ii2' in s.plan:
+            ALPHAII0_t = s.ALPHAII0_i + self.hypmax(self.ALPHAII01 * delTemp, -s.ALPHAII0_i, 1.0e-25)
+            ALPHAII1_t = s.ALPHAII1_i + self.hypmax(self.ALPHAII11 * delTemp, -s.ALPHAII1_i, 1.0e-20)
+            SII0_t = s.SII0_i * (self.hypsmooth(1.0 + s.TII_i * (TRatio - 1.0) - 0.01, 1.0e-3) + 0.01)
+        if 'gidl' in s.plan:
+            BGIDL_t = s.BGIDL_i * self.hypsmooth(1.0 + s.TGIDL_i * delTemp - 1.0e-6, 1.0e-3)
+            BGISL_t = s.BGISL_i * self.hypsmooth(1.0 + s.TGIDL_i * delTemp - 1.0e-6, 1.0e-3)
+        if 'igb' in s.plan or 'igc' in s.plan:
+            igtemp = self.lexp(s.IGT_i * self.lln(TRatio))
+        if 'igb' in s.plan:
+            AIGBINV_t = s.AIGBINV_i + self.hypmax(s.AIGBINV1_i * delTemp, -s.AIGBINV_i, 1.0e-6)
+            AIGBACC_t = s.AIGBACC_i + self.hypmax(s.AIGBACC1_i * delTemp, -s.AIGBACC_i, 1.0e-6)
+        if 'igc' in s.plan:
+            AIGC_t = s.AIGC_i + self.hypmax(s.AIGC1_i * delTemp, -s.AIGC_i, 1.0e-6)
+            AIGS_t = s.AIGS_i + self.hypmax(s.AIGS1_i * delTemp, -s.AIGS_i, 1.0e-6)
+            AIGD_t = s.AIGD_i + self.hypmax(s.AIGD1_i * delTemp, -s.AIGD_i, 1.0e-6)
+            igsd_mult = s.igsd_mult0 * igtemp
         if self.BULKMOD != 0:
             T0 = Eg0 / Vtm0 - Eg / Vtm
             T1 = self.lln(TRatio)
@@ -1686,8 +1865,8 @@ class BSIMCMG:
             JTSD_t = self.JTSD * self.lexp(Eg0 * self.XTSD * (TRatio - 1.0) / Vtm)
             JTSSWS_t = self.JTSSWS * self.lexp(Eg0 * self.XTSSWS * (TRatio - 1.0) / Vtm)
             JTSSWD_t = self.JTSSWD * self.lexp(Eg0 * self.XTSSWD * (TRatio - 1.0) / Vtm)
-            JTSSWGS_t = self.JTSSWGS * (sqrt(self.JTWEFF / Weff0) + 1.0) * self.lexp(Eg0 * self.XTSSWGS * (TRatio - 1.0) / Vtm)
-            JTSSWGD_t = self.JTSSWGD * (sqrt(self.JTWEFF / Weff0) + 1.0) * self.lexp(Eg0 * self.XTSSWGD * (TRatio - 1.0) / Vtm)
+            JTSSWGS_t = self.JTSSWGS * (np.sqrt(self.JTWEFF / s.Weff0) + 1.0) * self.lexp(Eg0 * self.XTSSWGS * (TRatio - 1.0) / Vtm)
+            JTSSWGD_t = self.JTSSWGD * (np.sqrt(self.JTWEFF / s.Weff0) + 1.0) * self.lexp(Eg0 * self.XTSSWGD * (TRatio - 1.0) / Vtm)
             # All NJT's smoothed to 0.01 to prevent divide-by-zero / negative values
             NJTS_t = self.hypsmooth(self.NJTS * (1.0 + self.TNJTS * (TRatio - 1.0)) - 0.01, 1.0e-3) + 0.01
             NJTSD_t = self.hypsmooth(self.NJTSD * (1.0 + self.TNJTSD * (TRatio - 1.0)) - 0.01, 1.0e-3) + 0.01
@@ -1697,10 +1876,9 @@ class BSIMCMG:
             NJTSSWGD_t = self.hypsmooth(self.NJTSSWGD * (1.0 + self.TNJTSSWGD * (TRatio - 1.0)) - 0.01, 1.0e-3) + 0.01
 
         if 'VFBSD' not in self.given:
-            if self.NGATE > 0.0:
-                vfbsd = devsign * (self.hypsmooth(0.5 * Eg - Vtm * self.lln(self.NGATE / ni), 1.0e-4) - (0.5 * Eg - devsign * (0.5 * Eg - self.hypsmooth(0.5 * Eg - Vtm * self.lln(self.NSD / ni), 1.0e-4))))
-            else:
-                vfbsd = devsign * (PHIG_i - (self.EASUB + 0.5 * Eg - devsign * (0.5 * Eg - self.hypsmooth(0.5 * Eg - Vtm * self.lln(self.NSD / ni), 1.0e-4))))
+            vfbsd = np.where(self.NGATE > 0.0,
+                s.devsign * (self.hypsmooth(0.5 * Eg - Vtm * self.lln(self.NGATE / ni), 1.0e-4) - (0.5 * Eg - s.devsign * (0.5 * Eg - self.hypsmooth(0.5 * Eg - Vtm * self.lln(self.NSD / ni), 1.0e-4)))),
+                s.devsign * (s.PHIG_i - (self.EASUB + 0.5 * Eg - s.devsign * (0.5 * Eg - self.hypsmooth(0.5 * Eg - Vtm * self.lln(self.NSD / ni), 1.0e-4)))))
         else:
             vfbsd = self.VFBSD
 
@@ -1709,12 +1887,12 @@ class BSIMCMG:
         else:
             vfbsdcv = self.VFBSDCV
 
-        phib = Vtm * self.lln(nbody / ni)
-        vbi = Vtm * self.lln(nbody * self.NSD / (ni * ni))
+        phib = Vtm * self.lln(s.nbody / ni)
+        vbi = Vtm * self.lln(s.nbody * self.NSD / (ni * ni))
 
         # deltaPhi definition and polysilicon depletion
         # deltaPhi: workfunction difference between the gate and the n+ source.
-        deltaPhi = devsign * (PHIG_i - (self.EASUB + (0.0 if self.TYPE == 1 else Eg)))
+        deltaPhi = s.devsign * (s.PHIG_i - (self.EASUB + (0.0 if self.TYPE == 1 else Eg)))
 
         # Mobility degradation
         eta_mu = 0.5 * ETAMOB_t
@@ -1724,132 +1902,125 @@ class BSIMCMG:
         # Junction current and capacitance
         if self.BULKMOD != 0:
             # Source-side junction current
-            Isbs = self.ASEJ * JSS_t + self.PSEJ * JSWS_t + self.TFIN * NFINtotal * JSWGS_t
-            if Isbs > 0.0:
-                Nvtms = Vtm * self.NJS
-                XExpBVS = self.lexp(-self.BVS / Nvtms) * self.XJBVS
-                T2 = max(self.IJTHSFWD / Isbs, 10.0)
-                Tb = 1.0 + T2 - XExpBVS
-                VjsmFwd = Nvtms * self.lln(0.5 * (Tb + sqrt(Tb * Tb + 4.0 * XExpBVS)))
-                T0 = self.lexp(VjsmFwd / Nvtms)
-                IVjsmFwd = Isbs * (T0 - XExpBVS / T0 + XExpBVS - 1.0)
-                SslpFwd = Isbs * (T0 + XExpBVS / T0) / Nvtms
-                T2 = self.hypsmooth(self.IJTHSREV / Isbs - 10.0, 1.0e-3) + 10.0
-                VjsmRev = -self.BVS - Nvtms * self.lln((T2 - 1.0) / self.XJBVS)
-                T1 = self.XJBVS * self.lexp(-(self.BVS + VjsmRev) / Nvtms)
-                IVjsmRev = Isbs * (1.0 + T1)
-                SslpRev = -Isbs * T1 / Nvtms
+            Isbs = self.ASEJ * JSS_t + self.PSEJ * JSWS_t + self.TFIN * s.NFINtotal * JSWGS_t
+            Nvtms = Vtm * self.NJS
+            XExpBVS = self.lexp(-self.BVS / Nvtms) * self.XJBVS
+            T2 = np.maximum(self.IJTHSFWD / Isbs, 10.0)
+            Tb = 1.0 + T2 - XExpBVS
+            VjsmFwd = Nvtms * self.lln(0.5 * (Tb + np.sqrt(Tb * Tb + 4.0 * XExpBVS)))
+            T0 = self.lexp(VjsmFwd / Nvtms)
+            IVjsmFwd = Isbs * (T0 - XExpBVS / T0 + XExpBVS - 1.0)
+            SslpFwd = Isbs * (T0 + XExpBVS / T0) / Nvtms
+            T2 = self.hypsmooth(self.IJTHSREV / Isbs - 10.0, 1.0e-3) + 10.0
+            VjsmRev = -self.BVS - Nvtms * self.lln((T2 - 1.0) / self.XJBVS)
+            T1 = self.XJBVS * self.lexp(-(self.BVS + VjsmRev) / Nvtms)
+            IVjsmRev = Isbs * (1.0 + T1)
+            SslpRev = -Isbs * T1 / Nvtms
 
             # Drain-side junction current
-            Isbd = self.ADEJ * JSD_t + self.PDEJ * JSWD_t + self.TFIN * NFINtotal * JSWGD_t
-            if Isbd > 0.0:
-                Nvtmd = Vtm * self.NJD
-                XExpBVD = self.lexp(-self.BVD / Nvtmd) * self.XJBVD
-                T2 = max(self.IJTHDFWD / Isbd, 10.0)
-                Tb = 1.0 + T2 - XExpBVD
-                VjdmFwd = Nvtmd * self.lln(0.5 * (Tb + sqrt(Tb * Tb + 4.0 * XExpBVD)))
-                T0 = self.lexp(VjdmFwd / Nvtmd)
-                IVjdmFwd = Isbd * (T0 - XExpBVD / T0 + XExpBVD - 1.0)
-                DslpFwd = Isbd * (T0 + XExpBVD / T0) / Nvtmd
-                T2 = self.hypsmooth(IJTHDREV / Isbd - 10.0, 1.0e-3) + 10.0
-                VjdmRev = -self.BVD - Nvtmd * self.lln((T2 - 1.0) / self.XJBVD)
-                T1 = self.XJBVD * self.lexp(-(self.BVD + VjdmRev) / Nvtmd)
-                IVjdmRev = Isbd * (1.0 + T1)
-                DslpRev = -Isbd * T1 / Nvtmd
+            Isbd = self.ADEJ * JSD_t + self.PDEJ * JSWD_t + self.TFIN * s.NFINtotal * JSWGD_t
+            Nvtmd = Vtm * self.NJD
+            XExpBVD = self.lexp(-self.BVD / Nvtmd) * self.XJBVD
+            T2 = np.maximum(self.IJTHDFWD / Isbd, 10.0)
+            Tb = 1.0 + T2 - XExpBVD
+            VjdmFwd = Nvtmd * self.lln(0.5 * (Tb + np.sqrt(Tb * Tb + 4.0 * XExpBVD)))
+            T0 = self.lexp(VjdmFwd / Nvtmd)
+            IVjdmFwd = Isbd * (T0 - XExpBVD / T0 + XExpBVD - 1.0)
+            DslpFwd = Isbd * (T0 + XExpBVD / T0) / Nvtmd
+            T2 = self.hypsmooth(self.IJTHDREV / Isbd - 10.0, 1.0e-3) + 10.0
+            VjdmRev = -self.BVD - Nvtmd * self.lln((T2 - 1.0) / self.XJBVD)
+            T1 = self.XJBVD * self.lexp(-(self.BVD + VjdmRev) / Nvtmd)
+            IVjdmRev = Isbd * (1.0 + T1)
+            DslpRev = -Isbd * T1 / Nvtmd
 
         # Generation-Recombination Current
-        T0 = Eg / Vtm * (TRatio - 1.0)
-        T1 = T0 / NTGEN_i
-        igentemp = self.lexp(T1)
+        if 'gen' in s.plan:
+            T0 = Eg / Vtm * (TRatio - 1.0)
+            T1 = T0 / s.NTGEN_i
+            igentemp = self.lexp(T1)
 
         # Bias-dependent calculations
         # Load terminal voltages
 
-        vgs_noswap = devsign * (self.vg - self.vs)
-        vds_noswap = devsign * (self.vd - self.vs)
-        vgd_noswap = devsign * (self.vg - self.vd)
-        ves_jct = devsign * (self.vb - self.vs)
-        ved_jct = devsign * (self.vb - self.vd)
-        vge = devsign * (self.vg - self.vb)
+        vgs_noswap = s.devsign * (vg - vs)
+        vds_noswap = s.devsign * (vd - vs)
+        vgd_noswap = s.devsign * (vg - vd)
+        ves_jct = s.devsign * (vb - vs)
+        ved_jct = s.devsign * (vb - vd)
+        vge = s.devsign * (vg - vb)
 
         # Source-drain interchange
-        sigvds = 1.0
-        if vds_noswap < 0.0:
-            sigvds = -1.0
-            vgs = vgs_noswap - vds_noswap
-            vds = -1.0 * vds_noswap
-            ves = ved_jct
-        else:
-            vgs = vgs_noswap
-            vds = vds_noswap
-            ves = ves_jct
+        sigvds = np.where(vds_noswap < 0.0, -1.0, 1.0)
+        vgs = np.where(vds_noswap < 0.0, vgs_noswap - vds_noswap, vgs_noswap)
+        vds = np.where(vds_noswap < 0.0, -1.0 * vds_noswap, vds_noswap)
+        ves = np.where(vds_noswap < 0.0, ved_jct, ves_jct)
         vgsfb = vgs - deltaPhi
 
         # Initialize certain variables to zero to prevent unnecessary update
         etaiv = Qes = Qesj = Qeg = Qed = Qedj = 0.0
 
         # Vds smoothing
-        vdsx = sqrt(vds * vds + 0.01) - 0.1
+        vdsx = np.sqrt(vds * vds + 0.01) - 0.1
 
         # Ves smoothing
         if self.BULKMOD != 0:
             vesx = ves - 0.5 * (vds - vdsx)
-            vesmax = 0.95 * PHIBE_i
+            vesmax = 0.95 * s.PHIBE_i
             T2 = vesmax - vesx - 1.0e-3
-            veseff = vesmax - 0.5 * (T2 + sqrt(T2 * T2 + 0.004 * vesmax))
+            veseff = vesmax - 0.5 * (T2 + np.sqrt(T2 * T2 + 0.004 * vesmax))
 
         # Asymmetry model
-        T0 = tanh(0.6 * vds_noswap / Vtm)
+        T0 = np.tanh(0.6 * vds_noswap / Vtm)
         wf = 0.5 + 0.5 * T0
         wr = 1.0 - wf
         if self.ASYMMOD != 0:
-            CDSCD_a = CDSCDR_i * wr + CDSCD_i * wf
+            CDSCD_a = s.CDSCDR_i * wr + s.CDSCD_i * wf
             ETA0_a = ETA0R_t * wr + ETA0_t * wf
-            PDIBL1_a = PDIBL1R_i * wr + PDIBL1_i * wf
-            PDIBL2_a = PDIBL2R_i * wr + PDIBL2_i * wf
+            PDIBL1_a = s.PDIBL1R_i * wr + s.PDIBL1_i * wf
+            PDIBL2_a = s.PDIBL2R_i * wr + s.PDIBL2_i * wf
             MEXP_a = MEXPR_t * wr + MEXP_t * wf
             PTWG_a = PTWGR_t * wr + PTWG_t * wf
             VSAT1_a = VSAT1R_t * wr + VSAT1_t * wf
             RSDR_a = RSDRR_t * wr + RSDR_t * wf
             RDDR_a = RDDRR_t * wr + RDDR_t * wf
-            PCLM_a = PCLMR_i * wr + PCLM_i * wf
+            PCLM_a = s.PCLMR_i * wr + s.PCLM_i * wf
             VSAT_a = VSATR_t * wr + VSAT_t * wf
-            KSATIV_a = KSATIVR_i * wr + KSATIV_i * wf
-            DVTSHIFT_a = DVTSHIFTR_i * wr + DVTSHIFT_i * wf
-            CIT_a = CITR_i * wr + CIT_i * wf
+            KSATIV_a = s.KSATIVR_i * wr + s.KSATIV_i * wf
+            DVTSHIFT_a = s.DVTSHIFTR_i * wr + s.DVTSHIFT_i * wf
+            CIT_a = s.CITR_i * wr + s.CIT_i * wf
             u0_a = u0r * wr + u0 * wf
             UA_a = UAR_t * wr + UA_t * wf
             UD_a = UDR_t * wr + UD_t * wf
             UC_a = UCR_t * wr + UC_t * wf
-            EU_a = EUR_i * wr + EU_i * wf
+            EU_a = s.EUR_i * wr + s.EU_i * wf
         else:
-            CDSCD_a = CDSCD_i
+            CDSCD_a = s.CDSCD_i
             ETA0_a = ETA0_t
-            PDIBL1_a = PDIBL1_i
-            PDIBL2_a = PDIBL2_i
+            PDIBL1_a = s.PDIBL1_i
+            PDIBL2_a = s.PDIBL2_i
             MEXP_a = MEXP_t
             PTWG_a = PTWG_t
             VSAT1_a = VSAT1_t
             RSDR_a = RSDR_t
             RDDR_a = RDDR_t
-            PCLM_a = PCLM_i
+            PCLM_a = s.PCLM_i
             VSAT_a = VSAT_t
-            KSATIV_a = KSATIV_i
-            DVTSHIFT_a = DVTSHIFT_i
-            CIT_a = CIT_i
+            KSATIV_a = s.KSATIV_i
+            DVTSHIFT_a = s.DVTSHIFT_i
+            CIT_a = s.CIT_i
             u0_a = u0
             UA_a = UA_t
             UD_a = UD_t
             UC_a = UC_t
-            EU_a = EU_i
+            EU_a = s.EU_i
 
         # Drain saturation voltage
         inv_MEXP = 1.0 / MEXP_a
 
         # SCE, DIBL, SS degradation effects Ref: BSIM4
-        phist = 0.4 + phib + PHIN_i
-        T1 = 2.0 * (Cins / Weff_UFCM) / (rc + 2.0)
-        cdsc = Theta_SW * (CDSC_i + CDSCD_a * vdsx)
+        phist = 0.4 + phib + s.PHIN_i
+        T1 = 2.0 * (s.Cins / s.Weff_UFCM) / (s.rc + 2.0)
+        cdsc = s.Theta_SW * (s.CDSC_i + CDSCD_a * vdsx)
 
         if 'NVTM' not in self.given:
             nVtm = Vtm * ThetaSS * (1.0 + (CIT_a + cdsc) / T1)
@@ -1857,25 +2028,25 @@ class BSIMCMG:
             nVtm = self.NVTM
 
         # temp deped UFCM
-        qdep = Qdep_ov_Cins / nVtm
-        vth_fixed_factor_SI = log(Cins * nVtm / (1.60219e-19 * Nc * 2.0 * Ach))
-        vth_fixed_factor_Sub = log((qdep * rc) * (qdep * rc) / ((exp(qdep * rc) - qdep * rc - 1.0))) + vth_fixed_factor_SI
-        q0 = 10.0 * nVtm / rc + 2.0 * qbs
+        qdep = s.Qdep_ov_Cins / nVtm
+        vth_fixed_factor_SI = np.log(s.Cins * nVtm / (1.60219e-19 * Nc * 2.0 * s.Ach))
+        vth_fixed_factor_Sub = np.log((qdep * s.rc) * (qdep * s.rc) / ((np.exp(qdep * s.rc) - qdep * s.rc - 1.0))) + vth_fixed_factor_SI
+        q0 = 10.0 * nVtm / s.rc + 2.0 * s.qbs
 
         # New QM parameter calculation: fieldnormalizationfactor, auxQMfact, QMFACTORCVfinal
-        fieldnormalizationfactor = Vtm * Cins / (Weff_UFCM * epssub)
-        auxQMfact = pow(((3.0 / 4.0) * 3.0 * 1.05457e-34 * 2.0 * 3.14159265358979323846 * 1.60219e-19 / (4.0 * sqrt(2.0 * mx))), 2.0 / 3.0)
-        QMFACTORCVfinal = self.QMFACTORCV * auxQMfact * pow(fieldnormalizationfactor, 2.0 / 3.0) * (1.0 / (1.60219e-19 * Vtm))
+        fieldnormalizationfactor = Vtm * s.Cins / (s.Weff_UFCM * s.epssub)
+        auxQMfact = np.power(((3.0 / 4.0) * 3.0 * 1.05457e-34 * 2.0 * 3.14159265358979323846 * 1.60219e-19 / (4.0 * np.sqrt(2.0 * s.mx))), 2.0 / 3.0)
+        QMFACTORCVfinal = self.QMFACTORCV * auxQMfact * np.power(fieldnormalizationfactor, 2.0 / 3.0) * (1.0 / (1.60219e-19 * Vtm))
 
-        dvth_vtroll = -DVT0_i * Theta_SCE * (vbi - phist)
-        dvth_dibl = -ETA0_a * Theta_DIBL * vdsx + (DVTP0_i * Theta_DITS * pow(vdsx, DVTP1_i))
-        dvth_rsce = K1RSCE_i * Theta_RSCE * sqrt(phist)
+        dvth_vtroll = -s.DVT0_i * s.Theta_SCE * (vbi - phist)
+        dvth_dibl = -ETA0_a * s.Theta_DIBL * vdsx + (s.DVTP0_i * s.Theta_DITS * np.power(vdsx, s.DVTP1_i))
+        dvth_rsce = s.K1RSCE_i * s.Theta_RSCE * np.sqrt(phist)
         dvth_all = dvth_vtroll + dvth_dibl + dvth_rsce + dvth_temp + DVTSHIFT_a
         vgsfb = vgsfb - dvth_all
 
         # Vgs Clamping for Inversion Region Calculation in Accumulation
-        beta0 = u0_a * cox * Weff0 / Leff
-        T0 = -(dvch_qm + nVtm * self.lln(2.0 * cox * self.IMIN / (beta0 * nVtm * 1.60219e-19 * Nc * self.TFIN)))
+        beta0 = u0_a * s.cox * s.Weff0 / s.Leff
+        T0 = -(dvch_qm + nVtm * self.lln(2.0 * s.cox * self.IMIN / (beta0 * nVtm * 1.60219e-19 * Nc * self.TFIN)))
         T1 = vgsfb + T0 + self.DELVTRAND
         vgsfbeff = self.hypsmooth(T1 , 1.0e-4) - T0
 
@@ -1884,46 +2055,57 @@ class BSIMCMG:
 
         if self.BULKMOD != 0:
             T1 = self.hypsmooth(2.0 * phib + vch - ves, 0.1)
-            T3 = (-K1_t / (2.0 * nVtm)) * (sqrt(T1) - sqrt(2.0 * phib))
-            T0 = -qdep - T3 + vth_fixed_factor_Sub + QMFACTORCVfinal * pow(-qdep, 2.0/3.0)
+            T3 = (-K1_t / (2.0 * nVtm)) * (np.sqrt(T1) - np.sqrt(2.0 * phib))
+            T0 = -qdep - T3 + vth_fixed_factor_Sub + QMFACTORCVfinal * np.power(-qdep, 2.0/3.0)
             T1 = -qdep - T3 + vth_fixed_factor_SI
         else:
-            T0 = -qdep + vth_fixed_factor_Sub + QMFACTORCVfinal * pow(-qdep, 2.0/3.0)
+            T0 = -qdep + vth_fixed_factor_Sub + QMFACTORCVfinal * np.power(-qdep, 2.0/3.0)
             T1 = -qdep + vth_fixed_factor_SI
 
         T2 = (vgsfbeff - vch) / nVtm
         F0 = -T2 + T1
         T3 = 0.5 * (T2 - T0)
-        qm = exp(T3)
-        if qm > 1.0e-7:
-            T7 = log(1.0 + qm)
-            qm = 2.0 * (1.0 - sqrt(1.0 + T7 * T7))
-            T8 = (qm * self.ALPHA_UFCM + qdep) * rc
-            T4 = T8 / (exp(T8) - T8 - 1.0)
-            T5 = T8 * T4
-            e0 = F0 - qm + log(-qm) + log(T5) + QMFACTORCVfinal * pow(-(qm + qdep), 2.0 / 3.0)
-            e1 = -1.0 + 1.0 / qm + (2.0 / T8 - T4 - 1.0) * rc - (2.0 / 3.0) * QMFACTORCVfinal * pow(-(qm + qdep), -1.0 / 3.0)
-            e2 = -1.0 / (qm * qm) - (2.0 / 9.0) * QMFACTORCVfinal * pow(-(qm + qdep), -4.0/3.0)
-            qm = qm - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
-            T8 = (qm * self.ALPHA_UFCM + qdep) * rc
-            T4 = T8 / (exp(T8) - T8 - 1.0)
-            T5 = T8 * T4
-            e0 = F0 - qm + log(-qm) + log(T5) + QMFACTORCVfinal * pow(-(qm + qdep), 2.0 / 3.0)
-            e1 = -1.0 + 1.0 / qm + (2.0 / T8 - T4 - 1.0) * rc - (2.0 / 3.0) * QMFACTORCVfinal * pow(-(qm + qdep), -1.0 / 3.0)
-            e2 = -1.0 / (qm * qm) - (2.0 / 9.0) * QMFACTORCVfinal * pow(-(qm + qdep), -4.0/3.0)
-            qm = qm - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
-        else:
-            qm = -qm * qm
+        qm = np.exp(T3)
+        qm_newton = qm > 1.0e-7
+        T7 = np.log(1.0 + np.where(qm_newton, qm, 1.0))
+        qmn = 2.0 * (1.0 - np.sqrt(1.0 + T7 * T7))
+        T8 = (qmn * self.ALPHA_UFCM + qdep) * s.rc
+        T4 = T8 / (np.exp(T8) - T8 - 1.0)
+        T5 = T8 * T4
+        e0 = F0 - qmn + np.log(-qmn) + np.log(T5)
+        e1 = -1.0 + 1.0 / qmn + (2.0 / T8 - T4 - 1.0) * s.rc
+        e2 = -1.0 / (qmn * qmn)
+        if 'qmcv' in s.plan:
+            T9 = -(qmn + qdep)
+            e0 = e0 + QMFACTORCVfinal * np.power(T9, 2.0 / 3.0)
+            e1 = e1 - (2.0 / 3.0) * QMFACTORCVfinal * np.power(T9, -1.0 / 3.0)
+            e2 = e2 - (2.0 / 9.0) * QMFACTORCVfinal * np.power(T9, -4.0 / 3.0)
+        qmn = qmn - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
+        T8 = (qmn * self.ALPHA_UFCM + qdep) * s.rc
+        T4 = T8 / (np.exp(T8) - T8 - 1.0)
+        T5 = T8 * T4
+        e0 = F0 - qmn + np.log(-qmn) + np.log(T5)
+        e1 = -1.0 + 1.0 / qmn + (2.0 / T8 - T4 - 1.0) * s.rc
+        e2 = -1.0 / (qmn * qmn)
+        if 'qmcv' in s.plan:
+            T9 = -(qmn + qdep)
+            e0 = e0 + QMFACTORCVfinal * np.power(T9, 2.0 / 3.0)
+            e1 = e1 - (2.0 / 3.0) * QMFACTORCVfinal * np.power(T9, -1.0 / 3.0)
+            e2 = e2 - (2.0 / 9.0) * QMFACTORCVfinal * np.power(T9, -4.0 / 3.0)
+        qmn = qmn - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
+        qm = np.where(qm_newton, qmn, -qm * qm)
         qis = -qm * nVtm
 
         # Drain saturation voltage
-        Eeffs = EeffFactor * (qbs + eta_mu * qis)
-        qb0 = 1.0e-2 / cox
-        T2 = pow(0.5 * (1.0 + abs(qis / qb0)), UCS_t)
+        Eeffs = s.EeffFactor * (s.qbs + eta_mu * qis)
+        qb0 = 1.0e-2 / s.cox
         if self.BULKMOD != 0:
-            T3 = (UA_a + UC_a * veseff) * pow(abs(Eeffs), EU_a) + UD_a / T2
+            T3 = (UA_a + UC_a * veseff) * np.power(np.abs(Eeffs), EU_a)
         else:
-            T3 = UA_a * pow(abs(Eeffs), EU_a) + UD_a / T2
+            T3 = UA_a * np.power(np.abs(Eeffs), EU_a)
+        if 'ud' in s.plan:
+            T2 = np.power(0.5 * (1.0 + np.abs(qis / qb0)), UCS_t)
+            T3 = T3 + UD_a / T2
 
         Dmobs = 1.0 + T3
         Dmobs = Dmobs / self.U0MULT
@@ -1931,198 +2113,180 @@ class BSIMCMG:
         if self.RDSMOD == 1:
             Rdss = 0.0
         elif self.RDSMOD == 0:
-            T4 = 1.0 + PRWGS_i * qis
+            T4 = 1.0 + s.PRWGS_i * qis
             T1 = 1.0 / T4
-            T0 = 0.5 * (T1 + sqrt(T1 * T1 + 0.01))
-            Rdss = (RDSWMIN_i + RDSW_i * T0) * WeffWRFactor * NFINtotal * rdstemp
+            T0 = 0.5 * (T1 + np.sqrt(T1 * T1 + 0.01))
+            Rdss = (s.RDSWMIN_i + s.RDSW_i * T0) * s.WeffWRFactor * s.NFINtotal * rdstemp
         else:
-            T4 = 1.0 + PRWGS_i * qis
+            T4 = 1.0 + s.PRWGS_i * qis
             T1 = 1.0 / T4
-            T0 = 0.5 * (T1 + sqrt(T1 * T1 + 0.01))
-            Rdss = (RSourceGeo + RDrainGeo + RDSWMIN_i + RDSW_i * T0) * WeffWRFactor * NFINtotal * rdstemp
+            T0 = 0.5 * (T1 + np.sqrt(T1 * T1 + 0.01))
+            Rdss = (s.RSourceGeo + s.RDrainGeo + s.RDSWMIN_i + s.RDSW_i * T0) * s.WeffWRFactor * s.NFINtotal * rdstemp
         Esat = 2.0 * VSAT_a / u0_a * Dmobs
-        EsatL = Esat * Leff
+        EsatL = Esat * s.Leff
         T6 = KSATIV_a * (qis +  2 * Vtm)
 
-        if Rdss == 0.0:
-            Vdsat = EsatL * T6 / (EsatL + T6)
-        else:
-            WVCox = Weff0 * VSAT_a * cox
-            T0 = WVCox * Rdss
-            Ta = 2.0 * T0
-            Tb = T6 + EsatL + 3.0 * T6 * T0
-            Tc = T6 * (EsatL + 2.0 * T6 * T0)
-            Vdsat = (Tb - sqrt(Tb * Tb - 2.0 * Ta * Tc)) / Ta
+        WVCox = s.Weff0 * VSAT_a * s.cox
+        T0 = WVCox * Rdss
+        Ta = 2.0 * T0
+        Tb = T6 + EsatL + 3.0 * T6 * T0
+        Tc = T6 * (EsatL + 2.0 * T6 * T0)
+        Vdsat = np.where(Rdss == 0.0, EsatL * T6 / (EsatL + T6), (Tb - np.sqrt(Tb * Tb - 2.0 * Ta * Tc)) / Ta)
 
         Vdsat = self.hypsmooth(Vdsat - 1.0e-3, 1.0e-5) + 1.0e-3
-        T7 = pow(vds / Vdsat , MEXP_a)
-        T8 = pow(1.0 + T7, inv_MEXP)
+        T7 = np.power(vds / Vdsat , MEXP_a)
+        T8 = np.power(1.0 + T7, inv_MEXP)
         Vdseff = vds / T8
 
-        if Vdseff > vds:
-            Vdseff = vds
+        Vdseff = np.minimum(Vdseff, vds)
 
         # Core model calculation at drain side
         vch = Vdseff + dvch_qm
 
         if self.BULKMOD != 0:
             T1 = self.hypsmooth(2.0 * phib + vch - ves, 0.1)
-            T3 = (-K1_t / (2.0 * nVtm)) * (sqrt(T1) - sqrt(2.0 * phib))
-            T0 = -qdep - T3 + vth_fixed_factor_Sub + QMFACTORCVfinal * pow(-qdep, 2.0 / 3.0)
+            T3 = (-K1_t / (2.0 * nVtm)) * (np.sqrt(T1) - np.sqrt(2.0 * phib))
+            T0 = -qdep - T3 + vth_fixed_factor_Sub + QMFACTORCVfinal * np.power(-qdep, 2.0 / 3.0)
             T1 = -qdep - T3 + vth_fixed_factor_SI
         else:
-            T0 = -qdep + vth_fixed_factor_Sub + QMFACTORCVfinal * pow(-qdep, 2.0 / 3.0)
+            T0 = -qdep + vth_fixed_factor_Sub + QMFACTORCVfinal * np.power(-qdep, 2.0 / 3.0)
             T1 = -qdep + vth_fixed_factor_SI
         T2 = (vgsfbeff - vch) / nVtm
         F0 = -T2 + T1
         T3 = (T2 - T0) * 0.5
-        qm = exp(T3)
-        if qm > 1.0e-7:
-            T7 = log(1.0 + qm)
-            qm = 2.0 * (1.0 - sqrt(1.0 + T7 * T7))
-            T8 = (qm * self.ALPHA_UFCM + qdep) * rc
-            T4 = T8 / (exp(T8) - T8 - 1.0)
-            T5 = T8 * T4
-            e0 = F0 - qm + log(-qm) + log(T5) + QMFACTORCVfinal * pow(-(qm + qdep), 2.0 / 3.0)
-            e1 = -1.0 + (1.0 / qm) + (2.0 / T8 - T4 - 1.0) * rc - (2.0 / 3.0) * QMFACTORCVfinal * pow(-(qm + qdep), -1.0 / 3.0)
-            e2 = -1.0 / (qm * qm) - (2.0 / 9.0) * QMFACTORCVfinal * pow(-(qm + qdep), -4.0 / 3.0)
-            qm = qm - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
-            T8 = (qm * self.ALPHA_UFCM + qdep) * rc
-            T4 = T8 / (exp(T8) - T8 - 1.0)
-            T5 = T8 * T4
-            e0 = F0 - qm + log(-qm) + log(T5) + QMFACTORCVfinal * pow(-(qm + qdep), 2.0/3.0)
-            e1 = -1.0 + (1.0 / qm) + (2.0 / T8 - T4 - 1.0) * rc - (2.0 / 3.0) * QMFACTORCVfinal * pow(-(qm + qdep), -1.0 / 3.0)
-            e2 = -1.0 / (qm * qm) - (2.0 / 9.0) * QMFACTORCVfinal * pow(-(qm + qdep), -4.0 / 3.0)
-            qm = qm - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
-        else:
-            qm = -qm * qm
+        qm = np.exp(T3)
+        qm_newton = qm > 1.0e-7
+        T7 = np.log(1.0 + np.where(qm_newton, qm, 1.0))
+        qmn = 2.0 * (1.0 - np.sqrt(1.0 + T7 * T7))
+        T8 = (qmn * self.ALPHA_UFCM + qdep) * s.rc
+        T4 = T8 / (np.exp(T8) - T8 - 1.0)
+        T5 = T8 * T4
+        e0 = F0 - qmn + np.log(-qmn) + np.log(T5)
+        e1 = -1.0 + 1.0 / qmn + (2.0 / T8 - T4 - 1.0) * s.rc
+        e2 = -1.0 / (qmn * qmn)
+        if 'qmcv' in s.plan:
+            T9 = -(qmn + qdep)
+            e0 = e0 + QMFACTORCVfinal * np.power(T9, 2.0 / 3.0)
+            e1 = e1 - (2.0 / 3.0) * QMFACTORCVfinal * np.power(T9, -1.0 / 3.0)
+            e2 = e2 - (2.0 / 9.0) * QMFACTORCVfinal * np.power(T9, -4.0 / 3.0)
+        qmn = qmn - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
+        T8 = (qmn * self.ALPHA_UFCM + qdep) * s.rc
+        T4 = T8 / (np.exp(T8) - T8 - 1.0)
+        T5 = T8 * T4
+        e0 = F0 - qmn + np.log(-qmn) + np.log(T5)
+        e1 = -1.0 + 1.0 / qmn + (2.0 / T8 - T4 - 1.0) * s.rc
+        e2 = -1.0 / (qmn * qmn)
+        if 'qmcv' in s.plan:
+            T9 = -(qmn + qdep)
+            e0 = e0 + QMFACTORCVfinal * np.power(T9, 2.0 / 3.0)
+            e1 = e1 - (2.0 / 3.0) * QMFACTORCVfinal * np.power(T9, -1.0 / 3.0)
+            e2 = e2 - (2.0 / 9.0) * QMFACTORCVfinal * np.power(T9, -4.0 / 3.0)
+        qmn = qmn - (e0 / e1) * (1.0 + (e0 * e2) / (2.0 * e1 * e1))
+        qm = np.where(qm_newton, qmn, -qm * qm)
         qid = -qm * nVtm
 
         qba = 0.0
         if self.BULKMOD != 0:
-            T9 = (K1_t / (2.0 * nVtm)) * sqrt(Vtm)
+            T9 = (K1_t / (2.0 * nVtm)) * np.sqrt(Vtm)
             T0 = T9 / 2.0
-            T2 = (vge - (deltaPhi - Eg - Vtm * log(self.NBODY / Nc) + self.DELVFBACC)) / Vtm
-            if (T2 * Vtm) > phib + T9 * sqrt(phib * Vtm):
-                T1 = sqrt(T2 - 1.0 + T0 * T0) - T0
-                T10 = 1.0 + T1 * T1
-            else:
-                T3 = T2 * 0.5 - 3.0 * (1.0 + T9 / sqrt(2.0))
-                T10 = T3 + sqrt(T3 * T3 + 6.0 * T2)
-                if T2 < 0.0:
-                    T4 = (T2 - T10) / T9
-                    T10 = -log(1.0 - T10 + T4 * T4)
-                else:
-                    T11 = exp(-T10)
-                    T4 = sqrt(T2 - 1.0 + T11 + T0 * T0) - T0
-                    T10 = 1.0 - T11 + T4 * T4
-            T6 = exp(-T10) - 1.0
-            T7 = sqrt(T6 + T10)
-            if T10 > 1.0e-15:
-                e0 = -(T2 - T10) + T9 * T7
-                e1 = 1.0 - T9 * 0.5 * T6 / T7
-                T8 = T10 - (e0 / e1)
-                T11 = exp(-T8) - 1.0
-                T12 = sqrt(T11 + T8)
-                qba = -T9 * T12 * Vtm
-            else:
-                if T10 < -1.0e-15:
-                    e0 = -(T2 - T10) - T9 * T7
-                    e1 = 1.0 + T9 * 0.5 * T6 / T7
-                    T8 = T10 - e0 / e1
-                    T12 = T9 * sqrt(exp(-T8) + T8 - 1.0)
-                else:
-                    T12 = 0.0
-                    T8 = 0.0
-                qba = T12 * Vtm
-            qi_acc_for_QM = T9 * exp(-T8 / 2.0) * Vtm
+            T2 = (vge - (deltaPhi - Eg - Vtm * np.log(self.NBODY / Nc) + self.DELVFBACC)) / Vtm
+            T1 = np.sqrt(T2 - 1.0 + T0 * T0) - T0
+            T10_inv = 1.0 + T1 * T1
+            T3 = T2 * 0.5 - 3.0 * (1.0 + T9 / np.sqrt(2.0))
+            T10 = T3 + np.sqrt(T3 * T3 + 6.0 * T2)
+            T4 = (T2 - T10) / T9
+            T10_acc = -np.log(1.0 - T10 + T4 * T4)
+            T11 = np.exp(-T10)
+            T4 = np.sqrt(T2 - 1.0 + T11 + T0 * T0) - T0
+            T10_dep = 1.0 - T11 + T4 * T4
+            T10 = np.where((T2 * Vtm) > phib + T9 * np.sqrt(phib * Vtm), T10_inv, np.where(T2 < 0.0, T10_acc, T10_dep))
+            T6 = np.exp(-T10) - 1.0
+            T7 = np.sqrt(T6 + T10)
+            # T10 > 1e-15
+            e0 = -(T2 - T10) + T9 * T7
+            e1 = 1.0 - T9 * 0.5 * T6 / T7
+            T8_pos = T10 - (e0 / e1)
+            T11 = np.exp(-T8_pos) - 1.0
+            T12 = np.sqrt(T11 + T8_pos)
+            qba_pos = -T9 * T12 * Vtm
+            # T10 < -1e-15
+            e0 = -(T2 - T10) - T9 * T7
+            e1 = 1.0 + T9 * 0.5 * T6 / T7
+            T8_neg = T10 - e0 / e1
+            T12 = T9 * np.sqrt(np.exp(-T8_neg) + T8_neg - 1.0)
+            T8 = np.where(T10 > 1.0e-15, T8_pos, np.where(T10 < -1.0e-15, T8_neg, 0.0))
+            qba = np.where(T10 > 1.0e-15, qba_pos, np.where(T10 < -1.0e-15, T12 * Vtm, 0.0))
+            qi_acc_for_QM = T9 * np.exp(-T8 / 2.0) * Vtm
 
         # Drain side and average potential / charge
         qia = 0.5 * (qis + qid)
         dqi = qis - qid
 
-        T0 = pow(Vdseff, 2.0) / 6.25e-4
-        if self.CHARGEWF != 0.0:
-            qia2 = 0.5 * (qis + qid) + self.CHARGEWF * (1.0 - self.lexp(-T0)) * 0.5 * dqi
-        else:
-            qia2 = 0.5 * (qis + qid)
+        T0 = np.power(Vdseff, 2.0) / 6.25e-4
+        qia2 = np.where(self.CHARGEWF != 0.0, 0.5 * (qis + qid) + self.CHARGEWF * (1.0 - self.lexp(-T0)) * 0.5 * dqi, 0.5 * (qis + qid))
 
         # Multiplication factor for IV
-        beta = u0_a * cox * Weff0 / Leff
+        beta = u0_a * s.cox * s.Weff0 / s.Leff
 
         # Mobility degradation
-        Eeffm = EeffFactor * (qba + eta_mu * qia2)
-        T2 = pow(0.5 * (1.0 + abs(qia2 / qb0)), UCS_t)
+        Eeffm = s.EeffFactor * (qba + eta_mu * qia2)
         if self.BULKMOD != 0:
-            T3 = (UA_a + UC_a * veseff) * pow(abs(Eeffm), EU_a) + UD_a / T2
+            T3 = (UA_a + UC_a * veseff) * np.power(np.abs(Eeffm), EU_a)
         else:
-            T3 = UA_a * pow(abs(Eeffm), EU_a) + UD_a / T2
+            T3 = UA_a * np.power(np.abs(Eeffm), EU_a)
+        if 'ud' in s.plan:
+            T2 = np.power(0.5 * (1.0 + np.abs(qia2 / qb0)), UCS_t)
+            T3 = T3 + UD_a / T2
 
         Dmob = 1.0 + T3
         Dmob = Dmob / self.U0MULT
         ueff = u0_a / Dmob
 
         # Calculate current and capacitance enhancement factors due to CLM and DIBL
-        tmp = DROUT_i * Leff / scl + 1.0e-6
-        if tmp < 40.0:
-            DIBLfactor = 0.5 * PDIBL1_a / (cosh(tmp) - 1.0) + PDIBL2_a
-        else:
-            DIBLfactor = PDIBL1_a * exp(-tmp) + PDIBL2_a
+        tmp = s.DROUT_i * s.Leff / s.scl + 1.0e-6
+        DIBLfactor = np.where(tmp < 40.0, 0.5 * PDIBL1_a / (np.cosh(tmp) - 1.0) + PDIBL2_a, PDIBL1_a * np.exp(-tmp) + PDIBL2_a)
 
-        if PVAG_i > 0.0:
-            PVAGfactor = 1.0 + PVAG_i * qia / EsatL
-        else:
-            PVAGfactor = 1.0 / (1.0 - PVAG_i * qia / EsatL)
+        PVAGfactor = np.where(s.PVAG_i > 0.0, 1.0 + s.PVAG_i * qia / EsatL, 1.0 / (1.0 - s.PVAG_i * qia / EsatL))
 
         diffVds = vds - Vdseff
         Vgst2Vtm = qia + 2.0 * Vtm
-        if DIBLfactor > 0.0:
-            T1 = Vgst2Vtm
-            T3 = T1 / (Vdsat + T1)
-            VaDIBL = T1 / DIBLfactor * T3 * PVAGfactor
-            Moc = 1.0 + diffVds / VaDIBL
-        else:
-            Moc = 1.0
+        T1 = Vgst2Vtm
+        T3 = T1 / (Vdsat + T1)
+        VaDIBL = T1 / DIBLfactor * T3 * PVAGfactor
+        Moc = np.where(DIBLfactor > 0.0, 1.0 + diffVds / VaDIBL, 1.0)
 
-        if PCLM_a > 0.0:
-            if PCLMG_i < 0.0:
-                T1 = 1.0 / (1.0 / PCLM_a - PCLMG_i * qia)
-            else:
-                T1 = PCLM_a + PCLMG_i * qia
-            Mclm = 1.0 + T1 * self.lln(1.0 + (vds - Vdseff) / T1 / (Vdsat + EsatL))
-        else:
-            Mclm = 1.0
+        T1 = np.where(s.PCLMG_i < 0.0, 1.0 / (1.0 / PCLM_a - s.PCLMG_i * qia), PCLM_a + s.PCLMG_i * qia)
+        Mclm = np.where(PCLM_a > 0.0, 1.0 + T1 * self.lln(1.0 + (vds - Vdseff) / T1 / (Vdsat + EsatL)), 1.0)
 
         Moc = Moc * Mclm
 
         # Current degradation Factor Due to Velocity Saturation
         Esat1 = 2.0 * VSAT1_a / ueff
-        Esat1L = Esat1 * Leff
-        T0 = self.lexp(PSAT_i * self.lln(dqi / Esat1L))
-        Ta = (1.0 + self.lexp(1.0 / PSAT_i * self.lln(DELTAVSAT_i)))
-        Dvsat = (1.0 + self.lexp(1.0 / PSAT_i * self.lln(DELTAVSAT_i + T0))) / Ta
+        Esat1L = Esat1 * s.Leff
+        T0 = self.lexp(s.PSAT_i * self.lln(dqi / Esat1L))
+        Ta = (1.0 + self.lexp(1.0 / s.PSAT_i * self.lln(s.DELTAVSAT_i)))
+        Dvsat = (1.0 + self.lexp(1.0 / s.PSAT_i * self.lln(s.DELTAVSAT_i + T0))) / Ta
         Dvsat = Dvsat + 0.5 * PTWG_a * qia * dqi * dqi
 
         # Non-saturation effect
         T0 = A1_t + A2_t / (qia + 2.0 * nVtm)
         T1 = T0 * dqi * dqi
         T2 = T1 + 1.0 - 0.001
-        T3 = -1.0 + 0.5 * (T2 + sqrt(T2 * T2 + 0.004))
-        Nsat = 0.5 * (1.0 + sqrt(1.0 + T3))
+        T3 = -1.0 + 0.5 * (T2 + np.sqrt(T2 * T2 + 0.004))
+        Nsat = 0.5 * (1.0 + np.sqrt(1.0 + T3))
         Dvsat = Dvsat * Nsat
 
         # Lateral non-uniform doping effect (IV-CV Vth shift) factor
-        if K0_t != 0.0:
-            T1 = K0_t / (max(0, K0SI_t + K0SISAT_t * dqi * dqi) * qia + 2.0 * nVtm)
-            Mnud = self.lexp(-T1)
-        else:
-            Mnud = 1.0
+        Mnud = 1.0
+        if 'nud' in s.plan:
+            T1 = K0_t / (np.maximum(0, K0SI_t + K0SISAT_t * dqi * dqi) * qia + 2.0 * nVtm)
+            Mnud = np.where(K0_t != 0.0, self.lexp(-T1), 1.0)
 
         # Body-effect factor for BULKMOD = 2
         if self.BULKMOD == 2:
             T0 = self.hypsmooth((K2_t + K2SAT_t * vdsx), 1.0e-6)
-            T1 = T0 / (max(0, K2SI_t + K2SISAT_t * dqi * dqi) * qia + 2.0 * nVtm)
-            T3 = sqrt(PHIBE_i - veseff) - sqrt(PHIBE_i)
+            T1 = T0 / (np.maximum(0, K2SI_t + K2SISAT_t * dqi * dqi) * qia + 2.0 * nVtm)
+            T3 = np.sqrt(s.PHIBE_i - veseff) - np.sqrt(s.PHIBE_i)
             Mob = self.lexp(- T1 * T3)
         else:
             Mob = 1.0
@@ -2135,123 +2299,114 @@ class BSIMCMG:
 
         # S/D series resistance
         if self.RDSMOD == 0:
-            Rsource = RSourceGeo
-            Rdrain = RDrainGeo
-            T4 = 1.0 + PRWGS_i * qia
+            Rsource = s.RSourceGeo
+            Rdrain = s.RDrainGeo
+            T4 = 1.0 + s.PRWGS_i * qia
             T1 = 1.0 / T4
-            T0 = 0.5 * (T1 + sqrt(T1 * T1 + 0.01))
-            Rdsi = rdstemp * (RDSWMIN_i + RDSW_i * T0) * WeffWRFactor
-            Dr = 1.0 + NFINtotal * beta * ids0_ov_dqi / (Dmob * Dvsat) * Rdsi
+            T0 = 0.5 * (T1 + np.sqrt(T1 * T1 + 0.01))
+            Rdsi = rdstemp * (s.RDSWMIN_i + s.RDSW_i * T0) * s.WeffWRFactor
+            Dr = 1.0 + s.NFINtotal * beta * ids0_ov_dqi / (Dmob * Dvsat) * Rdsi
         elif self.RDSMOD == 1:
             Rdsi = 0.0
             Dr = 1.0
             T2 = vgs_noswap - vfbsd
-            T3 = sqrt(T2 * T2 + 1.0e-1)
+            T3 = np.sqrt(T2 * T2 + 1.0e-1)
             vgs_eff = 0.5 * (T2 + T3)
-            T4 = 1.0 + PRWGS_i * vgs_eff
+            T4 = 1.0 + s.PRWGS_i * vgs_eff
             T1 = 1.0 / T4
-            T0 = 0.5 * (T1 + sqrt(T1 * T1 + 0.01))
+            T0 = 0.5 * (T1 + np.sqrt(T1 * T1 + 0.01))
             # V(si, s) needs to be defined
-            T5 = RSW_i * (1.0 + RSDR_a * self.lexp(0.5 * self.PRSDR * self.lln(V(si, s) * V(si, s) + 1.0e-6)))
-            Rsource = rdstemp * (RSourceGeo + (RSWMIN_i + T5 * T0) * WeffWRFactor)
+            T5 = s.RSW_i * (1.0 + RSDR_a * self.lexp(0.5 * self.PRSDR * self.lln(V(si, s) * V(si, s) + 1.0e-6)))
+            Rsource = rdstemp * (s.RSourceGeo + (s.RSWMIN_i + T5 * T0) * s.WeffWRFactor)
             T2 = vgd_noswap - vfbsd
-            T3 = sqrt(T2 * T2 + 1.0e-1)
+            T3 = np.sqrt(T2 * T2 + 1.0e-1)
             vgd_eff = 0.5 * (T2 + T3)
-            T4 = 1.0 + PRWGD_i * vgd_eff
+            T4 = 1.0 + s.PRWGD_i * vgd_eff
             T1 = 1.0 / T4
-            T0 = 0.5 * (T1 + sqrt(T1 * T1 + 0.01))
+            T0 = 0.5 * (T1 + np.sqrt(T1 * T1 + 0.01))
             # V(di, d) needs to be defined
-            T5 = RDW_i * (1.0 + RDDR_a * self.lexp(0.5 * self.PRDDR * self.lln(V(di, d) * V(di, d) + 1.0e-6)))
-            Rdrain = rdstemp * (RDrainGeo + (RDWMIN_i + T5 * T0) * WeffWRFactor)
+            T5 = s.RDW_i * (1.0 + RDDR_a * self.lexp(0.5 * self.PRDDR * self.lln(V(di, d) * V(di, d) + 1.0e-6)))
+            Rdrain = rdstemp * (s.RDrainGeo + (s.RDWMIN_i + T5 * T0) * s.WeffWRFactor)
         elif self.RDSMOD == 2:
-            T4 = 1.0 + PRWGS_i * qia
+            T4 = 1.0 + s.PRWGS_i * qia
             T1 = 1.0 / T4
-            T0 = 0.5 * (T1 + sqrt(T1 * T1 + 0.01))
-            Rdsi = rdstemp * (RSourceGeo + RDrainGeo + RDSWMIN_i + RDSW_i * T0) * WeffWRFactor
-            Dr = 1.0 + NFINtotal * beta * ids0_ov_dqi / (Dmob * Dvsat) * Rdsi
+            T0 = 0.5 * (T1 + np.sqrt(T1 * T1 + 0.01))
+            Rdsi = rdstemp * (s.RSourceGeo + s.RDrainGeo + s.RDSWMIN_i + s.RDSW_i * T0) * s.WeffWRFactor
+            Dr = 1.0 + s.NFINtotal * beta * ids0_ov_dqi / (Dmob * Dvsat) * Rdsi
             Rsource = 0.0
             Rdrain = 0.0
 
-        ids = NFINtotal * beta * ids0 * Moc * Mnud * Mob / (Dmob * Dvsat * Dr)
+        ids = s.NFINtotal * beta * ids0 * Moc * Mnud * Mob / (Dmob * Dvsat * Dr)
         ids = ids * self.IDS0MULT
 
         # Impact ionization current (Ref: IIMOD = 1 from BSIM4 Model, IIMOD = 2 from BSIMSOI Model)
         Iii = 0.0
-        if self.IIMOD == 1:
-            T0 = (ALPHA0_t + ALPHA1_t * Leff) / Leff
-            if T0 <= 0.0 or BETA0_t <= 0.0:
-                Iii = 0.0
-            else:
-                T1 = -BETA0_t / (diffVds + 1.0e-30)
-                Iii = T0 * diffVds * ids * self.lexp(T1)
-        elif self.IIMOD == 2:
-            ALPHAII = (ALPHAII0_t + ALPHAII1_t * Leff) / Leff
-            if ALPHAII <= 0.0:
-                Iii = 0.0
-            else:
-                T0 = ESATII_i * Leff
-                T1 = SII0_t * T0 / (1.0 + T0)
-                T0 = 1.0 / (1.0 + hypsmooth(SII1_i * vgsfbeff, self.IIMOD2CLAMP1))
-                T3 = T0 + SII2_i
-                T2 = self.hypsmooth(vgsfbeff * T3, self.IIMOD2CLAMP2)
-                T3 = 1.0 / (1.0 + SIID_i * vds)
-                VgsStep = T1 * T2 * T3
-                Vdsatii = VgsStep * (1.0 - LII_i / Leff)
-                Vdiff = vds - Vdsatii
-                T0 = BETAII2_i + BETAII1_i * Vdiff + BETAII0_i * Vdiff * Vdiff
-                T1 = sqrt(T0 * T0 + 1.0e-10)
-                Ratio = -self.hypmax(-ALPHAII * lexp(Vdiff / T1), -10.0, self.IIMOD2CLAMP3)
-                Iii = Ratio * ids
+        if 'ii1' in s.plan:
+            T0 = (ALPHA0_t + ALPHA1_t * s.Leff) / s.Leff
+            T1 = -BETA0_t / (diffVds + 1.0e-30)
+            Iii = np.where((T0 <= 0.0) | (BETA0_t <= 0.0), 0.0, T0 * diffVds * ids * self.lexp(T1))
+        elif 'ii2' in s.plan:
+            ALPHAII = (ALPHAII0_t + ALPHAII1_t * s.Leff) / s.Leff
+            T0 = s.ESATII_i * s.Leff
+            T1 = SII0_t * T0 / (1.0 + T0)
+            T0 = 1.0 / (1.0 + self.hypsmooth(s.SII1_i * vgsfbeff, self.IIMOD2CLAMP1))
+            T3 = T0 + s.SII2_i
+            T2 = self.hypsmooth(vgsfbeff * T3, self.IIMOD2CLAMP2)
+            T3 = 1.0 / (1.0 + s.SIID_i * vds)
+            VgsStep = T1 * T2 * T3
+            Vdsatii = VgsStep * (1.0 - s.LII_i / s.Leff)
+            Vdiff = vds - Vdsatii
+            T0 = s.BETAII2_i + s.BETAII1_i * Vdiff + s.BETAII0_i * Vdiff * Vdiff
+            T1 = np.sqrt(T0 * T0 + 1.0e-10)
+            Ratio = -self.hypmax(-ALPHAII * self.lexp(Vdiff / T1), -10.0, self.IIMOD2CLAMP3)
+            Iii = np.where(ALPHAII <= 0.0, 0.0, Ratio * ids)
 
         # Gate current Ref: BSIM4
         igbinv = igbacc = igcs = igcd = igs = igd = 0.0
 
         # Igb
-        if self.IGBMOD != 0:
+        if 'igb' in s.plan:
             # Igbinv
-            T1 = (qia - EIGBINV_i) / NIGBINV_i / Vtm
-            Vaux_Igbinv = NIGBINV_i * Vtm * self.lln(1.0 + self.lexp(T1))
-            T2 = AIGBINV_t - BIGBINV_i * qia
-            T3 = 1.0 + CIGBINV_i * qia
+            T1 = (qia - s.EIGBINV_i) / s.NIGBINV_i / Vtm
+            Vaux_Igbinv = s.NIGBINV_i * Vtm * self.lln(1.0 + self.lexp(T1))
+            T2 = AIGBINV_t - s.BIGBINV_i * qia
+            T3 = 1.0 + s.CIGBINV_i * qia
             T4 = -9.82222e11 * self.TOXG * T2 * T3
             T5 = self.lexp(T4)
             T6 = 3.75956e-7
-            igbinv = Weff0 * Leff * T6 * Toxratio * vge * Vaux_Igbinv * T5
+            igbinv = s.Weff0 * s.Leff * T6 * s.Toxratio * vge * Vaux_Igbinv * T5
             igbinv = igbinv * igtemp
 
             # Igbacc
             vfbzb = deltaPhi - (Eg / 2.0) - phib
             T0 = vfbzb - vge
-            T1 = T0 / NIGBACC_i / Vtm
-            Vaux_Igbacc = NIGBACC_i * Vtm * self.lln(1.0 + self.lexp(T1))
+            T1 = T0 / s.NIGBACC_i / Vtm
+            Vaux_Igbacc = s.NIGBACC_i * Vtm * self.lln(1.0 + self.lexp(T1))
             if self.BULKMOD != 0:
                 Voxacc = qi_acc_for_QM
             else:
-                if vfbzb <= 0.0:
-                    Voxacc = 0.5 * (T0 - 0.02 + sqrt((T0 - 0.02) * (T0 - 0.02) - 0.08 * vfbzb))
-                else:
-                    Voxacc = 0.5 * (T0 - 0.02 + sqrt((T0 - 0.02) * (T0 - 0.02) + 0.08 * vfbzb))
+                Voxacc = 0.5 * (T0 - 0.02 + np.sqrt((T0 - 0.02) * (T0 - 0.02) + 0.08 * np.abs(vfbzb)))
 
-            T2 = AIGBACC_t - BIGBACC_i * Voxacc
-            T3 = 1.0 + CIGBACC_i * Voxacc
+            T2 = AIGBACC_t - s.BIGBACC_i * Voxacc
+            T3 = 1.0 + s.CIGBACC_i * Voxacc
             T4 = -7.45669e11 * self.TOXG * T2 * T3
             T5 = self.lexp(T4)
             T6 = 4.97232e-7
-            igbacc = Weff0 * Leff * T6 * Toxratio * vge * Vaux_Igbacc * T5
+            igbacc = s.Weff0 * s.Leff * T6 * s.Toxratio * vge * Vaux_Igbacc * T5
             igbacc = igbacc * igtemp
 
-        if self.IGCMOD != 0:
+        if 'igc' in s.plan:
             # Igcinv
-            T1 = AIGC_t - BIGC_i * qia
-            T2 = 1.0 + CIGC_i * qia
-            T3 = -Bechvb * self.TOXG * T1 * T2
+            T1 = AIGC_t - s.BIGC_i * qia
+            T2 = 1.0 + s.CIGC_i * qia
+            T3 = -s.Bechvb * self.TOXG * T1 * T2
             T4 = qia * self.lexp(T3)
             T5 = (vge + 0.5 * vdsx + 0.5 * (ves_jct + ved_jct))
-            igc0 = Weff0 * Leff * Aechvb * Toxratio * T4 * T5 * igtemp
+            igc0 = s.Weff0 * s.Leff * s.Aechvb * s.Toxratio * T4 * T5 * igtemp
 
             # Gate-Current Partitioning
-            Vdseffx = sqrt(Vdseff * Vdseff + 0.01) - 0.1
-            T1 = PIGCD_i * Vdseffx
+            Vdseffx = np.sqrt(Vdseff * Vdseff + 0.01) - 0.1
+            T1 = s.PIGCD_i * Vdseffx
             T1_exp = self.lexp(-T1)
             T3 = T1 + T1_exp - 1.0 + 1.0e-4
             T4 = 1.0 - (T1 + 1.0) * T1_exp + 1.0e-4
@@ -2261,194 +2416,136 @@ class BSIMCMG:
 
             # Igs
             T0 = vgs_noswap - vfbsd
-            vgs_eff = sqrt(T0 * T0 + 1.0e-4)
+            vgs_eff = np.sqrt(T0 * T0 + 1.0e-4)
+            CIGS_i = s.CIGS_i
             if self.IGCLAMP == 1:
-                T1 = self.hypsmooth((AIGS_t - BIGS_i * vgs_eff), 1.0e-6)
-                if CIGS_i < 0.01:
-                    CIGS_i = 0.01
+                T1 = self.hypsmooth((AIGS_t - s.BIGS_i * vgs_eff), 1.0e-6)
+                CIGS_i = np.maximum(CIGS_i, 0.01)
             else:
-                T1 = AIGS_t - BIGS_i * vgs_eff
+                T1 = AIGS_t - s.BIGS_i * vgs_eff
             T2 = 1.0 + CIGS_i * vgs_eff
-            T3 = -Bechvb * self.TOXG * POXEDGE_i * T1 * T2
+            T3 = -s.Bechvb * self.TOXG * s.POXEDGE_i * T1 * T2
             T4 = self.lexp(T3)
-            if sigvds > 0.0:
-                igs = igsd_mult * self.DLCIGS * vgs_noswap * vgs_eff * T4
-            else:
-                igd = igsd_mult * self.DLCIGS * vgs_noswap * vgs_eff * T4
+            igs_s = igsd_mult * self.DLCIGS * vgs_noswap * vgs_eff * T4
 
             # Igd
             T0 = vgd_noswap - vfbsd
-            vgd_eff = sqrt(T0 * T0 + 1.0e-4)
+            vgd_eff = np.sqrt(T0 * T0 + 1.0e-4)
+            CIGD_i = s.CIGD_i
             if self.IGCLAMP == 1:
-                T1 = self.hypsmooth((AIGD_t - BIGD_i * vgd_eff), 1.0e-6)
-                if CIGD_i < 0.01:
-                    CIGD_i = 0.01
+                T1 = self.hypsmooth((AIGD_t - s.BIGD_i * vgd_eff), 1.0e-6)
+                CIGD_i = np.maximum(CIGD_i, 0.01)
             else:
-                T1 = AIGD_t - BIGD_i * vgd_eff
+                T1 = AIGD_t - s.BIGD_i * vgd_eff
             T2 = 1.0 + CIGD_i * vgd_eff
-            T3 = -Bechvb * self.TOXG * POXEDGE_i * T1 * T2
+            T3 = -s.Bechvb * self.TOXG * s.POXEDGE_i * T1 * T2
             T4 = self.lexp(T3)
-            if sigvds > 0.0:
-                igd = igsd_mult * self.DLCIGD * vgd_noswap * vgd_eff * T4
-            else:
-                igs = igsd_mult * self.DLCIGD * vgd_noswap * vgd_eff * T4
+            igd_d = igsd_mult * self.DLCIGD * vgd_noswap * vgd_eff * T4
+            igs = np.where(sigvds > 0.0, igs_s, igd_d)
+            igd = np.where(sigvds > 0.0, igd_d, igs_s)
 
         # GIDL/GISL current Ref: BSIM4
         igisl = igidl = 0.0
 
-        if self.GIDLMOD != 0:
-            T0 = epsratio * self.EOT
+        if 'gidl' in s.plan:
+            T0 = s.epsratio * self.EOT
             # GIDL
-            if AGIDL_i <= 0.0 or BGIDL_t <= 0.0:
-                T6 = 0.0
-            else:
-                T1 = (-vgd_noswap - EGIDL_i + vfbsd) / T0
-                T1 = self.hypsmooth(T1, 1.0e-2)
-                T2 = BGIDL_t / (T1 + 1.0e-3)
-                T3 = self.lexp(PGIDL_i * self.lln(T1))
+            T1 = (-vgd_noswap - s.EGIDL_i + vfbsd) / T0
+            T1 = self.hypsmooth(T1, 1.0e-2)
+            T2 = BGIDL_t / (T1 + 1.0e-3)
+            T3 = self.lexp(s.PGIDL_i * self.lln(T1))
             if self.BULKMOD != 0:
                 T4 = -ved_jct * ved_jct * ved_jct
-                T4a = CGIDL_i + abs(T4) + 1.0e-5
+                T4a = s.CGIDL_i + np.abs(T4) + 1.0e-5
                 T5 = self.hypsmooth(T4 / T4a, 1.0e-6) - 1.0e-6
-                T6 = AGIDL_i * Weff0 * T3 * self.lexp(-T2) * T5
-            else:
-                T6 = AGIDL_i * Weff0 * T3 * self.lexp(-T2) * vds_noswap
-
-            if sigvds > 0.0:
-                igidl = T6
+                T6 = s.AGIDL_i * s.Weff0 * T3 * self.lexp(-T2) * T5
             else:
-                igisl = T6
+                T6 = s.AGIDL_i * s.Weff0 * T3 * self.lexp(-T2) * vds_noswap
+            igidl_d = np.where((s.AGIDL_i <= 0.0) | (BGIDL_t <= 0.0), 0.0, T6)
 
             # GISL
-            if AGISL_i <= 0.0 or BGISL_t <= 0.0:
-                T6 = 0.0
-            else:
-                T1 = (-vgs_noswap - EGISL_i + vfbsd) / T0
-                T1 = self.hypsmooth(T1, 1.0e-2)
-                T2 = BGISL_t / (T1 + 1.0e-3)
-                T3 = self.lexp(PGISL_i * self.lln(T1))
+            T1 = (-vgs_noswap - s.EGISL_i + vfbsd) / T0
+            T1 = self.hypsmooth(T1, 1.0e-2)
+            T2 = BGISL_t / (T1 + 1.0e-3)
+            T3 = self.lexp(s.PGISL_i * self.lln(T1))
             if self.BULKMOD != 0:
                 T4 = -ves_jct * ves_jct * ves_jct
-                T4a = CGISL_i + abs(T4) + 1.0e-5
+                T4a = s.CGISL_i + np.abs(T4) + 1.0e-5
                 T5 = self.hypsmooth(T4 / T4a, 1.0e-6) - 1.0e-6
-                T6 = AGISL_i * Weff0 * T3 * self.lexp(-T2) * T5
+                T6 = s.AGISL_i * s.Weff0 * T3 * self.lexp(-T2) * T5
             else:
-                T6 = -vds_noswap * AGISL_i * Weff0 * T3 * self.lexp(-T2)
+                T6 = -vds_noswap * s.AGISL_i * s.Weff0 * T3 * self.lexp(-T2)
+            igisl_s = np.where((s.AGISL_i <= 0.0) | (BGISL_t <= 0.0), 0.0, T6)
 
-            if sigvds > 0.0:
-              igisl = T6
-            else:
-              igidl = T6
+            igidl = np.where(sigvds > 0.0, igidl_d, igisl_s)
+            igisl = np.where(sigvds > 0.0, igisl_s, igidl_d)
 
         # Junction current
         if self.BULKMOD != 0:
             # Source-side junction current
-            if Isbs > 0.0:
-                if ves_jct < VjsmRev:
-                    T0 = ves_jct / Nvtms
-                    T1 = self.lexp(T0) - 1.0
-                    T2 = IVjsmRev + SslpRev * (ves_jct - VjsmRev)
-                    Ies = T1 * T2
-                elif ves_jct <= VjsmFwd:
-                    T0 = ves_jct / Nvtms
-                    T1 = (self.BVS + ves_jct) / Nvtms
-                    T2 = self.lexp(-T1)
-                    Ies = Isbs * (self.lexp(T0) + XExpBVS - 1.0 - self.XJBVS * T2)
-                else:
-                    Ies = IVjsmFwd + SslpFwd * (ves_jct - VjsmFwd)
-            else:
-                Ies = 0.0
+            T0 = ves_jct / Nvtms
+            T1 = self.lexp(T0) - 1.0
+            T2 = IVjsmRev + SslpRev * (ves_jct - VjsmRev)
+            Ies_rev = T1 * T2
+            T1 = (self.BVS + ves_jct) / Nvtms
+            T2 = self.lexp(-T1)
+            Ies_mid = Isbs * (self.lexp(T0) + XExpBVS - 1.0 - self.XJBVS * T2)
+            Ies_fwd = IVjsmFwd + SslpFwd * (ves_jct - VjsmFwd)
+            Ies = np.where(ves_jct < VjsmRev, Ies_rev, np.where(ves_jct <= VjsmFwd, Ies_mid, Ies_fwd))
+            Ies = np.where(Isbs > 0.0, Ies, 0.0)
+
             # Source-side junction tunneling current
-            if JTSS_t > 0.0:
-                if self.VTSS - ves_jct < self.VTSS * 1.0e-3:
-                    T0 = -ves_jct / Vtm0 / NJTS_t
-                    T1 = self.lexp(T0 * 1.0e3) - 1.0
-                    Ies = Ies - self.ASEJ * JTSS_t * T1
-                else:
-                    T0 = -ves_jct / Vtm0 / NJTS_t
-                    T1 = self.lexp(T0 * self.VTSS / (self.VTSS - ves_jct)) - 1.0
-                    Ies = Ies - self.ASEJ * JTSS_t * T1
-
-            if JTSSWS_t > 0.0:
-                if self.VTSSWS - ves_jct < self.VTSSWS * 1.0e-3:
-                    T0 = -ves_jct / Vtm0 / NJTSSW_t
-                    T1 = self.lexp(T0 * 1.0e3) - 1.0
-                    Ies = Ies - self.PSEJ * JTSSWS_t * T1
-                else:
-                    T0 = -ves_jct / Vtm0 / NJTSSW_t
-                    T1 = self.lexp(T0 * self.VTSSWS / (self.VTSSWS - ves_jct)) - 1.0
-                    Ies = Ies - self.PSEJ * JTSSWS_t * T1
-
-            if JTSSWGS_t > 0.0:
-                if self.VTSSWGS - ves_jct < self.VTSSWGS * 1.0e-3:
-                    T0 = -ves_jct / Vtm0 / NJTSSWG_t
-                    T1 = self.lexp(T0 * 1.0e3) - 1.0
-                    Ies = Ies - Weff0 * NFINtotal * JTSSWGS_t * T1
-                else:
-                    T0 = -ves_jct / Vtm0 / NJTSSWG_t
-                    T1 = self.lexp(T0 * self.VTSSWGS / (self.VTSSWGS - ves_jct)) - 1.0
-                    Ies = Ies - Weff0 * NFINtotal * JTSSWGS_t * T1
+            T0 = -ves_jct / Vtm0 / NJTS_t
+            T1 = np.where(self.VTSS - ves_jct < self.VTSS * 1.0e-3, self.lexp(T0 * 1.0e3), self.lexp(T0 * self.VTSS / (self.VTSS - ves_jct))) - 1.0
+            Ies = Ies - np.where(JTSS_t > 0.0, self.ASEJ * JTSS_t * T1, 0.0)
+
+            T0 = -ves_jct / Vtm0 / NJTSSW_t
+            T1 = np.where(self.VTSSWS - ves_jct < self.VTSSWS * 1.0e-3, self.lexp(T0 * 1.0e3), self.lexp(T0 * self.VTSSWS / (self.VTSSWS - ves_jct))) - 1.0
+            Ies = Ies - np.where(JTSSWS_t > 0.0, self.PSEJ * JTSSWS_t * T1, 0.0)
+
+            T0 = -ves_jct / Vtm0 / NJTSSWG_t
+            T1 = np.where(self.VTSSWGS - ves_jct < self.VTSSWGS * 1.0e-3, self.lexp(T0 * 1.0e3), self.lexp(T0 * self.VTSSWGS / (self.VTSSWGS - ves_jct))) - 1.0
+            Ies = Ies - np.where(JTSSWGS_t > 0.0, s.Weff0 * s.NFINtotal * JTSSWGS_t * T1, 0.0)
 
             # Drain-side junction current
-            if Isbd > 0.0:
-                if ved_jct < VjdmRev:
-                    T0 = ved_jct / Nvtmd
-                    T1 = self.lexp(T0) - 1.0
-                    T2 = IVjdmRev + DslpRev * (ved_jct - VjdmRev)
-                    Ied = T1 * T2
-                elif ved_jct <= VjdmFwd:
-                    T0 = ved_jct / Nvtmd
-                    T1 = (BVD + ved_jct) / Nvtmd
-                    T2 = self.lexp(-T1)
-                    Ied = Isbd * (self.lexp(T0) + XExpBVD - 1.0 - XJBVD * T2)
-                else:
-                    Ied = IVjdmFwd + DslpFwd * (ved_jct - VjdmFwd)
-            else:
-                Ied = 0.0
+            T0 = ved_jct / Nvtmd
+            T1 = self.lexp(T0) - 1.0
+            T2 = IVjdmRev + DslpRev * (ved_jct - VjdmRev)
+            Ied_rev = T1 * T2
+            T1 = (self.BVD + ved_jct) / Nvtmd
+            T2 = self.lexp(-T1)
+            Ied_mid = Isbd * (self.lexp(T0) + XExpBVD - 1.0 - self.XJBVD * T2)
+            Ied_fwd = IVjdmFwd + DslpFwd * (ved_jct - VjdmFwd)
+            Ied = np.where(ved_jct < VjdmRev, Ied_rev, np.where(ved_jct <= VjdmFwd, Ied_mid, Ied_fwd))
+            Ied = np.where(Isbd > 0.0, Ied, 0.0)
 
             # Drain-side junction tunneling current
-            if JTSD_t > 0.0:
-                if self.VTSD - ved_jct < self.VTSD * 1.0e-3:
-                    T0 = -ved_jct / Vtm0 / NJTSD_t
-                    T1 = self.lexp(T0 * 1.0e3) - 1.0
-                    Ied = Ied - self.ADEJ * JTSD_t * T1
-                else:
-                    T0 = -ved_jct / Vtm0 / NJTSD_t
-                    T1 = self.lexp(T0 * self.VTSD / (self.VTSD - ved_jct)) - 1.0
-                    Ied = Ied - self.ADEJ * JTSD_t * T1
-
-            if JTSSWD_t > 0.0:
-                if self.VTSSWD - ved_jct < self.VTSSWD * 1.0e-3:
-                    T0 = -ved_jct / Vtm0 / NJTSSWD_t
-                    T1 = self.lexp(T0 * 1.0e3) - 1.0
-                    Ied = Ied - self.PDEJ * JTSSWD_t * T1
-                else:
-                    T0 = -ved_jct / Vtm0 / NJTSSWD_t
-                    T1 = self.lexp(T0 * self.VTSSWD / (self.VTSSWD - ved_jct)) - 1.0
-                    Ied = Ied - self.PDEJ * JTSSWD_t * T1
-
-            if JTSSWGD_t > 0.0:
-                if self.VTSSWGD - ved_jct < self.VTSSWGD * 1.0e-3:
-                    T0 = -ved_jct / Vtm0 / NJTSSWGD_t
-                    T1 = self.lexp(T0 * 1.0e3) - 1.0
-                    Ied = Ied - Weff0 * NFINtotal * JTSSWGD_t * T1
-                else:
-                    T0 = -ved_jct / Vtm0 / NJTSSWGD_t
-                    T1 = self.lexp(T0 * self.VTSSWGD / (self.VTSSWGD - ved_jct)) - 1.0
-                    Ied = Ied - Weff0 * NFINtotal * JTSSWGD_t * T1
+            T0 = -ved_jct / Vtm0 / NJTSD_t
+            T1 = np.where(self.VTSD - ved_jct < self.VTSD * 1.0e-3, self.lexp(T0 * 1.0e3), self.lexp(T0 * self.VTSD / (self.VTSD - ved_jct))) - 1.0
+            Ied = Ied - np.where(JTSD_t > 0.0, self.ADEJ * JTSD_t * T1, 0.0)
+
+            T0 = -ved_jct / Vtm0 / NJTSSWD_t
+            T1 = np.where(self.VTSSWD - ved_jct < self.VTSSWD * 1.0e-3, self.lexp(T0 * 1.0e3), self.lexp(T0 * self.VTSSWD / (self.VTSSWD - ved_jct))) - 1.0
+            Ied = Ied - np.where(JTSSWD_t > 0.0, self.PDEJ * JTSSWD_t * T1, 0.0)
+
+            T0 = -ved_jct / Vtm0 / NJTSSWGD_t
+            T1 = np.where(self.VTSSWGD - ved_jct < self.VTSSWGD * 1.0e-3, self.lexp(T0 * 1.0e3), self.lexp(T0 * self.VTSSWGD / (self.VTSSWGD - ved_jct))) - 1.0
+            Ied = Ied - np.where(JTSSWGD_t > 0.0, s.Weff0 * s.NFINtotal * JTSSWGD_t * T1, 0.0)
 
         # Generation-recombination component
-        idsgen = self.HFIN * self.TFIN * (Leff - 2.0 * LINTIGEN_i) * igentemp * vds * (AIGEN_i + BIGEN_i * vds * vds)
-
-        igidl = NFINtotal * igidl
-        igisl = NFINtotal * igisl
-        igcd = NFINtotal * igcd
-        igcs = NFINtotal * igcs
-        igs = NFINtotal * igs
-        igd = NFINtotal * igd
-        igbinv = NFINtotal * igbinv
-        igbacc = NFINtotal * igbacc
-        idsgen = NFINtotal * idsgen
+        idsgen = 0.0
+        if 'gen' in s.plan:
+            idsgen = self.HFIN * self.TFIN * (s.Leff - 2.0 * s.LINTIGEN_i) * igentemp * vds * (s.AIGEN_i + s.BIGEN_i * vds * vds)
+
+        igidl = s.NFINtotal * igidl
+        igisl = s.NFINtotal * igisl
+        igcd = s.NFINtotal * igcd
+        igcs = s.NFINtotal * igcs
+        igs = s.NFINtotal * igs
+        igd = s.NFINtotal * igd
+        igbinv = s.NFINtotal * igbinv
+        igbacc = s.NFINtotal * igbacc
+        idsgen = s.NFINtotal * idsgen
 
         # Gate to body tunneling current empirical partition for BULKMOD = 0
         igbs = igbd = 0.0
@@ -2458,49 +2555,152 @@ class BSIMCMG:
 
         # Total drain/source currents
         if self.BULKMOD != 0:
-            if sigvds > 0.0:
-                id_tot = devsign * (ids + idsgen - igd - igcd + Iii + igidl - Ied)
-                is_tot = -devsign * (ids + idsgen + igs + igcs - igisl + Ies)
-            else:
-                id_tot = -devsign * (ids + idsgen + igs + igcs - igisl + Ied)
-                is_tot = devsign * (ids + idsgen - igd - igcd + Iii + igidl - Ies)
+            id_tot = np.where(sigvds > 0.0, s.devsign * (ids + idsgen - igd - igcd + Iii + igidl - Ied),
+                -s.devsign * (ids + idsgen + igs + igcs - igisl + Ied))
+            is_tot = np.where(sigvds > 0.0, -s.devsign * (ids + idsgen + igs + igcs - igisl + Ies),
+                s.devsign * (ids + idsgen - igd - igcd + Iii + igidl - Ies))
         else:
-            if sigvds > 0.0:
-                id_tot = devsign * (ids + idsgen - igd - igcd - igbd + Iii + igidl - igisl)
-                is_tot = -devsign * (ids + idsgen + igs + igcs + igbs - igisl + igidl)
-            else:
-                id_tot = -devsign * (ids + idsgen + igs + igcs + igbd - igisl + igidl)
-                is_tot = devsign * (ids + idsgen - igd - igcd - igbs + Iii + igidl - igisl)
+            id_tot = np.where(sigvds > 0.0, s.devsign * (ids + idsgen - igd - igcd - igbd + Iii + igidl - igisl),
+                -s.devsign * (ids + idsgen + igs + igcs + igbd - igisl + igidl))
+            is_tot = np.where(sigvds > 0.0, -s.devsign * (ids + idsgen + igs + igcs + igbs - igisl + igidl),
+                s.devsign * (ids + idsgen - igd - igcd - igbs + Iii + igidl - igisl))
 
         # Total gate current
         if self.BULKMOD == 0:
-            ig_tot = devsign * (igs + igd + igcs + igcd + igbs + igbd)
+            ig_tot = s.devsign * (igs + igd + igcs + igcd + igbs + igbd)
         else:
-            ig_tot = devsign * (igs + igd + igcs + igcd + igbacc + igbinv)
+            ig_tot = s.devsign * (igs + igd + igcs + igcd + igbacc + igbinv)
 
         # Total substrate current
         if self.BULKMOD != 0:
-            ib_tot = -devsign * (Iii - Ies - Ied + igbinv + igbacc + igisl + igidl)
+            ib_tot = -s.devsign * (Iii - Ies - Ied + igbinv + igbacc + igisl + igidl)
         else:
             ib_tot = 0.0
 
+        if info is not None:
+            local = locals()
+            info.update((name, local.get(name, 0.0)) for name in OPINFO)
+
         return [id_tot, ig_tot, is_tot, ib_tot]
 
+def _same(a, b):
+    if a is b:
+        return True
+    try:
+        return np.shape(a) == np.shape(b) and bool(np.all(a == b))
+    except (TypeError, ValueError):
+        return False
+
+class _SetupGraph:
+    """
+    Statement-level dependency graph of setup(): which top-level statements read
+    which parameters and locals, and which locals they write. Also lists the
+    parameter defaults of __init__ that are derived from other parameters.
+    """
+
+    def __init__(self):
+        fn = ast.parse(textwrap.dedent(inspect.getsource(BSIMCMG.setup))).body[0]
+        body = [stmt for stmt in fn.body if not isinstance(stmt, ast.Return)]
+        self.code = [compile(ast.Module([stmt], []), '<setup>', 'exec') for stmt in body]
+        local = {n.id for n in ast.walk(fn) if isinstance(n, ast.Name) and isinstance(n.ctx, ast.Store)}
+        self.params = {} # parameter -> statements reading it
+        self.reads, self.writes = [], []
+        for i, stmt in enumerate(body):
+            reads, writes = set(), set()
+            for n in ast.walk(stmt):
+                if isinstance(n, ast.Attribute) and isinstance(n.value, ast.Name) and n.value.id == 'self':
+                    self.params.setdefault(n.attr, set()).add(i)
+                elif isinstance(n, ast.Name) and n.id in local:
+                    (writes if isinstance(n.ctx, ast.Store) else reads).add(n.id)
+                elif isinstance(n, ast.Call) and isinstance(n.func, ast.Attribute) and \
+                        isinstance(n.func.value, ast.Name) and n.func.value.id in local:
+                    # In-place method calls on locals (plan.add) count as writes
+                    writes.add(n.func.value.id)
+            self.reads.append(reads)
+            self.writes.append(writes)
+        self.writers = {}
+        for i, writes in enumerate(self.writes):
+            for name in writes:
+                self.writers.setdefault(name, []).append(i)
+        self.readers = {}
+        for i, reads in enumerate(self.reads):
+            for name in reads & set(self.writers):
+                self.readers.setdefault(name, []).append(i)
+        # Writers whose value may reach statement i: back to the last unconditional one
+        self.reaching = []
+        for i, reads in enumerate(self.reads):
+            defs = []
+            for name in reads:
+                for w in reversed([w for w in self.writers.get(name, ()) if w < i]):
+                    defs.append(w)
+                    if isinstance(body[w], ast.Assign):
+                        break
+            self.reaching.append(defs)
+        self.memo = {}
+        # __init__ statements 'self.X = self.given.get(KEY, default)': key, X, attributes
+        # read by the default and the compiled statement
+        fn = ast.parse(textwrap.dedent(inspect.getsource(BSIMCMG.__init__))).body[0]
+        self.defaults = []
+        self.by_key, self.by_read = {}, {}
+        for stmt in fn.body:
+            if isinstance(stmt.value, ast.Call) and ast.unparse(stmt.value.func) == 'self.given.get':
+                i = len(self.defaults)
+                key = stmt.value.args[0].value
+                self.defaults.append((key, stmt.targets[0].attr, compile(ast.Module([stmt], []), '<init>', 'exec')))
+                self.by_key.setdefault(key, []).append(i)
+                for n in ast.walk(stmt.value.args[1]):
+                    if isinstance(n, ast.Attribute):
+                        self.by_read.setdefault(n.attr, []).append(i)
+
+    def rerun(self, changed):
+        """Code objects of the statements to rerun, in order, after params in changed."""
+        key = frozenset(changed)
+        if key not in self.memo:
+            todo = [i for name in key for i in self.params.get(name, ())]
+            dirty = set()
+            while todo:
+                i = todo.pop()
+                if i in dirty:
+                    continue
+                dirty.add(i)
+                for name in self.writes[i]:
+                    # Later readers, and later writers so the final value is restored
+                    todo += [j for j in self.readers.get(name, ()) if j > i]
+                    todo += [j for j in self.writers[name] if j > i]
+                for w in self.reaching[i]:
+                    # An overwritten input must be recomputed before it is read again
+                    if any(w != self.writers[name][-1] for name in self.writes[w] & self.reads[i]):
+                        todo.append(w)
+            self.memo[key] = [self.code[i] for i in sorted(dirty)]
+        return self.memo[key]
+
+_graph = None
+
+def _setup_graph():
+    global _graph
+    if _graph is None:
+        _graph = _SetupGraph()
+    return _graph
+
 def read_mdl(file):
     mdl = {}
+    # Line by line, so a large card file is never held in memory at once
     with open(file,'r') as f:
-        lines = f.read().splitlines()
-    for line in lines:
-        param, value = re.split('[=\s]+', line)
-        mdl[param] = float(value)
+        for line in f:
+            line = line.strip()
+            if line:
+                param, value = re.split('[=\s]+', line)
+                mdl[param] = float(value)
     return mdl
 
-filepath = "modelcard.l"
-param = read_mdl(filepath)
+if __name__ == '__main__':
+    filepath = "modelcard.l"
+    param = read_mdl(filepath)
+    bias = {k: param.pop(k) for k in ('vd', 'vg', 'vs', 'vb', 'temp') if k in param}
 
-Id, Ig, Is, Ib = BSIMCMG(**param).calc()
+    Id, Ig, Is, Ib = BSIMCMG(**param).calc(**bias)
 
-print(f'Id = {Id:>16.9e} A')
-print(f'Ig = {Ig:>16.9e} A')
-print(f'Is = {Is:>16.9e} A')
-print(f'Ib = {Ib:>16.9e} A')
\ No newline at end of file
+    print(f'Id = {Id:>16.9e} A')
+    print(f'Ig = {Ig:>16.9e} A')
+    print(f'Is = {Is:>16.9e} A')
+    print(f'Ib = {Ib:>16.9e} A')
\ No newline at end of file
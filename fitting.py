@@ -0,0 +1,213 @@
+import ast
+import inspect
+import textwrap
+from types import SimpleNamespace
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+from sensitivity import sensitivities
+
+OUTPUTS = ('Id', 'Ig', 'Is', 'Ib')
+
+
+def _limits(value, name):
+    # (lo, hi) of a clamp expression on name: np.maximum(x, lo), np.minimum(x, hi),
+    # or np.where(x < lo, ..., x) / np.where(x > hi, ..., x)
+    lo, hi = -np.inf, np.inf
+    if not isinstance(value, ast.Call) or not value.args:
+        return None
+    func, args = ast.unparse(value.func), value.args
+    if func in ('np.maximum', 'np.minimum') and len(args) == 2:
+        inner = (-np.inf, np.inf) if ast.unparse(args[0]) == name else _limits(args[0], name)
+        try:
+            limit = float(ast.literal_eval(args[1]))
+        except ValueError:
+            return None
+        if inner is None:
+            return None
+        lo, hi = inner
+        return (max(lo, limit), hi) if func == 'np.maximum' else (lo, min(hi, limit))
+    if func == 'np.where' and len(args) == 3 and ast.unparse(args[2]) == name:
+        test = args[0]
+        if not (isinstance(test, ast.Compare) and len(test.ops) == 1 and ast.unparse(test.left) == name):
+            return None
+        try:
+            limit = float(ast.literal_eval(test.comparators[0]))
+        except ValueError:
+            return None
+        if isinstance(test.ops[0], (ast.Lt, ast.LtE)):
+            lo = limit
+        elif isinstance(test.ops[0], (ast.Gt, ast.GtE)):
+            hi = limit
+        return lo, hi
+    return None
+
+
+def clamp_bounds():
+    """
+    Range limits that BSIMCMG.setup() applies to binned parameters, read from its
+    'X_i = np.maximum(X_i, limit)' and 'X_i = np.where(X_i < limit, ..., X_i)'
+    statements. Keys are model parameter names.
+    """
+    tree = ast.parse(textwrap.dedent(inspect.getsource(BSIMCMG.setup)))
+    bounds = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Assign) or len(node.targets) != 1 or not isinstance(node.targets[0], ast.Name):
+            continue
+        name = node.targets[0].id
+        limits = _limits(node.value, name) if name.endswith('_i') else None
+        if limits is None:
+            continue
+        lo, hi = bounds.get(name[:-2], (-np.inf, np.inf))
+        bounds[name[:-2]] = (max(lo, limits[0]), min(hi, limits[1]))
+    return bounds
+
+
+BOUNDS = clamp_bounds()
+
+
+class Dataset:
+    """
+    Measured points, grouped by instance parameters (L, NFIN, ...) so that each
+    group is evaluated by one batched calc() call.
+    """
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, measured, vd, vg, vs=0.0, vb=0.0, temp=27.0, output='Id', weight=1.0, **instance):
+        """Add a curve; biases, measured values and weights broadcast against each other."""
+        cols = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (vd, vg, vs, vb, temp, measured, weight)))
+        cols = [c.ravel() for c in cols]
+        key = tuple(sorted(instance.items()))
+        group = self.groups.setdefault(key, [[] for _ in range(8)])
+        for col, c in zip(group, cols + [np.full(cols[0].size, OUTPUTS.index(output))]):
+            col.append(c)
+
+    def arrays(self):
+        """Yield (instance, [vd, vg, vs, vb, temp, measured, weight, output]) per group."""
+        for key, group in self.groups.items():
+            cols = [np.concatenate(c) for c in group]
+            cols[7] = cols[7].astype(int)
+            yield dict(key), cols
+
+    def __len__(self):
+        return sum(sum(c.size for c in group[0]) for group in self.groups.values())
+
+
+class Problem:
+    """Residuals of a card against a Dataset as a function of the free parameter vector."""
+
+    def __init__(self, card, data, names, floor=1.0e-12, jacobian='dual'):
+        if jacobian not in ('dual', 'fd'):
+            raise ValueError(f'unknown jacobian method: {jacobian}')
+        self.card = dict(card)
+        self.names = list(names)
+        self.groups = list(data.arrays())
+        self.floor = floor
+        self.method = jacobian
+        self.devices = [BSIMCMG(**{**self.card, **instance}) for instance, _ in self.groups]
+        self.nfev = 0
+
+    def model(self, x):
+        # One device per group, updated in place so only dependent setup work is redone
+        params = dict(zip(self.names, x))
+        out = []
+        for dev, (instance, (vd, vg, vs, vb, temp, measured, weight, output)) in zip(self.devices, self.groups):
+            dev.update(**params)
+            res = np.array(dev.calc(vd, vg, vs, vb, temp))
+            out.append(res[output, np.arange(output.size)])
+        self.nfev += 1
+        return np.concatenate(out)
+
+    def residual(self, x):
+        # Relative error, with floor keeping near-zero currents from dominating
+        model = self.model(x)
+        r = []
+        start = 0
+        for _, (vd, vg, vs, vb, temp, measured, weight, output) in self.groups:
+            m = model[start:start + measured.size]
+            r.append(weight * (m - measured) / (np.abs(measured) + self.floor))
+            start += measured.size
+        return np.concatenate(r)
+
+    def jacobian(self, x, r, lo, hi):
+        if self.method == 'dual':
+            return self.dual_jacobian(x)
+        # Forward differences; the step is taken inward at a bound
+        J = np.empty((r.size, x.size))
+        for j in range(x.size):
+            h = 1.5e-8 * max(abs(x[j]), 1.0)
+            if x[j] + h > hi[j]:
+                h = -h
+            xp = x.copy()
+            xp[j] += h
+            J[:, j] = (self.residual(xp) - r) / h
+        return J
+
+    def dual_jacobian(self, x):
+        # Forward-mode derivatives of all groups, one pass per group
+        params = dict(zip(self.names, x))
+        J = []
+        for instance, (vd, vg, vs, vb, temp, measured, weight, output) in self.groups:
+            dev = BSIMCMG(**{**self.card, **instance, **params})
+            _, derivs = sensitivities(dev, self.names, vd, vg, vs, vb, temp)
+            dm = np.array(derivs)[output, np.arange(output.size)]
+            J.append((weight / (np.abs(measured) + self.floor))[:, None] * dm)
+        self.nfev += 1
+        return np.concatenate(J)
+
+
+def fit(card, data, params, bounds=None, maxiter=50, tol=1.0e-10, floor=1.0e-12, jacobian='dual'):
+    """
+    Levenberg-Marquardt fit of params to a Dataset. params is a list of names
+    (start values from the card or the model defaults) or a dict of start values.
+    Bounds default to the setup() clamps in BOUNDS; bounds overrides them per name.
+    jacobian is 'dual' (forward-mode sensitivities) or 'fd' (forward differences).
+    Returns a SimpleNamespace with params, cost, residual, niter, nfev and converged.
+    """
+    if not isinstance(params, dict):
+        default = BSIMCMG(**card)
+        params = {name: getattr(default, name) for name in params}
+    names = list(params)
+    limits = {**BOUNDS, **(bounds or {})}
+    lo = np.array([limits.get(n, (-np.inf, np.inf))[0] for n in names], dtype=float)
+    hi = np.array([limits.get(n, (-np.inf, np.inf))[1] for n in names], dtype=float)
+    x = np.clip(np.array([params[n] for n in names], dtype=float), lo, hi)
+
+    problem = Problem(card, data, names, floor, jacobian)
+    r = problem.residual(x)
+    cost = 0.5 * r @ r
+    lam = 1.0e-3
+    converged = False
+    for it in range(1, maxiter + 1):
+        J = problem.jacobian(x, r, lo, hi)
+        A = J.T @ J
+        g = J.T @ r
+        D = np.maximum(np.diag(A), 1.0e-30)
+        while True:
+            try:
+                step = np.linalg.solve(A + lam * np.diag(D), -g)
+            except np.linalg.LinAlgError:
+                step = np.linalg.lstsq(A + lam * np.diag(D), -g, rcond=None)[0]
+            trial = np.clip(x + step, lo, hi)
+            rt = problem.residual(trial)
+            ct = 0.5 * rt @ rt
+            if np.isfinite(ct) and ct < cost:
+                break
+            lam *= 10.0
+            if lam > 1.0e16:
+                break
+        if not (np.isfinite(ct) and ct < cost):
+            converged = True
+            break
+        dx = np.max(np.abs(trial - x) / np.maximum(np.abs(x), 1.0e-12))
+        x, r, done = trial, rt, (cost - ct) <= tol * cost or dx <= tol
+        cost = ct
+        lam = max(lam / 10.0, 1.0e-12)
+        if done:
+            converged = True
+            break
+    return SimpleNamespace(params=dict(zip(names, x.tolist())), cost=cost, residual=r,
+        niter=it, nfev=problem.nfev, converged=converged)
@@ -0,0 +1,91 @@
+import collections
+import csv
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+
+BIAS = ('vd', 'vg', 'vs', 'vb', 'temp')
+DEFAULTS = (1.0, 1.0, 0.0, 0.0, 27.0)
+
+# Leakage mechanisms and the opinfo currents (magnitudes) that make them up
+MECHANISMS = {
+    'subthreshold': ('ids', 'idsgen'),
+    'gate_edge': ('igs', 'igd'),
+    'gate_channel': ('igcs', 'igcd'),
+    'gate_body': ('igbinv', 'igbacc'),
+    'gidl': ('igidl', 'igisl'),
+    'junction': ('Ies', 'Ied'),
+}
+
+
+def read_instances(path):
+    """Stream instances from a CSV file with a header row; a 'card' column names the card."""
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield {k: v if k == 'card' else float(v) for k, v in row.items()}
+
+
+class Leakage:
+    """
+    Standby leakage of a netlist. add() takes instances as dicts with the name of
+    a card in `cards`, instance parameters (L, NFIN, NF, ...), biases vd/vg/vs/vb,
+    temp and an optional multiplicity 'count'. Only distinct configurations are
+    kept, with their counts, so memory follows the number of distinct devices and
+    bias states, not instances. report() evaluates each distinct configuration once;
+    configurations of a card with the same instance parameter names are evaluated
+    together with array parameters, `chunk` at a time.
+    """
+
+    def __init__(self, cards, chunk=65536):
+        self.cards = cards
+        self.chunk = chunk
+        self.counts = collections.Counter()
+        self.instances = 0
+
+    def add(self, instance):
+        inst = dict(instance)
+        count = inst.pop('count', 1)
+        card = inst.pop('card')
+        bias = tuple(float(inst.pop(k, d)) for k, d in zip(BIAS, DEFAULTS))
+        self.counts[(card, tuple(sorted(inst.items())), bias)] += count
+        self.instances += count
+
+    def extend(self, instances):
+        for inst in instances:
+            self.add(inst)
+        return self
+
+    def report(self):
+        """
+        Totals (A) per mechanism and terminal, overall and per temperature and card:
+        {'total': {...}, 'by_temp': {temp: {...}}, 'by_card': {card: {...}},
+        'instances': n, 'unique': n}. Mechanism currents are magnitudes summed over
+        both ends of the device; terminal totals Id, Ig, Is, Ib keep their signs.
+        """
+        groups = collections.defaultdict(list)
+        for (card, inst, bias), count in self.counts.items():
+            groups[(card, tuple(k for k, _ in inst))].append((inst, bias, count))
+        keys = (*MECHANISMS, 'Id', 'Ig', 'Is', 'Ib')
+        total = dict.fromkeys(keys, 0.0)
+        by_temp, by_card = {}, {}
+        for (card, names), rows in groups.items():
+            for start in range(0, len(rows), self.chunk):
+                part = rows[start:start + self.chunk]
+                count = np.array([c for _, _, c in part], dtype=float)
+                params = {k: np.array([inst[i][1] for inst, _, _ in part]) for i, k in enumerate(names)}
+                bias = np.array([b for _, b, _ in part]).T
+                opinfo = {k: None for parts in MECHANISMS.values() for k in parts}
+                out = BSIMCMG(**{**self.cards[card], **params}).calc(*bias, opinfo=opinfo)
+                values = {m: sum(np.abs(opinfo[k]) for k in parts) for m, parts in MECHANISMS.items()}
+                values.update(zip(('Id', 'Ig', 'Is', 'Ib'), out))
+                temps, where = np.unique(bias[4], return_inverse=True)
+                for k in keys:
+                    weighted = np.broadcast_to(values[k], count.shape) * count
+                    s = float(weighted.sum())
+                    total[k] += s
+                    by_card.setdefault(card, dict.fromkeys(keys, 0.0))[k] += s
+                    for t, v in zip(temps.tolist(), np.bincount(where, weighted, temps.size).tolist()):
+                        by_temp.setdefault(t, dict.fromkeys(keys, 0.0))[k] += v
+        return {'total': total, 'by_temp': dict(sorted(by_temp.items())), 'by_card': by_card,
+            'instances': self.instances, 'unique': len(self.counts)}
@@ -0,0 +1,232 @@
+import json
+import mmap
+import os
+import re
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+
+# Dot directives start a new block; .lib/.endl open and close a section
+DIRECTIVE = re.compile(rb'^[ \t]*\.(\w+)([^\n]*)', re.M)
+HEADER = re.compile(rb'\s*(\S+)\s+([A-Za-z]\w*)')
+BOUND = re.compile(rb'\b(lmin|lmax|nfinmin|nfinmax)\s*=\s*([^\s()]+)', re.I)
+PARAM = re.compile(r'(\w+)\s*=\s*([^\s()]+)')
+NUMBER = re.compile(r'([+-]?(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?)(meg|mil|[tgkmunpfa])?', re.I)
+SCALE = {'t': 1e12, 'g': 1e9, 'meg': 1e6, 'k': 1e3, 'mil': 25.4e-6, 'm': 1e-3, 'u': 1e-6, 'n': 1e-9,
+    'p': 1e-12, 'f': 1e-15, 'a': 1e-18}
+# Selection keys and simulator bookkeeping that BSIMCMG does not take
+SKIP = {'LEVEL', 'VERSION', 'LMIN', 'LMAX', 'NFINMIN', 'NFINMAX'}
+
+
+def spice_number(text):
+    """Float value of a SPICE number with an optional scale suffix (16n, 1.2meg, 3e-9)."""
+    m = NUMBER.match(text)
+    # Trailing letters after the scale are units (1.2v), anything else is an expression
+    if m is None or not (m.end() == len(text) or text[m.end():].isalpha()):
+        raise ValueError(f'not a number: {text}')
+    return float(m.group(1)) * SCALE.get((m.group(2) or '').lower(), 1.0)
+
+
+def parse_model(text):
+    """Parameters of one '.model name type ...' block, upper-cased, with TYPE from nmos/pmos."""
+    lines = []
+    for line in text.splitlines():
+        line = line.split('$')[0].strip()
+        if not line or line[0] == '*':
+            continue
+        lines.append(line[1:] if line[0] == '+' else line)
+    name, kind = lines[0].split()[1:3] if len(lines[0].split()) > 2 else (lines[0].split()[1], '')
+    card = {}
+    for key, value in PARAM.findall(' '.join(lines)):
+        key = key.upper()
+        if key in SKIP:
+            continue
+        try:
+            card[key] = spice_number(value)
+        except ValueError:
+            raise ValueError(f'{name}: cannot evaluate {key} = {value}') from None
+    kind = kind.split('(')[0].lower()
+    if 'TYPE' not in card and kind in ('nmos', 'pmos'):
+        card['TYPE'] = 1 if kind == 'nmos' else 0
+    return card
+
+
+class ModelLibrary:
+    """
+    The .model cards of a SPICE library, indexed by geometry bin. Loading only
+    locates the cards and reads their LMIN/LMAX/NFINMIN/NFINMAX bounds; a card's
+    body is parsed on first use and shared afterwards. Bins of a model are the
+    cards named model.1, model.2, ...; select() maps arrays of (L, NFIN) to bins
+    in one vectorized lookup. A bin covers LMIN <= L < LMAX and NFINMIN <= NFIN
+    < NFINMAX; the upper bound is inclusive where no neighbouring bin starts.
+
+    A library file is memory-mapped, and the card offsets and bounds found by the
+    first scan are kept in a sidecar index (path + '.idx', rebuilt when the
+    library's size or mtime changes), so reopening it reads no card text at all.
+    """
+
+    def __init__(self, source, index=True):
+        self.file = None
+        if isinstance(source, bytes):
+            self.data = source
+            self._scan()
+        else:
+            self.file = open(source, 'rb')
+            st = os.fstat(self.file.fileno())
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if st.st_size else b''
+            stamp = [st.st_size, st.st_mtime_ns]
+            path = f'{source}.idx'
+            if not (index and self._load(path, stamp)):
+                self._scan()
+                if index:
+                    self._save(path, stamp)
+        self.cards = {}
+        self.indexes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.file is not None:
+            self.cards.clear()
+            if isinstance(self.data, mmap.mmap):
+                self.data.close()
+            self.file.close()
+            self.file = None
+
+    def _load(self, path, stamp):
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index.get('stamp') != stamp:
+            return False
+        self.names, self.kinds, self.sections = index['names'], index['kinds'], index['sections']
+        self.spans = [tuple(s) for s in index['spans']]
+        self.bounds = np.array(index['bounds'], dtype=float).reshape(-1, 4)
+        return True
+
+    def _save(self, path, stamp):
+        # Written aside and renamed so a concurrent reader never sees a partial index;
+        # a read-only library directory just means scanning every time
+        index = {'stamp': stamp, 'names': self.names, 'kinds': self.kinds, 'sections': self.sections,
+            'spans': self.spans, 'bounds': self.bounds.tolist()}
+        try:
+            with open(f'{path}.{os.getpid()}', 'w') as f:
+                json.dump(index, f)
+            os.replace(f'{path}.{os.getpid()}', path)
+        except OSError:
+            pass
+
+    def _scan(self):
+        self.names, self.kinds, self.sections, self.spans = [], [], [], []
+        bounds = []
+        section = None
+        matches = list(DIRECTIVE.finditer(self.data))
+        for m, after in zip(matches, matches[1:] + [None]):
+            directive = m.group(1).decode().lower()
+            if directive == 'lib':
+                section = m.group(2).split()[-1].decode() if m.group(2).split() else None
+            elif directive == 'endl':
+                section = None
+            elif directive == 'model':
+                header = HEADER.match(m.group(2))
+                if header is None:
+                    continue
+                end = after.start() if after is not None else len(self.data)
+                found = {k.lower(): v for k, v in BOUND.findall(self.data[m.start():end])}
+                bounds.append([spice_number(found[k].decode()) if k in found else d for k, d in
+                    ((b'lmin', -np.inf), (b'lmax', np.inf), (b'nfinmin', -np.inf), (b'nfinmax', np.inf))])
+                self.names.append(header.group(1).decode())
+                self.kinds.append(header.group(2).decode().lower())
+                self.sections.append(section)
+                self.spans.append((m.start(), end))
+        self.bounds = np.array(bounds, dtype=float).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.names)
+
+    def models(self):
+        """Model names with their bins' suffixes dropped."""
+        return sorted({self._base(n) for n in self.names})
+
+    @staticmethod
+    def _base(name):
+        base, _, suffix = name.rpartition('.')
+        return base if base and suffix.isdigit() else name
+
+    def card(self, i):
+        """Parameters of card i (index or name), parsed once and shared: do not modify."""
+        if isinstance(i, str):
+            i = self.names.index(i)
+        i = int(i)
+        if i not in self.cards:
+            start, end = self.spans[i]
+            self.cards[i] = parse_model(self.data[start:end].decode())
+        return self.cards[i]
+
+    def _index(self, model, section):
+        # Grid over the distinct L and NFIN bounds of the model's bins; each cell holds the
+        # first bin, in library order, that covers it
+        key = (model, section)
+        if key not in self.indexes:
+            bins = np.array([i for i, n in enumerate(self.names) if self._base(n) == model
+                and (section is None or self.sections[i] == section)], dtype=np.intp)
+            if bins.size == 0:
+                raise KeyError(f'no bins for model {model}' + (f' in section {section}' if section else ''))
+            b = self.bounds[bins]
+            edges = [np.unique(b[:, :2]), np.unique(b[:, 2:])]
+            grid = np.full((edges[0].size - 1, edges[1].size - 1), -1, dtype=np.intp)
+            for i, (l0, l1, n0, n1) in zip(bins[::-1], b[::-1]):
+                grid[np.searchsorted(edges[0], l0):np.searchsorted(edges[0], l1),
+                    np.searchsorted(edges[1], n0):np.searchsorted(edges[1], n1)] = i
+            self.indexes[key] = edges, grid
+        return self.indexes[key]
+
+    def select(self, model, L, NFIN=1.0, section=None):
+        """Bin index for each (L, NFIN); the arrays broadcast, -1 where no bin fits."""
+        (le, ne), grid = self._index(model, section)
+        L, NFIN = np.broadcast_arrays(np.asarray(L, dtype=float), np.asarray(NFIN, dtype=float))
+        cell = []
+        for x, edges, n in ((L, le, grid.shape[0]), (NFIN, ne, grid.shape[1])):
+            k = np.searchsorted(edges, x, 'right') - 1
+            # Exactly on an upper bound: also try the cell below
+            below = np.where((k > 0) & (edges[np.clip(k, 0, n)] == x), k - 1, -1)
+            cell.append((np.where(k < n, k, -1), below))
+        out = np.full(L.shape, -1, dtype=np.intp)
+        for kl in cell[0]:
+            for kn in cell[1]:
+                ok = (out < 0) & (kl >= 0) & (kn >= 0)
+                out[ok] = grid[kl[ok], kn[ok]]
+        return out
+
+    def resolve(self, model, L, NFIN=1.0, section=None):
+        """
+        select(), then the shared card of every bin used: returns (bins, {bin: card}).
+        Raises ValueError if a geometry falls outside all bins.
+        """
+        bins = self.select(model, L, NFIN, section)
+        if (bins < 0).any():
+            i = np.flatnonzero(bins.ravel() < 0)[0]
+            L, NFIN = (np.broadcast_to(np.asarray(v, dtype=float), bins.shape).ravel()[i] for v in (L, NFIN))
+            raise ValueError(f'{(bins < 0).sum()} geometries outside the bins of {model}, e.g. L={L:g} NFIN={NFIN:g}')
+        return bins, {int(i): self.card(i) for i in np.unique(bins)}
+
+    def devices(self, model, L, NFIN=1.0, section=None, **instance):
+        """
+        One BSIMCMG per bin used, holding that bin's geometries as parameter arrays:
+        returns (bins, {bin: (positions, device)}), positions indexing the flattened input.
+        """
+        bins, cards = self.resolve(model, L, NFIN, section)
+        L, NFIN = (np.broadcast_to(np.asarray(v, dtype=float), bins.shape).ravel() for v in (L, NFIN))
+        flat = bins.ravel()
+        out = {}
+        for i, card in cards.items():
+            pos = np.flatnonzero(flat == i)
+            out[i] = pos, BSIMCMG(**{**card, **instance, 'L': L[pos], 'NFIN': NFIN[pos]})
+        return bins, out
@@ -0,0 +1,362 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+from sensitivity import sensitivities
+
+OUTPUTS = ('Id', 'Ig', 'Is', 'Ib')
+
+# Sobol direction numbers (Joe and Kuo, new-joe-kuo-6.21201) for dimensions 2-21: degree s,
+# polynomial coefficients a, initial m_1..m_s; dimension 1 is the van der Corput sequence
+JOE_KUO = (
+    (1, 0, (1,)), (2, 1, (1, 3)), (3, 1, (1, 3, 1)), (3, 2, (1, 1, 1)), (4, 1, (1, 1, 3, 3)),
+    (4, 4, (1, 3, 5, 13)), (5, 2, (1, 1, 5, 5, 17)), (5, 4, (1, 1, 5, 5, 5)), (5, 7, (1, 1, 7, 11, 19)),
+    (5, 11, (1, 1, 5, 1, 1)), (5, 13, (1, 1, 1, 3, 11)), (5, 14, (1, 3, 5, 5, 31)),
+    (6, 1, (1, 3, 3, 9, 7, 49)), (6, 13, (1, 1, 1, 15, 21, 21)), (6, 16, (1, 3, 1, 13, 27, 49)),
+    (6, 19, (1, 1, 1, 15, 7, 5)), (6, 22, (1, 3, 1, 15, 13, 25)), (6, 25, (1, 1, 5, 5, 19, 61)),
+    (7, 1, (1, 3, 7, 11, 23, 15, 103)), (7, 4, (1, 3, 7, 13, 13, 15, 69)),
+)
+BITS = 32
+
+
+class StreamingStats:
+    """
+    Per-bias-point statistics of BSIMCMG outputs over a stream of sample batches,
+    in memory independent of the sample count: count, mean and variance (Welford,
+    combined per batch), min and max, optional fixed-edge histograms, and a
+    DDSketch-style quantile sketch with relative accuracy alpha on |value| inside
+    `span` (smaller magnitudes count as zero). Instances with the same settings
+    merge exactly, e.g. when each worker process keeps its own.
+    """
+
+    def __init__(self, shape=(), outputs=OUTPUTS, edges=None, alpha=0.01, span=(1.0e-20, 10.0)):
+        self.shape = tuple(shape)
+        self.outputs = tuple(outputs)
+        self.n = 0
+        self.mean = {k: np.zeros(self.shape) for k in self.outputs}
+        self.m2 = {k: np.zeros(self.shape) for k in self.outputs}
+        self.min = {k: np.full(self.shape, np.inf) for k in self.outputs}
+        self.max = {k: np.full(self.shape, -np.inf) for k in self.outputs}
+        self.edges = {k: np.asarray(v, dtype=float) for k, v in (edges or {}).items()}
+        # Histogram bucket 0 is underflow, the last one overflow
+        self.hist = {k: np.zeros(self.shape + (e.size + 1,), dtype=np.int64) for k, e in self.edges.items()}
+        self.alpha = alpha
+        self.span = span
+        self.gamma = (1.0 + alpha) / (1.0 - alpha) if alpha else None
+        if alpha:
+            lg = np.log(self.gamma)
+            self.kmin = int(np.ceil(np.log(span[0]) / lg))
+            self.nb = int(np.ceil(np.log(span[1]) / lg)) - self.kmin + 1
+            # Buckets ordered by value: negative magnitudes descending, zero, positive ascending
+            self.sketch = {k: np.zeros(self.shape + (2 * self.nb + 1,), dtype=np.int64) for k in self.outputs}
+
+    def _same(self, other):
+        return (self.shape, self.outputs, self.alpha, tuple(self.span), sorted(self.edges)) == \
+            (other.shape, other.outputs, other.alpha, tuple(other.span), sorted(other.edges)) and \
+            all(np.array_equal(e, other.edges[k]) for k, e in self.edges.items())
+
+    def _count(self, store, index):
+        # Add one to store[..., index] for every sample: one bincount over flattened positions
+        nb = store.shape[-1]
+        flat = (np.arange(int(np.prod(self.shape)), dtype=np.int64) * nb).reshape(self.shape) + index
+        store += np.bincount(flat.ravel(), minlength=store.size).reshape(store.shape)
+
+    def add(self, values):
+        """
+        Add a batch: values is calc() output (Id, Ig, Is, Ib) with the samples along
+        the leading axis of each array, i.e. shaped (samples,) + shape.
+        """
+        values = dict(zip(OUTPUTS, values))
+        batch = None
+        for k in self.outputs:
+            x = np.asarray(values[k], dtype=float)
+            x = np.broadcast_to(x, x.shape[:1] + self.shape)
+            batch = x.shape[0]
+            # Chan et al. combination of the running and the batch moments
+            mb = x.mean(axis=0)
+            m2b = ((x - mb) ** 2).sum(axis=0)
+            n = self.n + batch
+            delta = mb - self.mean[k]
+            self.mean[k] = self.mean[k] + delta * (batch / n)
+            self.m2[k] = self.m2[k] + m2b + delta ** 2 * (self.n * batch / n)
+            self.min[k] = np.minimum(self.min[k], x.min(axis=0))
+            self.max[k] = np.maximum(self.max[k], x.max(axis=0))
+            if k in self.hist:
+                self._count(self.hist[k], np.searchsorted(self.edges[k], x, 'right'))
+            if self.alpha:
+                self._count(self.sketch[k], self._bucket(x))
+        self.n += batch or 0
+        return self
+
+    def _bucket(self, x):
+        a = np.abs(x)
+        with np.errstate(divide='ignore'):
+            k = np.ceil(np.log(np.maximum(a, self.span[0])) / np.log(self.gamma)) - self.kmin
+        k = np.clip(k, 0, self.nb - 1).astype(np.int64)
+        return np.where(a < self.span[0], self.nb, np.where(x > 0, self.nb + 1 + k, self.nb - 1 - k))
+
+    def merge(self, other):
+        """Fold in another StreamingStats with the same settings."""
+        if not self._same(other):
+            raise ValueError('cannot merge statistics with different shape, outputs, edges or sketch settings')
+        n = self.n + other.n
+        for k in self.outputs:
+            if n:
+                delta = other.mean[k] - self.mean[k]
+                self.mean[k] = self.mean[k] + delta * (other.n / n)
+                self.m2[k] = self.m2[k] + other.m2[k] + delta ** 2 * (self.n * other.n / n)
+            self.min[k] = np.minimum(self.min[k], other.min[k])
+            self.max[k] = np.maximum(self.max[k], other.max[k])
+            if k in self.hist:
+                self.hist[k] += other.hist[k]
+            if self.alpha:
+                self.sketch[k] += other.sketch[k]
+        self.n = n
+        return self
+
+    def var(self, output='Id', ddof=1):
+        return self.m2[output] / max(self.n - ddof, 1)
+
+    def std(self, output='Id', ddof=1):
+        return np.sqrt(self.var(output, ddof))
+
+    def quantile(self, q, output='Id'):
+        """
+        Quantiles from the sketch, within relative error alpha for |values| in span;
+        shaped like q followed by the bias shape.
+        """
+        if not self.alpha:
+            raise ValueError('quantiles need a sketch (alpha > 0)')
+        q = np.asarray(q, dtype=float)
+        cum = np.cumsum(self.sketch[output], axis=-1)
+        rank = q.reshape(q.shape + (1,) * (len(self.shape) + 1)) * (self.n - 1)
+        i = np.argmax(cum > rank, axis=-1)
+        k = np.abs(i - self.nb) - 1 + self.kmin
+        value = np.sign(i - self.nb) * 2.0 * self.gamma ** k / (self.gamma + 1.0)
+        # The exact extremes are known; keep estimates inside them
+        return np.clip(value, self.min[output], self.max[output])
+
+    def histogram(self, output='Id'):
+        """(edges, counts) with counts[..., 0] below edges[0] and counts[..., -1] from edges[-1] up."""
+        return self.edges[output], self.hist[output]
+
+    def summary(self):
+        """n, mean, std, min and max per output."""
+        return {k: {'n': self.n, 'mean': self.mean[k], 'std': self.std(k), 'min': self.min[k], 'max': self.max[k]}
+            for k in self.outputs}
+
+
+def run(card, draw, n, batch=4096, seed=None, stats=None, vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0, **options):
+    """
+    Monte Carlo over parameter variations: draw(rng, size) returns a dict of
+    parameter arrays of length size (e.g. DELVTRAND, U0MULT, TFIN), applied on top
+    of card. Samples are evaluated batch at a time by one device, updated in place,
+    against all bias points (biases broadcast to the bias shape). Returns the
+    StreamingStats; options go to its constructor. Separate runs with different
+    seeds can be merged.
+    """
+    rng = np.random.default_rng(seed)
+    shape = np.broadcast_shapes(*(np.shape(v) for v in (vd, vg, vs, vb, temp)))
+    stats = stats or StreamingStats(shape, **options)
+    dev = None
+    done = 0
+    while done < n:
+        size = min(batch, n - done)
+        # Parameters vary along a leading sample axis in front of the bias axes
+        params = {k: np.asarray(v, dtype=float).reshape((size,) + (1,) * len(shape)) for k, v in draw(rng, size).items()}
+        if dev is None:
+            dev = BSIMCMG(**{**card, **params})
+        else:
+            dev.update(**params)
+        out = dev.calc(vd, vg, vs, vb, temp)
+        stats.add([np.broadcast_to(o, (size,) + shape) for o in out])
+        done += size
+    return stats
+
+
+def normal_ppf(u):
+    """Inverse standard normal CDF (Acklam's rational approximation, relative error < 1.2e-9)."""
+    a = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02, 1.383577518672690e+02,
+        -3.066479806614716e+01, 2.506628277459239e+00)
+    b = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02, 6.680131188771972e+01,
+        -1.328068155288572e+01)
+    c = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00, -2.549732539343734e+00,
+        4.374664141464968e+00, 2.938163982698783e+00)
+    d = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00, 3.754408661907416e+00)
+    u = np.asarray(u, dtype=float)
+    # Central region, and the lower tail mirrored onto the upper one
+    q = u - 0.5
+    r = q * q
+    central = (((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r + a[5]) * q / \
+        (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.sqrt(-2.0 * np.log(np.minimum(u, 1.0 - u)))
+        tail = (((((c[0] * t + c[1]) * t + c[2]) * t + c[3]) * t + c[4]) * t + c[5]) / \
+            ((((d[0] * t + d[1]) * t + d[2]) * t + d[3]) * t + 1.0)
+    return np.where(np.abs(q) <= 0.47575, central, np.where(q < 0, tail, -tail))
+
+
+class Sobol:
+    """
+    Sobol sequence in up to 21 dimensions, generated in Gray-code order. With
+    scramble, each dimension gets a random linear matrix scramble and digital
+    shift, so independent instances give unbiased replicate estimates. Points are
+    cell midpoints at 2**-32 resolution and never 0 or 1.
+    """
+
+    def __init__(self, d, scramble=True, rng=None):
+        if not 1 <= d <= len(JOE_KUO) + 1:
+            raise ValueError(f'Sobol dimension must be between 1 and {len(JOE_KUO) + 1}')
+        rng = np.random.default_rng(rng)
+        V = np.zeros((d, BITS), dtype=np.uint64)
+        V[0] = [1 << (BITS - 1 - k) for k in range(BITS)]
+        for j, (s, a, m) in enumerate(JOE_KUO[:d - 1], 1):
+            v = [m[k] << (BITS - 1 - k) for k in range(s)]
+            for k in range(s, BITS):
+                x = v[k - s] ^ (v[k - s] >> s)
+                for i in range(1, s):
+                    if (a >> (s - 1 - i)) & 1:
+                        x ^= v[k - i]
+                v.append(x)
+            V[j] = v
+        self.shift = np.zeros(d, dtype=np.uint64)
+        if scramble:
+            for j in range(d):
+                # Lower triangular with unit diagonal, bits counted from the most significant
+                rows = [(1 << (BITS - 1 - r)) | (int(rng.integers(0, 1 << r)) << (BITS - r) if r else 0)
+                    for r in range(BITS)]
+                V[j] = [sum((bin(r & int(v)).count('1') & 1) << (BITS - 1 - i) for i, r in enumerate(rows)) for v in V[j]]
+            self.shift = rng.integers(0, 1 << BITS, d, dtype=np.uint64)
+        self.V = V
+        self.index = 0
+
+    def random(self, n):
+        """The next n points, shaped (n, d)."""
+        i = np.arange(self.index, self.index + n, dtype=np.uint64)
+        g = i ^ (i >> np.uint64(1))
+        x = np.broadcast_to(self.shift, (n, self.shift.size)).copy()
+        for b in range(BITS):
+            bit = ((g >> np.uint64(b)) & np.uint64(1)).astype(bool)
+            x[bit] ^= self.V[:, b]
+        self.index += n
+        return (x.astype(float) + 0.5) / float(1 << BITS)
+
+
+def latin_hypercube(n, d, rng=None):
+    """n points in d dimensions with exactly one point in each of the n strata of every axis."""
+    rng = np.random.default_rng(rng)
+    return (np.argsort(rng.random((d, n)), axis=1).T + rng.random((n, d))) / n
+
+
+def sampler(variations, method='sobol', antithetic=False, seed=None):
+    """
+    draw(rng, size) for run() of Gaussian variations {name: (mean, sigma)}, from
+    'random' normals, a 'sobol' stream continued across calls, or a Latin hypercube
+    per call ('lhs'). antithetic puts mirrored points u, 1 - u in the two halves of
+    each batch (size must be even).
+    """
+    if method not in ('random', 'sobol', 'lhs'):
+        raise ValueError(f'unknown sampling method: {method}')
+    names = list(variations)
+    mean, sigma = (np.array([variations[k][i] for k in names], dtype=float) for i in (0, 1))
+    sobol = Sobol(len(names), rng=seed) if method == 'sobol' else None
+
+    def draw(rng, size):
+        m = size // 2 if antithetic else size
+        if method == 'sobol':
+            u = sobol.random(m)
+        elif method == 'lhs':
+            u = latin_hypercube(m, len(names), rng)
+        else:
+            u = rng.random((m, len(names)))
+        if antithetic:
+            u = np.concatenate([u, 1.0 - u])
+        x = mean + sigma * normal_ppf(u)
+        return dict(zip(names, x.T))
+
+    return draw
+
+
+def estimate(card, variations, n, method='sobol', antithetic=False, control=False, replicates=8, batch=4096,
+        seed=None, vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0):
+    """
+    Mean and standard deviation of the outputs under Gaussian variations
+    {name: (mean, sigma)} from n calc() samples, with a standard error for the
+    mean. Sobol and LHS points come from independent randomized replicates and the
+    standard error from their spread; random samples (and antithetic pairs) are
+    independent units. control subtracts the first-order model from sensitivities
+    at the nominal point, whose mean is known exactly, as a control variate. ess is
+    the number of plain Monte Carlo samples giving the same standard error.
+    Results are dicts keyed by output name, shaped like the biases.
+    """
+    names = list(variations)
+    mu = {k: float(variations[k][0]) for k in names}
+    shape = np.broadcast_shapes(*(np.shape(v) for v in (vd, vg, vs, vb, temp)))
+    nominal = BSIMCMG(**{**card, **mu})
+    if control:
+        y0, grad = sensitivities(nominal, names, vd, vg, vs, vb, temp)
+        y0 = np.array([np.broadcast_to(y, shape) for y in y0])
+        grad = np.array([np.broadcast_to(g, shape + (len(names),)) for g in grad])
+    else:
+        y0 = np.array([np.broadcast_to(y, shape) for y in nominal.calc(vd, vg, vs, vb, temp)])
+    groups = 1 if method == 'random' else replicates
+    seeds = np.random.SeedSequence(seed).spawn(groups)
+    size = n // groups
+    size -= size % 2 if antithetic else 0
+    # Sums relative to the nominal currents: per group of the units and the control, and
+    # overall of unit and raw-sample moments
+    z = np.zeros((4,) + shape)
+    Sy, Sl = np.zeros((groups,) + z.shape), np.zeros((groups,) + z.shape)
+    Syy, Sll, Syl, Sraw, Sraw2 = z.copy(), z.copy(), z.copy(), z.copy(), z.copy()
+    units = samples = 0
+    for g, ss in enumerate(seeds):
+        rng = np.random.default_rng(ss)
+        draw = sampler(variations, method, antithetic, rng)
+        dev = None
+        done = 0
+        while done < size:
+            m = min(batch, size - done)
+            m -= m % 2 if antithetic else 0
+            p = draw(rng, m)
+            params = {k: v.reshape((m,) + (1,) * len(shape)) for k, v in p.items()}
+            if dev is None:
+                dev = BSIMCMG(**{**card, **params})
+            else:
+                dev.update(**params)
+            y = np.array([np.broadcast_to(o, (m,) + shape) for o in dev.calc(vd, vg, vs, vb, temp)]) - y0[:, None]
+            if control:
+                dp = np.stack([p[k] - mu[k] for k in names], axis=-1).reshape((m,) + (1,) * len(shape) + (len(names),))
+                lin = (grad[:, None] * dp).sum(axis=-1)
+            else:
+                lin = np.zeros_like(y)
+            Sraw += y.sum(axis=1)
+            Sraw2 += (y * y).sum(axis=1)
+            if antithetic:
+                y = 0.5 * (y[:, :m // 2] + y[:, m // 2:])
+                lin = 0.5 * (lin[:, :m // 2] + lin[:, m // 2:])
+            Sy[g] += y.sum(axis=1)
+            Sl[g] += lin.sum(axis=1)
+            Syy += (y * y).sum(axis=1)
+            Sll += (lin * lin).sum(axis=1)
+            Syl += (y * lin).sum(axis=1)
+            units += y.shape[1]
+            samples += m
+            done += m
+    with np.errstate(divide='ignore', invalid='ignore'):
+        my, ml = Sy.sum(axis=0) / units, Sl.sum(axis=0) / units
+        vy = Syy / units - my * my
+        vl = Sll / units - ml * ml
+        cyl = Syl / units - my * ml
+        # Optimal control coefficient; the control's exact mean is zero
+        beta = np.where(vl > 0, cyl / vl, 0.0) if control else z
+        mean = my - beta * ml
+        if groups == 1:
+            stderr = np.sqrt(np.maximum(vy - 2 * beta * cyl + beta * beta * vl, 0.0) * units / (units - 1) / units)
+        else:
+            per = Sy / (units / groups) - beta * Sl / (units / groups)
+            stderr = np.sqrt(per.var(axis=0, ddof=1) / groups)
+        var = np.maximum(Sraw2 / samples - (Sraw / samples) ** 2, 0.0) * samples / (samples - 1)
+        ess = np.where(stderr > 0, var / stderr ** 2, np.nan)
+    return SimpleNamespace(mean=dict(zip(OUTPUTS, mean + y0)), std=dict(zip(OUTPUTS, np.sqrt(var))),
+        stderr=dict(zip(OUTPUTS, stderr)), ess=dict(zip(OUTPUTS, ess)), n=samples, method=method)
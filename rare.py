@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+from montecarlo import OUTPUTS
+
+
+class Margin:
+    """
+    Failure margin g(z) of a device under Gaussian variations {name: (mean, sigma)},
+    as a function of standard normal coordinates z (one row per sample). g <= 0 is
+    a failure: the metric, |output| or output(Id, Ig, Is, Ib), above `limit` for
+    side='above' or below it for side='below', compared in log scale. Rows are
+    evaluated together by one device updated in place; nfev counts them. Biases
+    and card parameters are scalars, so parameter rows map one-to-one to outputs.
+    """
+
+    def __init__(self, card, variations, limit, output='Id', side='above', vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0):
+        if side not in ('above', 'below'):
+            raise ValueError(f"side must be 'above' or 'below', not {side}")
+        arrays = [k for k, v in {**card, **dict(zip(('vd', 'vg', 'vs', 'vb', 'temp'), (vd, vg, vs, vb, temp)))}.items() if np.ndim(v)]
+        if arrays:
+            raise ValueError(f'Margin needs scalar biases and card parameters, got arrays for {arrays}')
+        self.card = dict(card)
+        self.names = list(variations)
+        self.mu, self.sigma = (np.array([variations[k][i] for k in self.names], dtype=float) for i in (0, 1))
+        self.log_limit = np.log(limit)
+        self.sign = 1.0 if side == 'above' else -1.0
+        self.output = output
+        self.bias = (vd, vg, vs, vb, temp)
+        self.dev = None
+        self.nfev = 0
+
+    def params(self, z):
+        return dict(zip(self.names, (self.mu + self.sigma * np.atleast_2d(z)).T))
+
+    def metric(self, z):
+        params = self.params(z)
+        if self.dev is None:
+            self.dev = BSIMCMG(**{**self.card, **params})
+        else:
+            self.dev.update(**params)
+        out = self.dev.calc(*self.bias)
+        self.nfev += np.atleast_2d(z).shape[0]
+        if callable(self.output):
+            return np.asarray(self.output(*out), dtype=float)
+        return np.abs(out[OUTPUTS.index(self.output)])
+
+    def __call__(self, z):
+        m = np.broadcast_to(self.metric(z), np.atleast_2d(z).shape[:1])
+        with np.errstate(divide='ignore'):
+            return self.sign * (self.log_limit - np.log(m))
+
+
+def mpfp(margin, maxiter=50, tol=1.0e-4, step=1.0e-4):
+    """
+    Most probable failure point: the z closest to the origin with g(z) = 0, by
+    HL-RF iteration with forward-difference gradients (one batched evaluation of
+    d + 1 points per iteration). Returns SimpleNamespace(z, beta, params, niter,
+    converged); beta = |z| gives the first-order failure probability Phi(-beta).
+    """
+    d = len(margin.names)
+    z = np.zeros(d)
+    converged = False
+    for it in range(1, maxiter + 1):
+        g = margin(np.vstack([z, z + step * np.eye(d)]))
+        grad = (g[1:] - g[0]) / step
+        norm = grad @ grad
+        if not np.isfinite(g).all() or norm == 0.0:
+            raise ValueError('the failure margin is not finite or does not depend on the variations')
+        new = (grad @ z - g[0]) / norm * grad
+        done = np.linalg.norm(new - z) <= tol * max(1.0, np.linalg.norm(z))
+        z = new
+        if done:
+            converged = True
+            break
+    return SimpleNamespace(z=z, beta=float(np.linalg.norm(z)), params={k: float(v[0]) for k, v in margin.params(z).items()},
+        niter=it, converged=converged)
+
+
+def importance(margin, n=10000, batch=4096, seed=None, design=None):
+    """
+    Failure probability by mean-shift importance sampling: normals centred on
+    the most probable failure point (found with mpfp() unless design is given),
+    reweighted to the nominal distribution. Returns SimpleNamespace(p, stderr,
+    cov, n, nfev, design).
+    """
+    rng = np.random.default_rng(seed)
+    design = design or mpfp(margin)
+    shift = design.z
+    s1 = s2 = 0.0
+    done = 0
+    while done < n:
+        m = min(batch, n - done)
+        z = shift + rng.standard_normal((m, shift.size))
+        # Likelihood ratio of N(0, I) to N(shift, I)
+        w = np.exp(-z @ shift + 0.5 * shift @ shift) * (margin(z) <= 0.0)
+        s1 += w.sum()
+        s2 += (w * w).sum()
+        done += m
+    p = s1 / n
+    stderr = np.sqrt(max(s2 / n - p * p, 0.0) / max(n - 1, 1))
+    return SimpleNamespace(p=p, stderr=stderr, cov=stderr / p if p > 0 else np.inf, n=n, nfev=margin.nfev, design=design)
+
+
+def subset(margin, n=2000, p0=0.1, spread=1.0, maxlevels=20, seed=None):
+    """
+    Failure probability by subset simulation: each level keeps the p0 * n samples
+    with the lowest margin as seeds of Markov chains (component-wise Metropolis,
+    proposal width spread) that refill the level conditioned on that margin. The
+    chains are not run in parallel: each step evaluates the proposals of all chains
+    in one in-process batch of rows. cov is the estimate
+    that ignores correlation within chains, a lower bound. Returns
+    SimpleNamespace(p, cov, levels, nfev).
+    """
+    rng = np.random.default_rng(seed)
+    d = len(margin.names)
+    nseed = int(round(p0 * n))
+    steps = int(np.ceil(n / nseed))
+    z = rng.standard_normal((n, d))
+    g = margin(z)
+    p, cov2, levels = 1.0, 0.0, []
+    for _ in range(maxlevels):
+        order = np.argsort(g)
+        b = g[order[nseed - 1]]
+        if b <= 0.0:
+            pf = np.mean(g <= 0.0)
+            cov2 += (1.0 - pf) / (pf * n)
+            return SimpleNamespace(p=p * pf, cov=np.sqrt(cov2), levels=levels, nfev=margin.nfev)
+        p *= p0
+        cov2 += (1.0 - p0) / (p0 * n)
+        levels.append(float(b))
+        cz, cg = z[order[:nseed]], g[order[:nseed]]
+        zs, gs = [cz], [cg]
+        for _ in range(steps - 1):
+            xi = cz + spread * rng.standard_normal(cz.shape)
+            # Accept each component against the standard normal density, then the whole
+            # candidate if it stays inside the current level
+            keep = rng.random(cz.shape) < np.exp(0.5 * (cz * cz - xi * xi))
+            xi = np.where(keep, xi, cz)
+            gx = margin(xi)
+            inside = gx <= b
+            cz = np.where(inside[:, None], xi, cz)
+            cg = np.where(inside, gx, cg)
+            zs.append(cz)
+            gs.append(cg)
+        z, g = np.concatenate(zs)[:n], np.concatenate(gs)[:n]
+    raise RuntimeError(f'no failures after {maxlevels} levels (p < {p:.3g})')
@@ -0,0 +1,183 @@
+import csv
+import os
+import queue
+import threading
+
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Default column layout of a bias sweep: inputs followed by terminal currents
+SWEEP_COLUMNS = ('vd', 'vg', 'vs', 'vb', 'temp', 'L', 'NFIN', 'Id', 'Ig', 'Is', 'Ib')
+
+
+class _CSVSink:
+    def __init__(self, path, columns):
+        self.f = open(path, 'w', newline='')
+        self.w = csv.writer(self.f)
+        self.w.writerow(columns)
+
+    def append(self, block):
+        self.w.writerows(zip(*(col.tolist() for col in block.values())))
+
+    def close(self):
+        self.f.close()
+
+
+class _NpySink:
+    # One growing .npy file per column in a directory; np.load(mmap_mode='r') reads them back,
+    # also during a sweep or after a crash: each block is written, then the headers updated
+    HEADER = 128
+
+    def __init__(self, path, columns):
+        os.makedirs(path, exist_ok=True)
+        self.files = {c: open(os.path.join(path, c + '.npy'), 'wb') for c in columns}
+        self.rows = 0
+        for f in self.files.values():
+            self._header(f, 0)
+
+    def _header(self, f, rows):
+        header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d,), }" % rows
+        header = header.ljust(self.HEADER - 10 - 1) + '\n'
+        f.seek(0)
+        f.write(b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1'))
+        f.seek(0, os.SEEK_END)
+
+    def append(self, block):
+        for c, f in self.files.items():
+            f.write(np.ascontiguousarray(block[c], dtype='<f8').tobytes())
+            f.flush()
+        self.rows += len(next(iter(block.values())))
+        for f in self.files.values():
+            self._header(f, self.rows)
+            f.flush()
+
+    def close(self):
+        for f in self.files.values():
+            self._header(f, self.rows)
+            f.close()
+
+
+class _HDF5Sink:
+    def __init__(self, path, columns, chunk):
+        if h5py is None:
+            raise ImportError('HDF5 output requires h5py')
+        self.f = h5py.File(path, 'w')
+        self.rows = 0
+        for c in columns:
+            self.f.create_dataset(c, shape=(0,), maxshape=(None,), dtype='f8', chunks=(chunk,))
+
+    def append(self, block):
+        n = len(next(iter(block.values())))
+        for c, v in block.items():
+            d = self.f[c]
+            d.resize((self.rows + n,))
+            d[self.rows:] = v
+        self.rows += n
+
+    def close(self):
+        self.f.close()
+
+
+class _ParquetSink:
+    def __init__(self, path, columns):
+        if pa is None:
+            raise ImportError('Parquet output requires pyarrow')
+        self.schema = pa.schema([(c, pa.float64()) for c in columns])
+        self.w = pq.ParquetWriter(path, self.schema)
+
+    def append(self, block):
+        self.w.write_table(pa.table(block, schema=self.schema))
+
+    def close(self):
+        self.w.close()
+
+
+class ResultWriter:
+    """
+    Streams sweep results to disk in fixed-size blocks. The format follows the path:
+    '.csv', '.h5'/'.hdf5', '.parquet', otherwise a directory of per-column '.npy' files.
+    Blocks are written by a background thread; at most `maxblocks` full blocks are held
+    in memory before write() blocks the caller.
+    """
+
+    def __init__(self, path, columns=SWEEP_COLUMNS, chunk=65536, maxblocks=4):
+        self.columns = tuple(columns)
+        self.chunk = chunk
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.csv':
+            self.sink = _CSVSink(path, self.columns)
+        elif ext in ('.h5', '.hdf5'):
+            self.sink = _HDF5Sink(path, self.columns, chunk)
+        elif ext == '.parquet':
+            self.sink = _ParquetSink(path, self.columns)
+        else:
+            self.sink = _NpySink(path, self.columns)
+        self.buf = {c: np.empty(chunk) for c in self.columns}
+        self.fill = 0
+        self.rows = 0
+        self.error = None
+        self.q = queue.Queue(maxsize=maxblocks)
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _drain(self):
+        while True:
+            block = self.q.get()
+            if block is None:
+                break
+            try:
+                self.sink.append(block)
+            except Exception as e:
+                self.error = e
+
+    def _flush(self):
+        if self.fill == 0:
+            return
+        if self.error is not None:
+            raise self.error
+        self.q.put({c: v[:self.fill] for c, v in self.buf.items()})
+        self.buf = {c: np.empty(self.chunk) for c in self.columns}
+        self.fill = 0
+
+    def write(self, **values):
+        """Append a block of rows; scalars are broadcast to the block length."""
+        missing = set(self.columns) - set(values)
+        if missing:
+            raise KeyError(f'missing columns: {sorted(missing)}')
+        n = np.broadcast_shapes(*(np.shape(values[c]) for c in self.columns))
+        cols = {c: np.broadcast_to(values[c], n).ravel() for c in self.columns}
+        n = int(np.prod(n))
+        start = 0
+        while start < n:
+            take = min(self.chunk - self.fill, n - start)
+            for c in self.columns:
+                self.buf[c][self.fill:self.fill + take] = cols[c][start:start + take]
+            self.fill += take
+            start += take
+            if self.fill == self.chunk:
+                self._flush()
+        self.rows += n
+
+    def close(self):
+        self._flush()
+        self.q.put(None)
+        self.thread.join()
+        self.sink.close()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,137 @@
+import numpy as np
+
+from bsimcmg import BSIMCMG
+
+# Comparison and logical ufuncs act on values only
+_VALUE_ONLY = {np.greater, np.greater_equal, np.less, np.less_equal, np.equal, np.not_equal,
+    np.logical_and, np.logical_or, np.logical_not, np.bitwise_and, np.bitwise_or, np.isnan,
+    np.isfinite, np.sign}
+
+
+def _val(x):
+    return x.v if isinstance(x, Dual) else x
+
+
+def _col(x):
+    # Value broadcast against a derivative array, which carries the parameter axis last
+    return np.expand_dims(x, -1)
+
+
+class Dual(np.lib.mixins.NDArrayOperatorsMixin):
+    """
+    Forward-mode dual number: value v (scalar or array) and derivatives d with
+    shape v.shape + (nparam,). NumPy ufuncs and np.where propagate derivatives,
+    so the model code runs unchanged on Dual parameters.
+    """
+
+    __slots__ = ('v', 'd')
+
+    def __init__(self, v, d):
+        self.v = v
+        self.d = d
+
+    def __repr__(self):
+        return f'Dual({self.v!r}, {self.d!r})'
+
+    def __bool__(self):
+        return bool(self.v)
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+        vals = [_val(x) for x in inputs]
+        v = ufunc(*vals)
+        if ufunc in _VALUE_ONLY:
+            return v
+        rule = _RULES.get(ufunc)
+        if rule is None:
+            return NotImplemented
+        d = rule(v, vals, [x.d if isinstance(x, Dual) else None for x in inputs])
+        return Dual(v, d)
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func is np.where and len(args) == 3 and not kwargs:
+            cond, a, b = args
+            cond = _val(cond)
+            v = np.where(cond, _val(a), _val(b))
+            if not isinstance(a, Dual) and not isinstance(b, Dual):
+                return v
+            da = a.d if isinstance(a, Dual) else 0.0
+            db = b.d if isinstance(b, Dual) else 0.0
+            return Dual(v, np.where(_col(cond), da, db))
+        if func in (np.shape, np.ndim, np.any, np.all, np.count_nonzero):
+            return func(*(_val(a) for a in args), **kwargs)
+        return NotImplemented
+
+
+def _sum(*terms):
+    terms = [t for t in terms if t is not None]
+    out = terms[0]
+    for t in terms[1:]:
+        out = out + t
+    return out
+
+
+def _scale(f, d):
+    return None if d is None else _col(f) * d
+
+
+def _power(v, x, d):
+    a, b = x
+    da = None if d[0] is None else _col(b * np.power(a, b - 1.0)) * d[0]
+    db = None if d[1] is None else _col(v * np.log(a)) * d[1]
+    return _sum(da, db)
+
+
+def _select(v, x, d, ufunc):
+    a, b = x
+    pick = _col(ufunc(a, b) == a)
+    return _sum(None if d[0] is None else np.where(pick, d[0], 0.0),
+        None if d[1] is None else np.where(pick, 0.0, d[1]))
+
+
+_RULES = {
+    np.add: lambda v, x, d: _sum(*d),
+    np.subtract: lambda v, x, d: _sum(d[0], None if d[1] is None else -d[1]),
+    np.negative: lambda v, x, d: -d[0],
+    np.positive: lambda v, x, d: d[0],
+    np.multiply: lambda v, x, d: _sum(_scale(x[1], d[0]), _scale(x[0], d[1])),
+    np.true_divide: lambda v, x, d: _sum(_scale(1.0 / x[1], d[0]), _scale(-v / x[1], d[1])),
+    np.power: _power,
+    np.sqrt: lambda v, x, d: _scale(0.5 / v, d[0]),
+    np.exp: lambda v, x, d: _scale(v, d[0]),
+    np.log: lambda v, x, d: _scale(1.0 / x[0], d[0]),
+    np.tanh: lambda v, x, d: _scale(1.0 - v * v, d[0]),
+    np.cosh: lambda v, x, d: _scale(np.sinh(x[0]), d[0]),
+    np.tan: lambda v, x, d: _scale(1.0 + v * v, d[0]),
+    np.absolute: lambda v, x, d: _scale(np.sign(x[0]), d[0]),
+    np.maximum: lambda v, x, d: _select(v, x, d, np.maximum),
+    np.minimum: lambda v, x, d: _select(v, x, d, np.minimum),
+}
+
+
+def sensitivities(model, params, vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0):
+    """
+    Terminal currents and their derivatives with respect to the named model
+    parameters, propagated through setup, temperature and bias stages in one pass.
+    Returns ([Id, Ig, Is, Ib], [dId, dIg, dIs, dIb]); each derivative has shape
+    bias shape + (len(params),), i.e. (points x params) for a 1-d sweep.
+    """
+    params = list(params)
+    seed = np.eye(len(params))
+    card = dict(model.given)
+    for k, name in enumerate(params):
+        v = np.asarray(getattr(model, name), dtype=float)
+        card[name] = Dual(v[()], np.broadcast_to(seed[k], v.shape + seed[k].shape))
+    dev = BSIMCMG(**card)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        currents = dev._evaluate(dev.setup(), vd, vg, vs, vb, temp)
+    shape = np.broadcast_shapes(*(np.shape(_val(i)) for i in (vd, vg, vs, vb, temp, *currents)))
+    values, derivs = [], []
+    for i in currents:
+        values.append(np.broadcast_to(_val(i), shape).astype(float))
+        d = i.d if isinstance(i, Dual) else 0.0
+        derivs.append(np.broadcast_to(d, shape + (len(params),)).astype(float))
+    if shape == ():
+        values = [float(v) for v in values]
+    return values, derivs
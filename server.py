@@ -0,0 +1,244 @@
+import asyncio
+import collections
+import hashlib
+import json
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bsimcmg import BSIMCMG, read_mdl
+
+# Frame: header length and payload length, then a JSON header and raw little-endian float64 payload
+FRAME = struct.Struct('<II')
+BIAS = ('vd', 'vg', 'vs', 'vb', 'temp')
+
+
+def pack(header, data=b''):
+    h = json.dumps(header).encode()
+    return FRAME.pack(len(h), len(data)) + h + data
+
+
+async def read_frame(reader):
+    hlen, dlen = FRAME.unpack(await reader.readexactly(FRAME.size))
+    header = json.loads(await reader.readexactly(hlen))
+    return header, (await reader.readexactly(dlen) if dlen else b'')
+
+
+def card_key(card):
+    """Key of a card: hash of its sorted parameters, which must be scalars."""
+    arrays = sorted(k for k, v in card.items() if np.ndim(v))
+    if arrays:
+        raise ValueError(f'cards must have scalar parameters, got arrays for {arrays}')
+    return hashlib.sha256(json.dumps(sorted(card.items())).encode()).hexdigest()[:16]
+
+
+class Server:
+    """
+    Resident model evaluator. Cards are loaded once and keep their setup; calc
+    requests for the same card arriving within `window` seconds are concatenated
+    into one vectorized calc() call, flushed early once `max_batch` points wait.
+    """
+
+    def __init__(self, window=5.0e-4, max_batch=65536, history=4096):
+        self.window = window
+        self.max_batch = max_batch
+        self.devices = {}
+        self.pending = {} # card key -> [(bias, future, t0)]
+        self.points = {}
+        self.timers = {}
+        self.executor = ThreadPoolExecutor(1)
+        self.latency = collections.deque(maxlen=history)
+        self.counts = collections.Counter()
+        self.inflight = 0
+
+    def load(self, card):
+        key = card_key(card)
+        if key not in self.devices:
+            dev = BSIMCMG(**card)
+            dev.state()
+            self.devices[key] = dev
+        return key
+
+    async def evaluate(self, key, bias):
+        if key not in self.devices:
+            raise KeyError(f'unknown card {key}')
+        future = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(key, []).append((bias, future, time.perf_counter()))
+        self.points[key] = self.points.get(key, 0) + bias.shape[1]
+        if self.points[key] >= self.max_batch:
+            self._flush(key)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self.timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self.pending.pop(key, None)
+        self.points.pop(key, None)
+        if batch:
+            self.inflight += len(batch)
+            asyncio.ensure_future(self._run(self.devices[key], batch))
+
+    async def _run(self, dev, batch):
+        x = np.concatenate([b for b, _, _ in batch], axis=1)
+        try:
+            out = await asyncio.get_running_loop().run_in_executor(self.executor, lambda: np.array(dev.calc(*x)))
+        except Exception as e:
+            out = e
+        now = time.perf_counter()
+        start = 0
+        for b, future, t0 in batch:
+            n = b.shape[1]
+            if future.done():
+                pass
+            elif isinstance(out, Exception):
+                future.set_exception(out)
+            else:
+                future.set_result(out[:, start:start + n])
+            start += n
+            self.latency.append(now - t0)
+        self.inflight -= len(batch)
+        self.counts['batches'] += 1
+        self.counts['requests'] += len(batch)
+        self.counts['points'] += x.shape[1]
+
+    def stats(self):
+        """Queue depth, throughput counters and latency percentiles (seconds)."""
+        lat = np.array(self.latency)
+        out = {'cards': len(self.devices), 'queued': sum(len(b) for b in self.pending.values()),
+            'inflight': self.inflight, **self.counts}
+        out['batch_mean'] = self.counts['requests'] / max(self.counts['batches'], 1)
+        if lat.size:
+            out.update(zip(('p50', 'p90', 'p99', 'max'), np.percentile(lat, [50, 90, 99, 100]).tolist()))
+        return out
+
+    async def handle(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                try:
+                    header, data = await read_frame(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                task = asyncio.ensure_future(self._respond(header, data, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    async def _respond(self, header, data, writer):
+        reply, payload = {'id': header.get('id')}, b''
+        try:
+            op = header['op']
+            if op == 'calc':
+                bias = np.frombuffer(data, dtype='<f8').reshape(5, -1)
+                out = await self.evaluate(header['card'], bias)
+                payload = np.ascontiguousarray(out, dtype='<f8').tobytes()
+            elif op == 'load':
+                card = read_mdl(header['path']) if 'path' in header else header['card']
+                for k in BIAS:
+                    card.pop(k, None)
+                reply['card'] = self.load(card)
+            elif op == 'stats':
+                reply['stats'] = self.stats()
+            else:
+                raise ValueError(f'unknown op: {op}')
+            reply['ok'] = True
+        except Exception as e:
+            reply.update(ok=False, error=f'{type(e).__name__}: {e}')
+        writer.write(pack(reply, payload))
+        await writer.drain()
+
+    async def start(self, address):
+        """Listen on a Unix socket path or a (host, port) pair."""
+        if isinstance(address, str):
+            return await asyncio.start_unix_server(self.handle, address)
+        return await asyncio.start_server(self.handle, *address)
+
+
+async def serve(address, **options):
+    server = await Server(**options).start(address)
+    async with server:
+        await server.serve_forever()
+
+
+class Client:
+    """
+    Blocking client for Server. calc() takes and returns the same values as
+    BSIMCMG.calc(), for a card key returned by load().
+    """
+
+    def __init__(self, address, timeout=None):
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(address)
+        else:
+            self.sock = socket.create_connection(address, timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.next_id = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.sock.close()
+
+    def _recv(self, n):
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            k = self.sock.recv_into(view[got:])
+            if not k:
+                raise ConnectionError('server closed the connection')
+            got += k
+        return buf
+
+    def request(self, header, data=b''):
+        self.next_id += 1
+        self.sock.sendall(pack({**header, 'id': self.next_id}, data))
+        hlen, dlen = FRAME.unpack(self._recv(FRAME.size))
+        reply = json.loads(self._recv(hlen))
+        payload = self._recv(dlen) if dlen else b''
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply, payload
+
+    def load(self, card=None, path=None):
+        """Load a card (dict) or a modelcard file on the server side; returns its key."""
+        header = {'op': 'load', 'path': path} if path is not None else {'op': 'load', 'card': card}
+        return self.request(header)[0]['card']
+
+    def calc(self, card, vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0):
+        bias = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in (vd, vg, vs, vb, temp)))
+        shape = bias[0].shape
+        data = np.ascontiguousarray([b.ravel() for b in bias], dtype='<f8').tobytes()
+        _, payload = self.request({'op': 'calc', 'card': card}, data)
+        out = np.frombuffer(payload, dtype='<f8').reshape((4,) + shape)
+        if shape == ():
+            return [float(i) for i in out]
+        return list(out)
+
+    def stats(self):
+        return self.request({'op': 'stats'})[0]['stats']
+
+
+if __name__ == '__main__':
+    # python server.py /tmp/pycmg.sock   or   python server.py 127.0.0.1:8765
+    address = sys.argv[1] if len(sys.argv) > 1 else '/tmp/pycmg.sock'
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        address = (host, int(port))
+    asyncio.run(serve(address))
@@ -0,0 +1,196 @@
+import inspect
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from multiprocessing import resource_tracker, shared_memory, util
+
+# Segment layout: int64 reference count, int64 metadata length, JSON metadata, then the
+# arrays listed in the metadata, at 8-byte aligned offsets from the end of the metadata
+PREFIX = 16
+
+
+def _align(n):
+    return (n + 7) // 8 * 8
+
+
+def _lockfile(name):
+    return os.path.join(tempfile.gettempdir(), f'{name}.lock')
+
+
+# Python 3.13+ can map a segment without registering it with the resource tracker
+TRACK = 'track' in inspect.signature(shared_memory.SharedMemory).parameters
+
+
+def _open(name, create=False, size=0):
+    # Attaching processes must not let the resource tracker unlink the segment on exit
+    if TRACK:
+        return shared_memory.SharedMemory(name, create, size, track=create)
+    shm = shared_memory.SharedMemory(name, create, size)
+    if not create:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _unlink(shm):
+    # unlink() unregisters the name; forked workers share the tracker, so it may be gone already
+    if not TRACK:
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+class Snapshot:
+    """
+    Resolved model cards and their setup results in one shared memory segment.
+    publish() creates it; attach() maps it in another process by name without
+    copying. device(i) rebuilds card i as a BSIMCMG instance whose setup is
+    already done; its attributes are Python scalars copied from the segment
+    (integers stay int), not views of it. Every Snapshot holds one reference; close() drops it and the
+    last one unlinks the segment.
+    """
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.name = shm.name
+        self.closed = False
+        self.refs = np.ndarray((1,), dtype=np.int64, buffer=shm.buf)
+        n = int(np.ndarray((1,), dtype=np.int64, buffer=shm.buf, offset=8)[0])
+        self.meta = json.loads(bytes(shm.buf[PREFIX:PREFIX + n]))
+        base = _align(PREFIX + n)
+        self.arrays = {k: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=base + offset)
+            for k, (dtype, shape, offset) in self.meta['arrays'].items()}
+        for a in self.arrays.values():
+            a.flags.writeable = False
+        self.devices = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.meta['count']
+
+    def _ref(self, step):
+        with open(_lockfile(self.name), 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            self.refs[0] += step
+            return int(self.refs[0])
+
+    def _values(self, key, i):
+        # Row i of a float array, with the values published as integers cast back to int
+        return [int(v) if n else v for v, n in zip(self.arrays[key][i].tolist(), self.arrays[key + '_int'][i])]
+
+    def card(self, i):
+        """Resolved parameters of card i as given to BSIMCMG (the 'given' subset)."""
+        names = self.meta['params']
+        values = self._values('params', i)
+        return {k: v for k, v, g in zip(names, values, self.arrays['given'][i]) if g}
+
+    def device(self, i):
+        """BSIMCMG instance of card i with the published setup; cached per process."""
+        if i not in self.devices:
+            dev = BSIMCMG.__new__(BSIMCMG)
+            names = self.meta['params']
+            values = self._values('params', i)
+            vars(dev).update(zip(names, values))
+            dev.given = {k: v for k, v, g in zip(names, values, self.arrays['given'][i]) if g}
+            present = self.arrays['present'][i]
+            state = {k: v for k, v, p in zip(self.meta['setup'], self._values('setup', i), present) if p}
+            state['plan'] = frozenset(p for p, on in zip(self.meta['plan'], self.arrays['plan'][i]) if on)
+            dev.restore(SimpleNamespace(**state))
+            self.devices[i] = dev
+        return self.devices[i]
+
+    def close(self, unlink=False):
+        """
+        Drop this reference; the last one unlinks the segment. unlink=True removes
+        the name at once, e.g. when workers were terminated without closing; mappings
+        that are still attached stay valid.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.devices.clear()
+        self.arrays.clear()
+        refs = self._ref(-1)
+        del self.refs
+        self.shm.close()
+        if refs == 0 or unlink:
+            _unlink(self.shm)
+            try:
+                os.remove(_lockfile(self.name))
+            except OSError:
+                pass
+
+
+def _integer(v):
+    return isinstance(v, (int, np.integer)) and not isinstance(v, bool)
+
+
+def publish(cards, name=None):
+    """
+    Resolve each card (a dict of model and instance parameters, scalars only),
+    run its setup and publish the results; returns the owning Snapshot.
+    """
+    devs = [BSIMCMG(**card) for card in cards]
+    states = [vars(dev.state()) for dev in devs]
+    params = sorted({k for dev in devs for k, v in vars(dev).items() if k[0] != '_' and k != 'given'})
+    setup = sorted({k for s in states for k in s if k != 'plan'})
+    plan = sorted({p for s in states for p in s['plan']})
+    arrays = {
+        'params': np.array([[getattr(dev, k, np.nan) for k in params] for dev in devs], dtype=float),
+        'params_int': np.array([[_integer(getattr(dev, k, None)) for k in params] for dev in devs], dtype=np.uint8),
+        'given': np.array([[k in dev.given for k in params] for dev in devs], dtype=np.uint8),
+        'setup': np.array([[s.get(k, np.nan) for k in setup] for s in states], dtype=float),
+        'setup_int': np.array([[_integer(s.get(k)) for k in setup] for s in states], dtype=np.uint8),
+        'present': np.array([[k in s for k in setup] for s in states], dtype=np.uint8),
+        'plan': np.array([[p in s['plan'] for p in plan] for s in states], dtype=np.uint8).reshape(len(devs), len(plan)),
+    }
+    layout, size = {}, 0
+    for k, a in arrays.items():
+        layout[k] = (a.dtype.str, list(a.shape), size)
+        size = _align(size + a.nbytes)
+    blob = json.dumps({'count': len(devs), 'params': params, 'setup': setup, 'plan': plan, 'arrays': layout}).encode()
+    base = _align(PREFIX + len(blob))
+    shm = _open(name, True, base + size)
+    np.ndarray((2,), dtype=np.int64, buffer=shm.buf)[:] = (1, len(blob))
+    shm.buf[PREFIX:PREFIX + len(blob)] = blob
+    for k, a in arrays.items():
+        np.ndarray(a.shape, dtype=a.dtype, buffer=shm.buf, offset=base + layout[k][2])[...] = a
+    return Snapshot(shm)
+
+
+def attach(name):
+    """Map a published Snapshot by name and take a reference to it."""
+    snap = Snapshot(_open(name))
+    snap._ref(1)
+    return snap
+
+
+# Per-process snapshot for pool workers: Pool(initializer=shared.init_worker, initargs=(name,))
+_worker = None
+
+
+def init_worker(name):
+    global _worker
+    _worker = attach(name)
+    # Runs when the worker exits normally (Pool.close() and join(), not terminate())
+    util.Finalize(_worker, _worker.close, exitpriority=10)
+
+
+def worker_device(i):
+    """Device i of the snapshot attached by init_worker()."""
+    return _worker.device(i)
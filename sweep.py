@@ -0,0 +1,208 @@
+import warnings
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+
+BIAS = ('vd', 'vg', 'vs', 'vb', 'temp')
+DEFAULTS = dict(zip(BIAS, (1.0, 1.0, 0.0, 0.0, 27.0)))
+
+
+def _sd_pairs(names):
+    # Source/drain parameter pairs: names that differ by one S <-> D (NRS/NRD, ASEJ/ADEJ, AGISL/AGIDL, ...)
+    swap = {'S': 'D', 'D': 'S'}
+    return sorted({tuple(sorted((n, n[:i] + swap[c] + n[i + 1:]))) for n in names for i, c in enumerate(n)
+        if c in swap and n[:i] + swap[c] + n[i + 1:] in names})
+
+
+def symmetries(card, points=None, probes=64, rtol=1.0e-12):
+    """
+    Invariances of a card's currents, derived from its flags and parameters:
+    'swap', source and drain exchanged, Id(vd, vg, vs, vb) = Is(vs, vg, vd, vb)
+    (ASYMMOD = 0 and every source/drain parameter pair equal: NRS/NRD, ASEJ/ADEJ,
+    JSS/JSD, AGISL/AGIDL, ...); 'shift', all terminal voltages moved together,
+    Id(vd - vs, vg - vs, 0, vb - vs) (always: only voltage differences enter);
+    'body', no dependence on vb (BULKMOD = 0 without gate-body current).
+    Each is then checked at up to `probes` rows (vd, vg, vs, vb, temp) of `points`,
+    by default random biases in [-1, 1] at 27 C, and dropped with a warning if
+    it does not hold there.
+    """
+    dev = BSIMCMG(**card)
+    found = {'shift'}
+    names = {k for k in vars(dev) if k[0] != '_' and k != 'given'}
+    if dev.ASYMMOD == 0 and all(np.array_equal(getattr(dev, a), getattr(dev, b)) for a, b in _sd_pairs(names)):
+        found.add('swap')
+    if dev.BULKMOD == 0 and 'igb' not in dev.state().plan:
+        found.add('body')
+    rng = np.random.default_rng(0)
+    if points is None:
+        points = np.c_[rng.uniform(-1.0, 1.0, (probes, 4)), np.full(probes, DEFAULTS['temp'])]
+    points = np.asarray(points, dtype=float).reshape(-1, len(BIAS))
+    if len(points) > probes:
+        points = points[rng.choice(len(points), probes, replace=False)]
+    vd, vg, vs, vb, temp = points.T
+    a = np.array([np.broadcast_to(o, vd.shape) for o in dev.calc(vd, vg, vs, vb, temp)])
+    tol = rtol * (np.abs(a).max(axis=1, keepdims=True) + 1.0e-30)
+    checks = {'swap': lambda: np.array(dev.calc(vs, vg, vd, vb, temp))[[2, 1, 0, 3]],
+        'shift': lambda: dev.calc(vd - vs, vg - vs, 0.0, vb - vs, temp),
+        'body': lambda: dev.calc(vd, vg, vs, 0.0, temp)}
+    for name in sorted(found):
+        if not (np.abs(a - np.array([np.broadcast_to(o, vd.shape) for o in checks[name]()])) <= tol).all():
+            warnings.warn(f"'{name}' symmetry expected from the card does not hold at the planned points; not used")
+            found.discard(name)
+    return frozenset(found)
+
+
+class Sweep:
+    """
+    A sweep of biases (vd, vg, vs, vb, temp) and instance or model parameters
+    (L, NFIN, ...). Sweep(vg=x) sweeps one variable; several arrays in one Sweep
+    are linked and advance together (Sweep(vg=x, vd=x) is the vd = vg diagonal);
+    scalars are fixed values. a * b nests b inside a, so the shape is a.shape +
+    b.shape. link(vd=lambda p: ...) derives a variable from the others, and
+    Sweep.points(rows) is a list of explicit points.
+    """
+
+    def __init__(self, **values):
+        self.columns = {k: np.asarray(v, dtype=float) for k, v in values.items() if not callable(v)}
+        self.derived = {k: v for k, v in values.items() if callable(v)}
+        try:
+            self.shape = np.broadcast_shapes(*(v.shape for v in self.columns.values()))
+        except ValueError:
+            raise ValueError('linked sweep values must have the same length') from None
+
+    @classmethod
+    def points(cls, rows):
+        rows = list(rows)
+        names = {k for row in rows for k in row}
+        if any(set(row) != names for row in rows):
+            raise ValueError('all points of a list sweep must set the same variables')
+        return cls(**{k: [row[k] for row in rows] for k in sorted(names)})
+
+    def _names(self):
+        return set(self.columns) | set(self.derived)
+
+    def __mul__(self, other):
+        common = self._names() & other._names()
+        if common:
+            raise ValueError(f'variables swept twice: {sorted(common)}')
+        a, b = len(self.shape), len(other.shape)
+        out = Sweep()
+        out.columns = {**{k: v.reshape((1,) * (a - v.ndim) + v.shape + (1,) * b) for k, v in self.columns.items()},
+            **{k: v.reshape((1,) * (a + b - v.ndim) + v.shape) for k, v in other.columns.items()}}
+        out.derived = {**self.derived, **other.derived}
+        out.shape = self.shape + other.shape
+        return out
+
+    def link(self, **functions):
+        """Derived variables: each function takes the dict of swept values and returns one."""
+        common = self._names() & set(functions)
+        if common:
+            raise ValueError(f'variables swept twice: {sorted(common)}')
+        out = Sweep()
+        out.columns, out.derived, out.shape = dict(self.columns), {**self.derived, **functions}, self.shape
+        return out
+
+    def grid(self):
+        """Every variable at every point of the sweep, as arrays of the sweep's shape."""
+        values = {k: np.broadcast_to(v, self.shape) for k, v in self.columns.items()}
+        for k, f in self.derived.items():
+            values[k] = np.broadcast_to(np.asarray(f(values), dtype=float), self.shape)
+        return values
+
+
+class Plan:
+    """
+    Evaluation plan for one or more sweeps of a card: all requested points,
+    deduplicated across sweeps (voltages rounded to `decimals` first, if
+    given), sorted so that points of one geometry are contiguous and cut into
+    chunks of at most `chunk` points, each evaluated by one calc() call of a
+    device with scalar parameters. run() evaluates locally or through
+    pool.map() (e.g. a workers.WorkerPool) and scatters the results back.
+
+    Points are first made canonical using the symmetries() of the card and each
+    swept geometry, checked at that geometry's points (or those given as
+    `symmetry`; False for none): vb
+    replaced by vs if it has no effect, source and drain swapped where vd < vs,
+    then all voltages shifted so vs = 0, and rounded to `decimals` (default 12,
+    i.e. 1 pV) so that equal points meet. Reverse points then share evaluations
+    with forward ones (an Id-Vd family at -vd maps onto vg + |vd|), and Id and Is
+    are swapped back when scattering.
+    """
+
+    def __init__(self, card, sweeps, chunk=65536, decimals=None, symmetry='auto'):
+        self.card = dict(card)
+        self.single = isinstance(sweeps, Sweep)
+        self.sweeps = [sweeps] if self.single else list(sweeps)
+        grids = [s.grid() for s in self.sweeps]
+        params = sorted({k for g in grids for k in g} - set(BIAS))
+        default = BSIMCMG(**self.card)
+        # Parameter columns first so that np.unique sorts points by geometry
+        self.names = params + list(BIAS)
+        fallback = {**{k: getattr(default, k) for k in params}, **DEFAULTS}
+        table = np.concatenate([np.stack([np.broadcast_to(g.get(k, fallback[k]), s.shape).ravel()
+            for k in self.names], axis=1).reshape(-1, len(self.names)) for g, s in zip(grids, self.sweeps)])
+        self.flip = np.zeros(table.shape[0], dtype=bool)
+        if symmetry:
+            geoms, where = np.unique(table[:, :len(params)], axis=0, return_inverse=True)
+            where = where.ravel() if params else np.zeros(table.shape[0], dtype=int)
+            # Symmetries of each geometry, verified at its own planned points and temperatures
+            found = [symmetries({**self.card, **dict(zip(params, g.tolist()))}, table[where == i, len(params):])
+                if symmetry == 'auto' else frozenset(symmetry) for i, g in enumerate(geoms)]
+            has = lambda name: np.array([name in f for f in found])[where]
+            vd, vg, vs, vb = (table[:, len(params) + i] for i in range(4))
+            self.flip = has('swap') & (vd < vs)
+            vd, vs = np.where(self.flip, vs, vd), np.where(self.flip, vd, vs)
+            vb = np.where(has('body'), vs, vb)
+            shift = np.where(has('shift'), vs, 0.0)
+            table[:, len(params):len(params) + 4] = np.stack([vd - shift, vg - shift, vs - shift, vb - shift], axis=1)
+            decimals = 12 if decimals is None and any(found) else decimals
+        if decimals is not None:
+            table[:, len(params):len(params) + 4] = np.round(table[:, len(params):len(params) + 4], decimals)
+        self.requested = table.shape[0]
+        self.points, self.inverse = np.unique(table, axis=0, return_inverse=True)
+        self.inverse = self.inverse.ravel()
+        # Geometry groups, each cut into chunks
+        p = self.points[:, :len(params)]
+        starts = np.flatnonzero(np.r_[True, (p[1:] != p[:-1]).any(axis=1)]) if len(p) else np.array([], dtype=int)
+        self.chunks = []
+        for a, b in zip(starts, np.r_[starts[1:], len(p)]):
+            for c in range(a, b, chunk):
+                self.chunks.append((dict(zip(params, p[a].tolist())), slice(c, min(c + chunk, b))))
+
+    def __len__(self):
+        return len(self.points)
+
+    def jobs(self):
+        """(card, biases) per chunk, the input of WorkerPool.map()."""
+        n = len(self.names) - len(BIAS)
+        return [({**self.card, **params}, {k: self.points[s, n + i] for i, k in enumerate(BIAS)})
+            for params, s in self.chunks]
+
+    def scatter(self, results):
+        """Per-chunk [Id, Ig, Is, Ib] to the same, shaped like each sweep (a list unless one Sweep was planned)."""
+        flat = np.empty((4, len(self.points)))
+        for (_, s), out in zip(self.chunks, results):
+            flat[:, s] = np.array([np.broadcast_to(o, (s.stop - s.start,)) for o in out])
+        outs, start = [], 0
+        for sweep in self.sweeps:
+            size = int(np.prod(sweep.shape))
+            idx = self.inverse[start:start + size]
+            out = flat[:, idx]
+            # Source and drain currents of swapped points
+            flip = self.flip[start:start + size]
+            out[0, flip], out[2, flip] = out[2, flip], out[0, flip]
+            outs.append([o.reshape(sweep.shape) for o in out])
+            start += size
+        return outs[0] if self.single else outs
+
+    def run(self, pool=None):
+        if pool is not None:
+            return self.scatter(pool.map(self.jobs()))
+        results, devices = [], {}
+        for card, bias in self.jobs():
+            key = tuple(sorted(card.items()))
+            if key not in devices:
+                devices[key] = BSIMCMG(**card)
+            results.append(devices[key].calc(**bias))
+        return self.scatter(results)
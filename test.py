@@ -0,0 +1,279 @@
+"""
+Regression check: calc() on modelcard.l against the reference currents, and every
+path built on the model (specialized, threaded and cached evaluation, sweep plans,
+result files, shared snapshots, the worker pool, model libraries, Monte Carlo,
+rare-event estimates, leakage totals, fitting and sensitivities) against direct
+calc() evaluations. Run 'python test.py'; it exits non-zero on a mismatch.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import montecarlo
+import rare
+import shared
+from bsimcmg import CHUNK, BSIMCMG, read_mdl
+from cache import CalcCache
+from codegen import specialize
+from fitting import Dataset, fit
+from leakage import Leakage
+from library import ModelLibrary
+from results import ResultWriter, h5py, pa
+from sensitivity import sensitivities
+from sweep import Plan, Sweep
+from workers import WorkerPool
+
+# Currents of modelcard.l at its biases (see README)
+REFERENCE = (3.592760184e-04, 0.0, -3.592760184e-04, 0.0)
+
+failures = []
+
+
+def check(name, got, want, rtol=1.0e-12, atol=1.0e-24):
+    shapes = [(np.shape(g), np.shape(w)) for g, w in zip(got, want)]
+    ok = all(a == b for a, b in shapes) and all(np.allclose(g, w, rtol=rtol, atol=atol) for g, w in zip(got, want))
+    print(f"{'ok  ' if ok else 'FAIL'} {name}")
+    if not ok and any(a != b for a, b in shapes):
+        failures.append(f'{name}: shapes (got, want) {shapes}')
+    elif not ok:
+        err = max(float(np.max(np.abs(np.asarray(g) - w) / np.maximum(np.abs(w), max(atol, 1.0e-300)))) for g, w in zip(got, want))
+        failures.append(f'{name}: worst relative error {err:.3e}')
+
+
+def within(name, got, want, sigma):
+    # Statistical estimates: agreement within four standard errors
+    check(name, [got], [want], rtol=0.0, atol=4.0 * sigma)
+
+
+def card():
+    param = read_mdl('modelcard.l')
+    bias = {k: param.pop(k) for k in ('vd', 'vg', 'vs', 'vb', 'temp') if k in param}
+    return param, bias
+
+
+def evaluators(param):
+    # Gate current and GIDL on, so that Ig and Ib are compared too
+    vd = np.linspace(-1.0, 1.0, 41)[:, None]
+    vg = np.linspace(-0.2, 1.0, 2 * CHUNK // 41 + 1)
+    for name, card in (('modelcard.l', param), ('IGC/IGB/GIDL', dict(param, IGCMOD=1, IGBMOD=1, GIDLMOD=1))):
+        dev = BSIMCMG(**card)
+        ref = dev.calc(vd=vd, vg=vg)
+        check(f'specialize(numpy), {name}', specialize(dev, backend='numpy').calc(vd=vd, vg=vg), ref)
+        fast = specialize(dev, temp=27.0, backend='numpy')
+        check(f'specialize(numpy, temp=27), {name}', fast.calc(vd=vd, vg=vg), ref)
+        grid = np.broadcast_arrays(vd, vg)
+        out = np.empty((4, grid[0].size))
+        fast.calc_into(out, fast.workspace(out.shape[1]), vd=grid[0].ravel(), vg=grid[1].ravel())
+        check(f'calc_into(), {name}', [o.reshape(grid[0].shape) for o in out], ref)
+        check(f'calc(workers=2), {name}', dev.calc(vd=vd, vg=vg, workers=2), ref, rtol=0.0, atol=0.0)
+        cache = CalcCache(dev, quantum=0.0)
+        check(f'CalcCache miss, {name}', cache.calc(vd=vd, vg=vg), ref, rtol=0.0, atol=0.0)
+        check(f'CalcCache hit, {name}', cache.calc(vd=vd, vg=vg), ref, rtol=0.0, atol=0.0)
+
+
+def sweeps(param):
+    # Reverse points, two temperatures and a linked diagonal, deduplicated across sweeps
+    v = np.linspace(-1.0, 1.0, 21)
+    for name, card in (('modelcard.l', param), ('IGC/IGB/GIDL', dict(param, IGCMOD=1, IGBMOD=1, GIDLMOD=1))):
+        family = Sweep(vd=v) * Sweep(vg=v) * Sweep(temp=[-40.0, 125.0])
+        diag = Sweep(L=[16e-9, 20e-9]) * Sweep(vg=v).link(vd=lambda p: -p['vg'])
+        results = Plan(card, [family, diag]).run()
+        g = family.grid()
+        ref = BSIMCMG(**card).calc(g['vd'], g['vg'], 0.0, 0.0, g['temp'])
+        check(f'Plan, Id-Vg family, {name}', results[0], ref, rtol=1.0e-9, atol=1.0e-15)
+        g = diag.grid()
+        ref = BSIMCMG(**dict(card, L=g['L'])).calc(g['vd'], g['vg'])
+        check(f'Plan, linked diagonal, {name}', results[1], ref, rtol=1.0e-9, atol=1.0e-15)
+
+
+def writers(param):
+    vg = np.linspace(0.0, 1.0, 250)
+    Id, Ig, Is, Ib = BSIMCMG(**param).calc(vd=1.0, vg=vg)
+    columns = {'vg': vg, 'Id': Id, 'Is': Is}
+    with tempfile.TemporaryDirectory() as tmp:
+        # .npy columns are readable before close(), as soon as a block has been written
+        path = os.path.join(tmp, 'sweep')
+        with ResultWriter(path, columns=tuple(columns), chunk=100) as w:
+            w.write(**columns)
+            deadline = time.monotonic() + 10.0
+            while len(np.load(os.path.join(path, 'Id.npy'), mmap_mode='r')) < 200 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            check('ResultWriter .npy before close()', [np.load(os.path.join(path, 'Id.npy'), mmap_mode='r')], [Id[:200]], 0.0, 0.0)
+        check('ResultWriter .npy', [np.load(os.path.join(path, c + '.npy')) for c in columns], list(columns.values()), 0.0, 0.0)
+        path = os.path.join(tmp, 'sweep.csv')
+        with ResultWriter(path, columns=tuple(columns), chunk=100) as w:
+            w.write(**columns)
+        data = np.loadtxt(path, delimiter=',', skiprows=1)
+        check('ResultWriter .csv', list(data.T), list(columns.values()), 0.0, 0.0)
+        if h5py is not None:
+            path = os.path.join(tmp, 'sweep.h5')
+            with ResultWriter(path, columns=tuple(columns), chunk=100) as w:
+                w.write(**columns)
+            with h5py.File(path, 'r') as f:
+                check('ResultWriter .h5', [f[c][:] for c in columns], list(columns.values()), 0.0, 0.0)
+        if pa is not None:
+            import pyarrow.parquet as pq
+            path = os.path.join(tmp, 'sweep.parquet')
+            with ResultWriter(path, columns=tuple(columns), chunk=100) as w:
+                w.write(**columns)
+            table = pq.read_table(path)
+            check('ResultWriter .parquet', [table[c].to_numpy() for c in columns], list(columns.values()), 0.0, 0.0)
+
+
+def processes(param):
+    vg = np.linspace(0.0, 1.0, 101)
+    cards = [param, dict(param, L=20e-9, NFIN=2, IGCMOD=1)]
+    refs = [BSIMCMG(**c).calc(vd=1.0, vg=vg) for c in cards]
+    snap = shared.publish(cards)
+    try:
+        other = shared.attach(snap.name)
+        devs = [other.device(i) for i in range(len(other))]
+        for i, dev in enumerate(devs):
+            check(f'Snapshot device {i}', dev.calc(vd=1.0, vg=vg), refs[i], rtol=0.0, atol=0.0)
+        ints = all(type(getattr(d, k)) is int for d in devs for k in ('TYPE', 'BULKMOD', 'IGCMOD', 'NF'))
+        check('Snapshot integer flags stay int', [ints], [True])
+        other.close()
+    finally:
+        snap.close()
+    with WorkerPool(2) as pool:
+        vd = np.linspace(0.0, 1.0, 5)[:, None]
+        got = pool.map([(cards[0], {'vd': 1.0, 'vg': vg}), (cards[1], {'vd': vd, 'vg': vg, 'temp': 85.0})])
+    check('WorkerPool.map, job 0', got[0], refs[0])
+    check('WorkerPool.map, job 1', got[1], BSIMCMG(**cards[1]).calc(vd=vd, vg=vg, temp=85.0))
+
+
+def libraries(param):
+    text = b'''* two length bins of one model
+.model nch.1 nmos level = 72 lmin = 10n lmax = 18n nfinmin = 1 nfinmax = 10
++ u0 = 0.025 vsat = 125k dvtshift = 0.01
+.model nch.2 nmos level = 72 lmin = 18n lmax = 40n nfinmin = 1 nfinmax = 10
++ u0 = 0.03 vsat = 110k dvtshift = 0.02
+'''
+    lib = ModelLibrary(text)
+    L = np.array([12e-9, 16e-9, 20e-9, 24e-9, 30e-9, 14e-9])
+    NFIN = np.array([1.0, 2.0, 4.0, 4.0, 8.0, 3.0])
+    bins, devices = lib.devices('nch', L, NFIN)
+    Id = np.empty(L.size)
+    for pos, dev in devices.values():
+        Id[pos] = dev.calc(vd=0.7, vg=0.7)[0]
+    ref = [BSIMCMG(**{**lib.card(int(b)), 'L': l, 'NFIN': n}).calc(vd=0.7, vg=0.7)[0] for b, l, n in zip(bins, L, NFIN)]
+    check('ModelLibrary bins', [bins], [np.array([0, 0, 1, 1, 1, 0])], 0.0, 0.0)
+    check('ModelLibrary devices', [Id], [np.array(ref)])
+
+
+def statistics(param):
+    # StreamingStats over batches, and merged across runs, against the moments of the same samples
+    vg = np.linspace(0.0, 1.0, 6)
+    drawn = []
+
+    def draw(rng, size):
+        p = {'DVTSHIFT': rng.normal(0.01, 0.02, size), 'U0': rng.normal(0.025, 0.001, size)}
+        drawn.append(p)
+        return p
+
+    edges = {'Id': np.logspace(-9, -3, 13)}
+    stats = montecarlo.run(param, draw, 700, batch=256, seed=1, vd=1.0, vg=vg, edges=edges)
+    stats.merge(montecarlo.run(param, draw, 300, batch=256, seed=2, vd=1.0, vg=vg, edges=edges))
+    p = {k: np.concatenate([d[k] for d in drawn])[:, None] for k in drawn[0]}
+    ref = dict(zip(montecarlo.OUTPUTS, BSIMCMG(**{**param, **p}).calc(vd=1.0, vg=vg)))
+    for k in ('Id', 'Is'):
+        check(f'StreamingStats {k} mean/std/min/max', [stats.mean[k], stats.std(k), stats.min[k], stats.max[k]],
+            [ref[k].mean(axis=0), ref[k].std(axis=0, ddof=1), ref[k].min(axis=0), ref[k].max(axis=0)], rtol=1.0e-9)
+    counts = [(np.searchsorted(edges['Id'], ref['Id'][:, j], 'right')[:, None] == np.arange(14)).sum(axis=0)
+        for j in range(vg.size)]
+    check('StreamingStats histogram', [stats.histogram('Id')[1]], [np.array(counts)], 0.0, 0.0)
+    # Unscrambled Sobol points: the first 2**k put one point in each 2**-k stratum of every axis
+    u = montecarlo.Sobol(5, scramble=False).random(64)
+    check('Sobol stratification', [np.sort(np.floor(u * 64), axis=0)], [np.tile(np.arange(64.0)[:, None], (1, 5))], 0.0, 0.0)
+    # Randomized quasi-Monte Carlo with a control variate against a plain sample of direct calc() calls
+    variations = {'DVTSHIFT': (0.01, 0.02), 'U0': (0.025, 0.001)}
+    res = montecarlo.estimate(param, variations, 2048, method='sobol', control=True, vd=1.0, vg=0.5, seed=3)
+    rng = np.random.default_rng(4)
+    z = {k: rng.normal(m, s, 20000) for k, (m, s) in variations.items()}
+    Id = BSIMCMG(**{**param, **z}).calc(vd=1.0, vg=0.5)[0]
+    within('estimate(sobol, control) mean Id', res.mean['Id'], Id.mean(), np.hypot(res.stderr['Id'], Id.std() / np.sqrt(Id.size)))
+
+
+def rare_events(param):
+    variations = {'DVTSHIFT': (0.01, 0.02), 'U0': (0.025, 0.002)}
+    rng = np.random.default_rng(5)
+    z = rng.standard_normal((20000, 2))
+    p = {k: m + s * z[:, i] for i, (k, (m, s)) in enumerate(variations.items())}
+    Ioff = np.abs(BSIMCMG(**{**param, **p}).calc(vd=1.0, vg=0.0)[0])
+    # Limit at the 99th percentile of the direct sample: p close to 1e-2
+    limit = np.quantile(Ioff, 0.99)
+    margin = rare.Margin(param, variations, limit, vd=1.0, vg=0.0)
+    rows = z[:50]
+    direct = [np.abs(BSIMCMG(**{**param, 'DVTSHIFT': a, 'U0': b}).calc(vd=1.0, vg=0.0)[0])
+        for a, b in zip(0.01 + 0.02 * rows[:, 0], 0.025 + 0.002 * rows[:, 1])]
+    check('Margin against direct calc()', [margin(rows)], [np.log(limit) - np.log(direct)], rtol=1.0e-9)
+    pf = np.mean(Ioff > limit)
+    se = np.sqrt(pf * (1.0 - pf) / Ioff.size)
+    res = rare.importance(margin, 4000, seed=6)
+    within('importance() failure probability', res.p, pf, np.hypot(res.stderr, se))
+    res = rare.subset(margin, 2000, seed=7)
+    # The reported cov ignores chain correlation; allow twice its spread
+    within('subset() failure probability', res.p, pf, np.hypot(2.0 * res.cov * res.p, se))
+
+
+def leakage(param):
+    cards = {'nch': param, 'nch_gate': dict(param, IGCMOD=1, GIDLMOD=1)}
+    instances = [
+        {'card': 'nch', 'L': 16e-9, 'NFIN': 4.0, 'vd': 0.7, 'vg': 0.0, 'temp': 25.0, 'count': 3},
+        {'card': 'nch', 'L': 20e-9, 'NFIN': 4.0, 'vd': 0.7, 'vg': 0.0, 'temp': 85.0},
+        {'card': 'nch', 'L': 16e-9, 'NFIN': 4.0, 'vd': 0.7, 'vg': 0.0, 'temp': 25.0},
+        {'card': 'nch_gate', 'L': 16e-9, 'NFIN': 2.0, 'vd': 0.0, 'vg': 0.7, 'temp': 85.0, 'count': 2},
+        {'card': 'nch_gate', 'L': 16e-9, 'NFIN': 2.0, 'vd': 0.7, 'vg': 0.0, 'temp': 25.0},
+    ]
+    report = Leakage(cards).extend(instances).report()
+    total, by_temp = np.zeros(4), {25.0: np.zeros(4), 85.0: np.zeros(4)}
+    for inst in instances:
+        inst = dict(inst)
+        count, name = inst.pop('count', 1), inst.pop('card')
+        bias = {k: inst.pop(k) for k in ('vd', 'vg', 'temp')}
+        out = count * np.array(BSIMCMG(**{**cards[name], **inst}).calc(**bias))
+        total += out
+        by_temp[bias['temp']] += out
+    keys = ('Id', 'Ig', 'Is', 'Ib')
+    check('Leakage totals', [[report['total'][k] for k in keys]], [total])
+    check('Leakage by temperature', [[report['by_temp'][t][k] for k in keys] for t in by_temp], list(by_temp.values()))
+    check('Leakage counts', [[report['instances'], report['unique']]], [[8, 4]], 0.0, 0.0)
+
+
+def extraction(param):
+    # Synthetic curves from known parameters; the fit must recover them
+    truth = {'U0': 0.03, 'VSAT': 110000.0, 'DVTSHIFT': 0.02}
+    vg = np.linspace(0.2, 1.0, 21)
+    data = Dataset()
+    for vd in (0.05, 1.0):
+        data.add(BSIMCMG(**{**param, **truth}).calc(vd=vd, vg=vg)[0], vd=vd, vg=vg)
+    res = fit(param, data, list(truth))
+    check('fit() recovers parameters', [[res.params[k] for k in truth]], [list(truth.values())], rtol=1.0e-6)
+    # Dual-number derivatives against central differences of calc()
+    names = ['U0', 'VSAT', 'PHIG', 'RDSW']
+    dev = BSIMCMG(**param)
+    values, derivs = sensitivities(dev, names, vd=1.0, vg=vg)
+    check('sensitivities() currents', values, dev.calc(vd=1.0, vg=vg), rtol=1.0e-12)
+    fd = []
+    for name in names:
+        h = 1.0e-6 * abs(getattr(dev, name))
+        hi, lo = (np.array(BSIMCMG(**{**param, name: getattr(dev, name) + s}).calc(vd=1.0, vg=vg)) for s in (h, -h))
+        fd.append((hi - lo) / (2.0 * h))
+    fd = np.stack(fd, axis=-1)
+    check('sensitivities() derivatives', [derivs[0], derivs[2]], [fd[0], fd[2]], rtol=1.0e-5)
+
+
+def main():
+    param, bias = card()
+    check('calc() on modelcard.l', BSIMCMG(**param).calc(**bias), REFERENCE, rtol=1.0e-9)
+    for section in (evaluators, sweeps, writers, processes, libraries, statistics, rare_events, leakage, extraction):
+        section(param)
+    if failures:
+        sys.exit('\n'.join(failures))
+
+
+if __name__ == '__main__':
+    main()
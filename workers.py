@@ -0,0 +1,146 @@
+import multiprocessing
+import queue
+import time
+
+import numpy as np
+
+from bsimcmg import BSIMCMG
+from server import card_key
+
+
+def _work(wid, tasks, results, maxcards):
+    # Devices stay set up between tasks and jobs; the oldest card is dropped past maxcards
+    devices = {}
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        key, card, job, start, bias = task
+        t0 = t1 = time.perf_counter()
+        try:
+            dev = devices.pop(key, None) or BSIMCMG(**card)
+            devices[key] = dev
+            if len(devices) > maxcards:
+                devices.pop(next(iter(devices)))
+            t1 = time.perf_counter()
+            out, err = np.array(dev.calc(*bias)), None
+        except Exception as e:
+            out, err = None, e
+        t2 = time.perf_counter()
+        # Busy time, and evaluation time alone for the cost model
+        results.put((wid, job, start, out, err, t2 - t0, t2 - t1))
+
+
+class WorkerPool:
+    """
+    Worker processes kept alive across jobs. Each worker caches set-up devices by
+    card key, so a card is built once per worker. Jobs are cut into chunks sized
+    from the measured cost per point of their card (cards with BULKMOD, IIMOD, ...
+    are slower), aiming at `target` seconds per chunk; idle workers pull the next
+    chunk. stats() reports per-worker utilization. Cards must have scalar
+    parameters. A worker that dies (crash, kill) makes map() raise RuntimeError
+    within `poll` seconds of the results stopping; the pool must then be closed.
+    """
+
+    def __init__(self, processes=None, target=0.02, min_chunk=64, max_chunk=65536, maxcards=64, context=None, poll=1.0):
+        ctx = multiprocessing.get_context(context)
+        self.processes = processes or multiprocessing.cpu_count()
+        self.target = target
+        self.min_chunk = min_chunk
+        self.max_chunk = max_chunk
+        self.poll = poll
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.workers = [ctx.Process(target=_work, args=(i, self.tasks, self.results, maxcards), daemon=True)
+            for i in range(self.processes)]
+        for w in self.workers:
+            w.start()
+        self.started = time.perf_counter()
+        self.busy = np.zeros(self.processes)
+        self.chunks = np.zeros(self.processes, dtype=int)
+        self.points = np.zeros(self.processes, dtype=int)
+        self.cost = {} # card key -> seconds per point
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for _ in self.workers:
+            self.tasks.put(None)
+        for w in self.workers:
+            w.join()
+
+    def _chunk(self, key):
+        cost = self.cost.get(key)
+        if cost is None:
+            return self.min_chunk
+        return int(np.clip(self.target / cost, self.min_chunk, self.max_chunk))
+
+    def map(self, jobs):
+        """
+        Evaluate jobs, each (card, biases) with biases a dict of vd/vg/vs/vb/temp
+        (scalars or arrays that broadcast). Returns [Id, Ig, Is, Ib] per job, shaped
+        like BSIMCMG.calc() results.
+        """
+        todo = []
+        for card, bias in jobs:
+            values = [np.asarray(bias.get(k, d), dtype=float)
+                for k, d in (('vd', 1.0), ('vg', 1.0), ('vs', 0.0), ('vb', 0.0), ('temp', 27.0))]
+            shape = np.broadcast_shapes(*(v.shape for v in values))
+            # Scalar biases stay scalar so the temperature stage is not evaluated per point
+            x = [float(v) if v.ndim == 0 else np.broadcast_to(v, shape).ravel() for v in values]
+            todo.append((card_key(card), card, shape, x, int(np.prod(shape))))
+        outs = [np.empty((4, n)) for *_, n in todo]
+        pos = [0] * len(todo)
+        pending = 0
+        error = None
+        job = 0
+        while True:
+            # Keep two chunks per worker in flight; the next chunk is sized from the latest costs
+            while pending < 2 * self.processes and job < len(todo):
+                key, card, _, x, size = todo[job]
+                n = self._chunk(key)
+                s = slice(pos[job], pos[job] + n)
+                self.tasks.put((key, card, job, pos[job], [v if isinstance(v, float) else v[s] for v in x]))
+                pos[job] += n
+                pending += 1
+                if pos[job] >= size:
+                    job += 1
+            if pending == 0:
+                break
+            try:
+                wid, j, start, out, err, busy, elapsed = self.results.get(timeout=self.poll)
+            except queue.Empty:
+                dead = [(i, w.exitcode) for i, w in enumerate(self.workers) if not w.is_alive()]
+                if dead:
+                    raise RuntimeError(f'worker processes exited with chunks outstanding (id, exit code): {dead}') from None
+                continue
+            pending -= 1
+            if err is not None:
+                error = error or err
+                continue
+            outs[j][:, start:start + out.shape[-1]] = out.reshape(4, -1)
+            key = todo[j][0]
+            per = elapsed / max(out.shape[-1], 1)
+            self.cost[key] = per if key not in self.cost else 0.5 * (self.cost[key] + per)
+            self.busy[wid] += busy
+            self.chunks[wid] += 1
+            self.points[wid] += out.shape[-1]
+        if error is not None:
+            raise error
+        return [[o.reshape(shape) if shape else float(o[0]) for o in out] for out, (_, _, shape, _, _) in zip(outs, todo)]
+
+    def calc(self, card, vd=1.0, vg=1.0, vs=0.0, vb=0.0, temp=27.0):
+        """BSIMCMG(**card).calc(...) spread over the workers."""
+        return self.map([(card, dict(vd=vd, vg=vg, vs=vs, vb=vb, temp=temp))])[0]
+
+    def stats(self):
+        """Per-worker busy time, utilization since start, chunks and points, and per-card cost."""
+        wall = time.perf_counter() - self.started
+        return {'wall': wall,
+            'workers': [{'busy': float(b), 'utilization': float(b / wall), 'chunks': int(c), 'points': int(p)}
+                for b, c, p in zip(self.busy, self.chunks, self.points)],
+            'cost_per_point': dict(self.cost)}